@@ -11,6 +11,9 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
+
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -19,13 +22,29 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.0/howto/deployment/checklist/
 
+# DJANGO_ENV=production selects the production profile: no DEBUG, a
+# lighter middleware stack for the API and persistent connections
+DJANGO_ENV = os.environ.get('DJANGO_ENV', 'development')
+PRODUCTION = DJANGO_ENV == 'production'
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'f!+rlc6(-z5b@f8u4x(e&hn%!_vb2@=+%yy5zuw)rzo0cq*wp+'
+# the key committed below is only used outside of production
+DEVELOPMENT_SECRET_KEY = 'f!+rlc6(-z5b@f8u4x(e&hn%!_vb2@=+%yy5zuw)rzo0cq*wp+'
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+    if PRODUCTION:
+        raise ImproperlyConfigured(
+            'SECRET_KEY must be set in the environment in production'
+        )
+    SECRET_KEY = DEVELOPMENT_SECRET_KEY
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# with DEBUG every query is kept in connection.queries
+DEBUG = os.environ.get('DJANGO_DEBUG', '0' if PRODUCTION else '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host
+]
 
 
 # Application definition
@@ -45,6 +64,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.HealthCheckMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,8 +74,34 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaMiddleware',
 ]
 
+# the middlewares the token authenticated API doesn't use, in production
+# they only run for the urls outside of API_URL_PREFIX like the admin
+API_URL_PREFIX = '/api/'
+NON_API_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+if PRODUCTION:
+    MIDDLEWARE = [
+        'core.middleware.HealthCheckMiddleware',
+        'core.middleware.MetricsMiddleware',
+        'core.middleware.ProfilingMiddleware',
+        'django.middleware.security.SecurityMiddleware',
+        'django.middleware.common.CommonMiddleware',
+        'core.middleware.NonAPIMiddleware',
+        'core.middleware.ReplicaMiddleware',
+    ]
+    # the admin checks look for the session, auth and messages
+    # middlewares in MIDDLEWARE, NonAPIMiddleware runs them for it
+    SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -87,9 +135,218 @@ DATABASES = {
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # seconds a connection is kept between requests, 0 closes it at
+        # the end of every request
+        'CONN_MAX_AGE': int(
+            os.environ.get('DB_CONN_MAX_AGE', 60 if PRODUCTION else 0)
+        ),
+        # a kept connection is tested at the start of the next request,
+        # see core.db.check_connections
+        'CONN_HEALTH_CHECKS': os.environ.get(
+            'DB_CONN_HEALTH_CHECKS', '1' if PRODUCTION else '0'
+        ) == '1',
+        # seconds a tested connection isn't tested again
+        'CONN_HEALTH_CHECK_INTERVAL': float(
+            os.environ.get('DB_CONN_HEALTH_CHECK_INTERVAL', 5)
+        ),
     }
 }
 
+# DB_REPLICA_HOSTS lists the hosts of read replicas of the default
+# database, the views with ReplicaReadMixin send their safe requests to
+# them, see core.routers and core.middleware.ReplicaMiddleware
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+    host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host
+):
+    alias = 'replica_%d' % index
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        HOST=host,
+        # the tests read the replicas through the test database
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+
+# DB_SHARD_HOSTS lists the hosts of the databases the users are spread
+# over with the default one, each user's recipes, tags and ingredients
+# live on a single shard, see core.shards and core.routers.ShardRouter
+DATABASE_SHARDS = ['default']
+for index, host in enumerate(
+    (host for host in os.environ.get('DB_SHARD_HOSTS', '').split(',') if host),
+    start=1
+):
+    alias = 'shard_%d' % index
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host, TEST={})
+    DATABASE_SHARDS.append(alias)
+
+# the ids of the shard at index i of DATABASE_SHARDS start at
+# i * SHARD_ID_SPAN so the users can be moved with their ids
+SHARD_ID_SPAN = int(os.environ.get('SHARD_ID_SPAN', 10 ** 8))
+# cache holding the shard of each user for SHARD_CACHE_TTL seconds, a
+# cache shared by the processes lets rebalance_shards delete the rows of
+# a moved user at once, with a local one it waits for the entries to
+# expire
+SHARD_CACHE = 'default'
+SHARD_CACHE_TTL = 300
+
+DATABASE_ROUTERS = ['core.routers.ShardRouter', 'core.routers.ReplicaRouter']
+
+# seconds the replicas are given to catch up: the reads of a user
+# stay on the primary that long after its writes, and the conditional
+# responses after any change of their data
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+REPLICA_PIN_CACHE = 'default'
+# always read from the primary, the tokens are cached by the processes
+REPLICA_EXCLUDED_MODELS = ['authtoken.Token']
+
+
+# Django rest framework
+# https://www.django-rest-framework.org/api-guide/settings/
+# list endpoints return pages of PAGE_SIZE rows, clients can ask
+# for bigger pages with ?page_size= up to API_MAX_PAGE_SIZE rows
+# the JSON is encoded and decoded with orjson when it's installed
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'recipe.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 100)),
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+if PRODUCTION:
+    # no browsable API and no sessions on the API in production
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'core.renderers.FastJSONRenderer',
+    ]
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'] = [
+        'core.authentication.CachedTokenAuthentication',
+        'core.tokens.SignedTokenAuthentication',
+    ]
+
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+
+# the list endpoints read dicts with values() instead of model instances,
+# see recipe.values
+API_VALUES_LIST = os.environ.get('API_VALUES_LIST', '0') == '1'
+
+# maximum number of recipes created by a single bulk request
+API_MAX_BULK_SIZE = int(os.environ.get('API_MAX_BULK_SIZE', 1000))
+
+# number of recipes the export reads from the database at once
+API_EXPORT_CHUNK_SIZE = int(os.environ.get('API_EXPORT_CHUNK_SIZE', 2000))
+
+# the authenticated tokens are cached in the memory of each process,
+# CACHE_ALIAS can name a cache from CACHES shared by the processes to
+# use instead, the revoked tokens are then rejected by all of them
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 10000)),
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60)),
+    'CACHE_ALIAS': os.environ.get('TOKEN_AUTH_CACHE_ALIAS'),
+}
+
+# short lived access tokens signed with HMAC, sent as "Bearer <token>"
+# and verified without the database, see core.tokens
+SIGNED_TOKENS = {
+    'ACCESS_TTL': int(os.environ.get('SIGNED_TOKEN_ACCESS_TTL', 300)),
+    'REFRESH_TTL': int(os.environ.get(
+        'SIGNED_TOKEN_REFRESH_TTL', 14 * 24 * 3600
+    )),
+    'SECRET': os.environ.get('SIGNED_TOKEN_SECRET'),
+    'CACHE_ALIAS': os.environ.get('SIGNED_TOKEN_CACHE_ALIAS'),
+}
+
+# /readyz caches its database check for TTL seconds and fails once
+# MAX_IN_FLIGHT requests run in the process, see core.health
+HEALTH_MAX_IN_FLIGHT = os.environ.get('HEALTH_MAX_IN_FLIGHT')
+HEALTH_CHECK = {
+    'TTL': float(os.environ.get('HEALTH_CHECK_TTL', 2)),
+    'MAX_IN_FLIGHT': int(HEALTH_MAX_IN_FLIGHT) if HEALTH_MAX_IN_FLIGHT
+    else None,
+}
+
+# request count, latency, query and size histograms by route served on
+# /metrics, METRICS_DIR adds up the metrics of the worker processes of
+# the host, the files of the stopped ones are folded into one.
+# The scrapers send METRICS_TOKEN, required in production
+METRICS = {
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+    'MULTIPROCESS_DIR': os.environ.get('METRICS_DIR'),
+}
+if PRODUCTION and not METRICS['TOKEN']:
+    raise ImproperlyConfigured(
+        'METRICS_TOKEN must be set in the environment in production'
+    )
+
+# threads of each ASGI process serving the list and retrieve actions of
+# the recipe API, each one keeps a database connection, see core.asgi
+ASGI_READ_THREADS = int(os.environ.get('ASGI_READ_THREADS', 16))
+
+# share of the requests profiled, their queries slower than
+# SLOW_QUERY_MS are logged, see core.profiling. In production only the
+# requests sending PROFILING_TOKEN in X-Profiling-Token get their
+# timings in a Server-Timing header
+REQUEST_PROFILING = {
+    'SAMPLE_RATE': float(os.environ.get(
+        'PROFILING_SAMPLE_RATE', '0.01' if PRODUCTION else '1'
+    )),
+    'SLOW_QUERY_MS': float(os.environ.get('SLOW_QUERY_MS', 100)),
+    'HEADER': not PRODUCTION,
+    'TOKEN': os.environ.get('PROFILING_TOKEN'),
+}
+
+# postgres text search configuration used by the recipe ?search= filter,
+# run rebuild_search_vectors after changing it
+RECIPE_SEARCH_CONFIG = os.environ.get('RECIPE_SEARCH_CONFIG', 'english')
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# the local memory cache is per process, CACHE_BACKEND and
+# CACHE_LOCATION select a cache shared by every process instead
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# a local cache keeps its own API versions and responses in each
+# process, the writes served by a process would go unseen by the others
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+SHARED_CACHE = CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+if PRODUCTION and not SHARED_CACHE:
+    raise ImproperlyConfigured(
+        'CACHE_BACKEND must name a cache shared by the processes in '
+        'production'
+    )
+
+# cache holding the versions behind the ETag of the recipe API
+API_VERSION_CACHE = 'default'
+
+# serialized responses of the recipe API read endpoints, invalidated
+# by the model signals when the user writes, on by default with a
+# shared cache
+API_RESPONSE_CACHE = {
+    'ENABLED': os.environ.get(
+        'API_RESPONSE_CACHE', '1' if SHARED_CACHE else '0'
+    ) == '1',
+    'ALIAS': 'default',
+    'TTL': int(os.environ.get('API_RESPONSE_CACHE_TTL', 300)),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -109,6 +366,36 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# the new passwords are hashed with PASSWORD_HASHER: pbkdf2, or argon2
+# when argon2-cffi is installed. The passwords of the other hashers or
+# costs are rehashed on login. The hashes run in HASHING_WORKERS
+# threads, 0 hashes in the request threads, see core.hashers
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+if PASSWORD_HASHER == 'argon2' and find_spec('argon2') is None:
+    PASSWORD_HASHER = 'pbkdf2'
+
+PASSWORD_HASHERS = [
+    'core.hashers.PBKDF2Hasher',
+    'core.hashers.Argon2Hasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+if PASSWORD_HASHER == 'argon2':
+    PASSWORD_HASHERS[:2] = reversed(PASSWORD_HASHERS[:2])
+
+PASSWORD_HASHING = {
+    'PBKDF2_ITERATIONS': int(os.environ.get('PBKDF2_ITERATIONS', 180000)),
+    'ARGON2_TIME_COST': int(os.environ.get('ARGON2_TIME_COST', 2)),
+    'ARGON2_MEMORY_COST': int(os.environ.get('ARGON2_MEMORY_COST', 102400)),
+    'ARGON2_PARALLELISM': int(os.environ.get('ARGON2_PARALLELISM', 8)),
+}
+if os.environ.get('HASHING_WORKERS'):
+    PASSWORD_HASHING['WORKERS'] = int(os.environ['HASHING_WORKERS'])
+if os.environ.get('HASHING_MAX_PENDING'):
+    PASSWORD_HASHING['MAX_PENDING'] = int(
+        os.environ['HASHING_MAX_PENDING']
+    )
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
@@ -3,3 +3,16 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from django.db.models.signals import post_migrate
+
+        from core.db import check_connections
+        from core.shards import reserve_ids
+
+        # connect the signal receivers invalidating the token cache
+        from core import signals  # noqa: F401
+
+        request_started.connect(check_connections)
+        post_migrate.connect(reserve_ids, sender=self)
@@ -0,0 +1,119 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core import signals
+from django.core.exceptions import RequestAborted
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import Resolver404, resolve, set_script_prefix
+
+
+class ReadPoolASGIHandler(ASGIHandler):
+    """ASGI handler serving the read actions of the API from a bounded
+    pool of threads
+
+    Django 3.0 has no async views and its ASGIHandler runs every
+    request in the single thread of sync_to_async, one at a time. The
+    GET and HEAD requests of the actions listed in the async_actions of
+    a view (list and retrieve of the recipe viewsets) are run in a pool
+    of ASGI_READ_THREADS threads instead: the token authentication, the
+    queries, the serialization and the rendering never block the event
+    loop, which only reads the request and writes the response. Each
+    thread keeps its own database connection, the pool bounds the
+    connections of the process. The other requests are served by
+    ASGIHandler."""
+
+    def __init__(self, max_workers=None):
+        super().__init__()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or getattr(
+                settings, "ASGI_READ_THREADS", 16
+            ),
+            thread_name_prefix="asgi-read",
+        )
+
+    def is_pooled(self, scope):
+        """Return True when the request goes to an action run in the
+        pool of threads"""
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return False
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return False
+        view_class = getattr(match.func, "cls", None)
+        action = getattr(match.func, "actions", {}).get(
+            scope["method"].lower()
+        )
+        return action in getattr(view_class, "async_actions", ())
+
+    async def __call__(self, scope, receive, send):
+        if not self.is_pooled(scope):
+            return await super().__call__(scope, receive, send)
+
+        try:
+            body_file = await self.read_body(receive)
+        except RequestAborted:
+            return
+        loop = asyncio.get_running_loop()
+        response, body = await loop.run_in_executor(
+            self.executor, self.get_pooled_response, scope, body_file
+        )
+        await self.send_pooled_response(response, body, send)
+
+    def get_pooled_response(self, scope, body_file):
+        """Serve the request in a thread of the pool, return the response
+        and its body
+
+        The request signals are sent from the thread so the database
+        connections it closes or checks are the ones of the thread."""
+        set_script_prefix(self.get_script_prefix(scope))
+        signals.request_started.send(sender=self.__class__, scope=scope)
+        request, response = self.create_request(scope, body_file)
+        if request is not None:
+            response = self.get_response(request)
+        response._handler_class = self.__class__
+        try:
+            # the body is read before request_finished is sent
+            if response.streaming:
+                body = b"".join(response.streaming_content)
+            else:
+                body = response.content
+        finally:
+            response.close()
+        return response, body
+
+    async def send_pooled_response(self, response, body, send):
+        """Send a response already closed by its thread"""
+        headers = [
+            (header.encode("ascii"), value.encode("latin1"))
+            for header, value in response.items()
+        ]
+        for cookie in response.cookies.values():
+            headers.append(
+                (b"Set-Cookie", cookie.output(header="").encode("ascii")
+                 .strip())
+            )
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": headers,
+        })
+        for chunk, last in self.chunk_bytes(body):
+            await send({
+                "type": "http.response.body",
+                "body": chunk,
+                "more_body": not last,
+            })
+
+
+def get_asgi_application():
+    """Return the ASGI application of the project, like the function of
+    django.core.asgi with the pool of threads for the read actions"""
+    django.setup(set_prefix=False)
+    return ReadPoolASGIHandler()
@@ -0,0 +1,177 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.authentication import TokenAuthentication
+
+from core.profiling import measure
+
+
+DEFAULT_TOKEN_AUTH_CACHE = {
+    # number of tokens kept in the memory of each process
+    "MAX_SIZE": 10000,
+    # seconds a token stays cached, it bounds how long another process
+    # can still accept a token deleted or a user deactivated elsewhere
+    "TTL": 60,
+    # alias of a django cache shared by the processes, None to disable
+    "CACHE_ALIAS": None,
+}
+
+
+def get_token_cache_settings():
+    """Return the token cache settings merged with the defaults"""
+    options = dict(DEFAULT_TOKEN_AUTH_CACHE)
+    options.update(getattr(settings, "TOKEN_AUTH_CACHE", {}))
+    return options
+
+
+class LRUCache:
+    """Thread safe least recently used cache whose entries expire"""
+
+    def __init__(self, max_size, ttl, timer=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self.timer():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Cache the value, evicting the least recently used entry"""
+        with self._lock:
+            self._entries[key] = (value, self.timer() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_matching(self, predicate):
+        """Delete every entry whose value matches the predicate"""
+        with self._lock:
+            keys = [
+                key for key, (value, _) in self._entries.items()
+                if predicate(value)
+            ]
+            for key in keys:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TokenCache:
+    """Authenticated (user, token) pairs cached by token key
+
+    Every process keeps its own LRU cache unless a django cache shared
+    by the processes is configured with TOKEN_AUTH_CACHE. The shared
+    cache then replaces it: a token deleted by a process must be
+    rejected by all of them at once, which the copies kept by the other
+    processes would prevent until they expire."""
+
+    key_prefix = "auth-token:"
+
+    def __init__(self):
+        self._local = None
+
+    @property
+    def local(self):
+        # built lazily so the settings are read once they're loaded
+        if self._local is None:
+            options = get_token_cache_settings()
+            self._local = LRUCache(options["MAX_SIZE"], options["TTL"])
+        return self._local
+
+    def get_shared_cache(self):
+        """Return the shared django cache, None if not configured"""
+        alias = get_token_cache_settings()["CACHE_ALIAS"]
+        return caches[alias] if alias else None
+
+    def get_shared_key(self, key):
+        # the token itself is a credential so it isn't used as a key
+        return self.key_prefix + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        """Return the cached (user, token) pair of a token key"""
+        shared = self.get_shared_cache()
+        if shared is None:
+            return self.local.get(key)
+        return shared.get(self.get_shared_key(key))
+
+    def set(self, key, credentials):
+        shared = self.get_shared_cache()
+        if shared is None:
+            self.local.set(key, credentials)
+        else:
+            shared.set(
+                self.get_shared_key(key),
+                credentials,
+                get_token_cache_settings()["TTL"]
+            )
+
+    def delete(self, key):
+        self.local.delete(key)
+        shared = self.get_shared_cache()
+        if shared is not None:
+            shared.delete(self.get_shared_key(key))
+
+    def delete_user(self, user_id, keys=()):
+        """Delete every token of a user
+
+        The local cache is scanned, the shared cache needs the keys of
+        the user's tokens since it can't be searched"""
+        self.local.delete_matching(lambda value: value[0].pk == user_id)
+        shared = self.get_shared_cache()
+        if shared is not None and keys:
+            shared.delete_many([self.get_shared_key(key) for key in keys])
+
+    def clear(self):
+        self.local.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication which doesn't query the database for every
+    request, the tokens are cached and removed from the cache when they
+    are deleted or when their user is modified"""
+
+    def authenticate(self, request):
+        with measure("auth"):
+            return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        if credentials is None:
+            # raises when the token is invalid or the user is inactive
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials)
+
+        # the views may modify request.user, the cached user is copied
+        # so it can't be changed by another request
+        user, token = copy.deepcopy(credentials)
+        return user, token
@@ -0,0 +1,276 @@
+import gc
+import math
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from decimal import Decimal
+from random import Random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.models import RELATED_COLUMNS, Tag, Ingredient, Recipe
+from core.shards import place_user, shard_for_user
+from recipe.search import refresh_search_vectors
+
+
+def max_rss_kib():
+    """Return the peak resident memory of the process in KiB"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports KiB while macOS reports bytes
+    if sys.platform == "darwin":
+        return max_rss // 1024
+    return max_rss
+
+
+@contextmanager
+def measure():
+    """Measure the duration and the memory used by the block
+
+    The dict given to the block is filled on exit with the seconds, the
+    peak of the memory allocated by python while the block ran and the
+    peak RSS of the process, which only grows if the block went above
+    the previous peak."""
+    result = {}
+    gc.collect()
+    rss_before = max_rss_kib()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_traced_kib"] = peak // 1024
+        result["max_rss_kib"] = max_rss_kib()
+        result["max_rss_growth_kib"] = result["max_rss_kib"] - rss_before
+
+
+def insert_recipes(recipes, tag_ids, ingredient_ids,
+                   using=DEFAULT_DB_ALIAS):
+    """Insert the recipes and their relations with bulk_create
+
+    Unlike bulk_create_with_relations the recipes are bulk inserted on
+    every database, the databases which can't return the ids of the
+    inserted rows get them back with the rows above the previous
+    highest id. Nothing else may insert recipes meanwhile. The signals
+    aren't sent, the search vectors aren't filled. The recipes must all
+    be on the database using."""
+    recipe_objects = Recipe.objects.using(using)
+    returns_ids = connections[using].features.can_return_rows_from_bulk_insert
+    if not returns_ids:
+        last_id = recipe_objects.order_by("-id").values_list(
+            "id", flat=True
+        ).first() or 0
+    recipe_objects.bulk_create(recipes)
+    if not returns_ids:
+        ids = recipe_objects.filter(id__gt=last_id).order_by(
+            "id"
+        ).values_list("id", flat=True)
+        for recipe, pk in zip(recipes, ids):
+            recipe.pk = pk
+
+    for field, ids_per_recipe in (
+        ("tags", tag_ids), ("ingredients", ingredient_ids)
+    ):
+        through = getattr(Recipe, field).through
+        column = RELATED_COLUMNS[field]
+        through.objects.using(using).bulk_create([
+            through(recipe_id=recipe.pk, **{column: related_id})
+            for recipe, ids in zip(recipes, ids_per_recipe)
+            for related_id in dict.fromkeys(ids)
+        ])
+    return recipes
+
+
+def percentile(values, percent):
+    """Return the nearest rank percentile of the values"""
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+def create_recipes(user, count, tags_per_recipe=3,
+                   ingredients_per_recipe=5, batch_size=5000):
+    """Create count recipes for the user with tags and ingredients
+
+    The rows are inserted a batch at a time so creating a large
+    dataset doesn't raise the memory of the process."""
+    # four times more names than a recipe uses so they are spread
+    tags, _ = Tag.objects.get_or_create_many(
+        user, ["Tag %d" % i for i in range(tags_per_recipe * 4 or 1)]
+    )
+    ingredients, _ = Ingredient.objects.get_or_create_many(
+        user,
+        ["Ingredient %d" % i for i in range(ingredients_per_recipe * 4 or 1)]
+    )
+
+    using = shard_for_user(user)
+    for start in range(0, count, batch_size):
+        numbers = range(start, min(start + batch_size, count))
+        insert_recipes(
+            [
+                Recipe(
+                    user=user,
+                    title="Recipe %d" % i,
+                    time_minutes=5 + i % 120,
+                    price=1 + i % 50,
+                )
+                for i in numbers
+            ],
+            [
+                [tags[(i + j) % len(tags)].pk
+                 for j in range(tags_per_recipe)]
+                for i in numbers
+            ],
+            [
+                [ingredients[(i + j) % len(ingredients)].pk
+                 for j in range(ingredients_per_recipe)]
+                for i in numbers
+            ],
+            using=using,
+        )
+    return count
+
+
+# common names, most users share them, the others are numbered
+INGREDIENT_NAMES = [
+    "Salt", "Pepper", "Olive oil", "Butter", "Garlic", "Onion", "Sugar",
+    "Flour", "Egg", "Milk", "Lemon", "Tomato", "Basil", "Parsley",
+    "Rice", "Pasta", "Chicken", "Beef", "Carrot", "Potato", "Cheese",
+    "Cream", "Honey", "Ginger", "Cumin", "Paprika", "Thyme", "Leek",
+    "Mushroom", "Spinach", "Yogurt", "Vinegar", "Chili", "Coriander",
+]
+TAG_NAMES = [
+    "Vegan", "Vegetarian", "Dessert", "Breakfast", "Quick", "Spicy",
+    "Gluten free", "Dinner", "Lunch", "Soup", "Salad", "Healthy",
+]
+TITLE_WORDS = [
+    "Roasted", "Creamy", "Spicy", "Grilled", "Baked", "Slow cooked",
+    "Fresh", "Crispy", "Classic", "Summer", "Winter", "Homemade",
+]
+
+
+def zipf_counts(total, buckets, exponent):
+    """Split total into buckets sized like a Zipf distribution
+
+    The bucket of rank k gets a share proportional to 1 / k**exponent,
+    an exponent of 0 gives every bucket the same share"""
+    weights = [1 / rank ** exponent for rank in range(1, buckets + 1)]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for i in range(total - sum(counts)):
+        counts[i % buckets] += 1
+    return counts
+
+
+def numbered_names(common, prefix, count):
+    """Return count names, the common ones first"""
+    return common[:count] + [
+        "%s %d" % (prefix, i) for i in range(len(common), count)
+    ]
+
+
+def seed_dataset(users, recipes_per_user, tags=10, ingredients=50,
+                 exponent=1.1, email_prefix="seed", password="password",
+                 batch_size=5000, seed=0, log=None):
+    """Create users, tags, ingredients and skewed recipes in bulk
+
+    The users * recipes_per_user recipes are spread with zipf_counts
+    so a few users own most of them, like in production. Every user
+    has the same tag and ingredient names. The password is hashed once
+    and shared by every user. The same seed gives the same dataset.
+    log is called with the number of recipes after every batch. The
+    users are placed on their shard like the users created one by one
+    and their rows are inserted there. Returns the created users."""
+    random = Random(seed)
+    hashed = make_password(password)
+    emails = [
+        "%s-%d@example.com" % (email_prefix, i) for i in range(users)
+    ]
+    get_user_model().objects.bulk_create([
+        get_user_model()(email=email, name=email, password=hashed)
+        for email in emails
+    ])
+    created = list(
+        get_user_model().objects.filter(email__in=emails).order_by("id")
+    )
+    # bulk_create doesn't send the post_save placing the users
+    shards = {}
+    for user in created:
+        shards.setdefault(place_user(user), []).append(user)
+
+    tag_names = numbered_names(TAG_NAMES, "Tag", tags)
+    ingredient_names = numbered_names(
+        INGREDIENT_NAMES, "Ingredient", ingredients
+    )
+    related = {Tag: {}, Ingredient: {}}
+    for using, shard_users in shards.items():
+        for model, names in (
+            (Tag, tag_names), (Ingredient, ingredient_names)
+        ):
+            objects = model.objects.using(using)
+            if names:
+                objects.bulk_create([
+                    model(user=user, name=name)
+                    for user in shard_users for name in names
+                ])
+            rows = objects.filter(
+                user__in=[user.pk for user in shard_users]
+            ).order_by("id")
+            for user_id, pk in rows.values_list("user_id", "id"):
+                related[model].setdefault(user_id, []).append(pk)
+
+    counts = zipf_counts(users * recipes_per_user, users, exponent)
+    random.shuffle(counts)
+    counts = dict(zip((user.pk for user in created), counts))
+
+    batch, tag_ids, ingredient_ids = [], [], []
+    inserted = 0
+
+    def flush(using):
+        nonlocal inserted
+        insert_recipes(batch, tag_ids, ingredient_ids, using)
+        refresh_search_vectors([recipe.pk for recipe in batch], using)
+        inserted += len(batch)
+        del batch[:], tag_ids[:], ingredient_ids[:]
+        if log:
+            log(inserted)
+
+    for using, shard_users in shards.items():
+        for user in shard_users:
+            user_tags = related[Tag].get(user.pk, [])
+            user_ingredients = related[Ingredient].get(user.pk, [])
+            for i in range(counts[user.pk]):
+                batch.append(Recipe(
+                    user=user,
+                    title="%s %s %d" % (
+                        random.choice(TITLE_WORDS),
+                        random.choice(INGREDIENT_NAMES).lower(), i
+                    ),
+                    # most recipes are quick and cheap, a few aren't
+                    time_minutes=min(
+                        int(random.expovariate(1 / 30)) + 5, 600
+                    ),
+                    price=Decimal(
+                        min(random.lognormvariate(2, 0.7), 999.99)
+                    ).quantize(Decimal("0.01")),
+                ))
+                tag_ids.append(random.sample(
+                    user_tags, min(random.randint(0, 3), len(user_tags))
+                ))
+                ingredient_ids.append(random.sample(
+                    user_ingredients,
+                    min(random.randint(2, 8), len(user_ingredients))
+                ))
+                if len(batch) >= batch_size:
+                    flush(using)
+        # the recipes of a batch are inserted on one database
+        if batch:
+            flush(using)
+
+    return created
@@ -0,0 +1,38 @@
+import time
+
+from django.db import connections
+
+
+# seconds between two tests of a connection, see check_connections
+DEFAULT_HEALTH_CHECK_INTERVAL = 5
+
+
+def check_connections(**kwargs):
+    """Close the persistent connections which stopped working
+
+    Connected to request_started for the databases with
+    CONN_HEALTH_CHECKS, like Django 4.1 does. A connection kept by
+    CONN_MAX_AGE may have been closed by the server or a proxy since
+    the previous request, it's tested with a cheap query and closed so
+    the request opens a new one instead of failing on its first query.
+
+    A connection is tested once per CONN_HEALTH_CHECK_INTERVAL: the
+    requests following each other within it don't leave the connection
+    idle long enough to be closed, and they would otherwise each pay a
+    query per connection, used or not.
+    """
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        options = connection.settings_dict
+        if not options.get("CONN_HEALTH_CHECKS"):
+            continue
+        checked_at = getattr(connection, "health_checked_at", None)
+        if checked_at is not None and now - checked_at < options.get(
+            "CONN_HEALTH_CHECK_INTERVAL", DEFAULT_HEALTH_CHECK_INTERVAL
+        ):
+            continue
+        connection.health_checked_at = now
+        if not connection.is_usable():
+            connection.close()
@@ -0,0 +1,134 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, PBKDF2PasswordHasher
+)
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+DEFAULT_PASSWORD_HASHING = {
+    # the passwords hashed with other costs are rehashed on login
+    "PBKDF2_ITERATIONS": PBKDF2PasswordHasher.iterations,
+    "ARGON2_TIME_COST": 2,
+    # KiB used by each hash
+    "ARGON2_MEMORY_COST": 102400,
+    "ARGON2_PARALLELISM": 8,
+    # threads hashing the passwords, 0 hashes in the request threads
+    "WORKERS": max((os.cpu_count() or 1) // 2, 1),
+    # logins holding a request thread for their hash beyond which the
+    # next ones are refused, None for twice the WORKERS. It must stay
+    # well below the threads of the server
+    "MAX_PENDING": None,
+}
+
+
+def get_hashing_settings():
+    """Return the password hashing settings merged with the defaults"""
+    options = dict(DEFAULT_PASSWORD_HASHING)
+    options.update(getattr(settings, "PASSWORD_HASHING", {}))
+    return options
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many logins, retry in a few seconds."
+    default_code = "hashing_busy"
+    # sent as Retry-After by the exception handler of DRF
+    wait = 1
+
+
+class HashingPool:
+    """Bounded pool of threads hashing the passwords
+
+    The hashing functions of hashlib and argon2-cffi release the GIL,
+    so WORKERS threads keep up to WORKERS cores busy whatever the number
+    of logins. The request threads wait for their hash, at most
+    MAX_PENDING of them: the next logins fail at once with HashingBusy
+    instead of holding the threads which serve the other requests. By
+    default a login waits for at most one hash per thread of the pool
+    before its own."""
+
+    def __init__(self):
+        self._executor = None
+        self._workers = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def get_executor(self, workers):
+        with self._lock:
+            if self._workers != workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(
+                    workers, thread_name_prefix="hashing",
+                    initializer=self._mark_worker,
+                )
+                self._workers = workers
+            return self._executor
+
+    def _mark_worker(self):
+        self._local.worker = True
+
+    def run(self, function, *args):
+        """Return function(*args) computed by a thread of the pool"""
+        options = get_hashing_settings()
+        # a hasher calling another one is already in the pool
+        if not options["WORKERS"] or getattr(self._local, "worker", False):
+            return function(*args)
+
+        executor = self.get_executor(options["WORKERS"])
+        max_pending = options["MAX_PENDING"] or 2 * options["WORKERS"]
+        with self._lock:
+            if self._pending >= max_pending:
+                raise HashingBusy()
+            self._pending += 1
+        try:
+            return executor.submit(function, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+hashing_pool = HashingPool()
+
+
+class PooledHasherMixin:
+    """Hash and verify the passwords in the hashing pool"""
+
+    def encode(self, password, salt, *args):
+        return hashing_pool.run(super().encode, password, salt, *args)
+
+    def verify(self, password, encoded):
+        return hashing_pool.run(super().verify, password, encoded)
+
+
+class PBKDF2Hasher(PooledHasherMixin, PBKDF2PasswordHasher):
+    """PBKDF2 hasher whose iterations are set by PASSWORD_HASHING, the
+    passwords hashed with other iterations are rehashed on login"""
+
+    @property
+    def iterations(self):
+        return get_hashing_settings()["PBKDF2_ITERATIONS"]
+
+
+class Argon2Hasher(PooledHasherMixin, Argon2PasswordHasher):
+    """Memory hard Argon2 hasher whose costs are set by PASSWORD_HASHING,
+    it needs argon2-cffi"""
+
+    @property
+    def time_cost(self):
+        return get_hashing_settings()["ARGON2_TIME_COST"]
+
+    @property
+    def memory_cost(self):
+        return get_hashing_settings()["ARGON2_MEMORY_COST"]
+
+    @property
+    def parallelism(self):
+        return get_hashing_settings()["ARGON2_PARALLELISM"]
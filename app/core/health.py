@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEALTH_CHECK = {
+    # seconds the result of the database check is reused, the probes
+    # can then be sent at any rate
+    "TTL": 2,
+    # aliases checked by /readyz, None for the default database and the
+    # shards, the replicas are optional
+    "DATABASES": None,
+    # requests a process can serve at once, /readyz fails when they are
+    # all in progress, None to only report them
+    "MAX_IN_FLIGHT": None,
+}
+
+
+def get_health_check_settings():
+    """Return the health check settings merged with the defaults"""
+    options = dict(DEFAULT_HEALTH_CHECK)
+    options.update(getattr(settings, "HEALTH_CHECK", {}))
+    return options
+
+
+def check_database(alias):
+    """Return the state of a database, with the connections in use on
+    postgres since the server accepts a limited number of them"""
+    started = time.perf_counter()
+    try:
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT count(*), current_setting('max_connections') "
+                    "FROM pg_stat_activity"
+                )
+                used, limit = cursor.fetchone()
+            else:
+                cursor.execute("SELECT 1")
+                used = limit = None
+    except DatabaseError as exc:
+        logger.warning(
+            "Readiness check of the database %s failed", alias, exc_info=True
+        )
+        return {"ok": False, "error": str(exc).strip()}
+
+    state = {
+        "ok": True,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    if limit is not None:
+        state["connections"] = used
+        state["max_connections"] = int(limit)
+        state["saturation"] = round(used / int(limit), 3)
+    return state
+
+
+class HealthCheck:
+    """State of the process reported by the health endpoints
+
+    The database check runs at most once per TTL, the threads probing
+    meanwhile get the last result. The requests in flight are counted
+    by HealthCheckMiddleware."""
+
+    def __init__(self, timer=time.monotonic):
+        self.timer = timer
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._databases = None
+        self._expires_at = 0
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def get_aliases(self):
+        aliases = get_health_check_settings()["DATABASES"]
+        if aliases is None:
+            aliases = getattr(settings, "DATABASE_SHARDS", ["default"])
+        return aliases
+
+    def check_databases(self):
+        """Return the state of every database, cached for the TTL"""
+        with self._check_lock:
+            if self._databases is None or self._expires_at <= self.timer():
+                self._databases = {
+                    alias: check_database(alias)
+                    for alias in self.get_aliases()
+                }
+                self._expires_at = self.timer() + \
+                    get_health_check_settings()["TTL"]
+            return self._databases
+
+    def readiness(self, detailed=False):
+        """Return whether the process can take requests, and why when
+        detailed: the errors of the databases, their connections and the
+        requests in flight aren't shown to anyone"""
+        databases = self.check_databases()
+        capacity = get_health_check_settings()["MAX_IN_FLIGHT"]
+        # the probe itself isn't counted
+        workers = {"in_flight": self.in_flight, "capacity": capacity}
+        if capacity:
+            workers["saturation"] = round(self.in_flight / capacity, 3)
+
+        ready = all(state["ok"] for state in databases.values()) and (
+            not capacity or self.in_flight < capacity
+        )
+        data = {"status": "ok" if ready else "unavailable"}
+        if detailed:
+            data.update(databases=databases, workers=workers)
+        else:
+            data["databases"] = {
+                alias: {"ok": state["ok"]}
+                for alias, state in databases.items()
+            }
+        return ready, data
+
+    def reset(self):
+        with self._check_lock:
+            self._databases = None
+
+
+health_check = HealthCheck()
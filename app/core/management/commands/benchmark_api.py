@@ -0,0 +1,229 @@
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import django
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core.benchmarks import percentile, seed_dataset
+from core.models import Recipe
+
+
+PERCENTILES = (50, 95, 99)
+
+
+def get_revision():
+    """Return the git commit of the code, None outside of a checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """Django command measuring the API endpoints on seeded datasets
+
+    For every size a dataset of that many recipes is seeded with
+    seed_data in a transaction rolled back at the end, the requests
+    then go through the url patterns and the middlewares of the project
+    as the user owning the most recipes. The response cache is off
+    unless --response-cache is given so the numbers measure the views.
+    Run it with "python manage.py benchmark_api --output results.json"
+    and compare two runs with "--compare previous.json"
+    """
+
+    help = "Measure latency, queries and memory of the API endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", nargs="+", type=int, default=[1000, 10000],
+            help="Number of recipes of each seeded dataset"
+        )
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument(
+            "--requests", type=int, default=50,
+            help="Timed requests per endpoint"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=5,
+            help="Untimed requests per endpoint before the timed ones"
+        )
+        parser.add_argument(
+            "--endpoints", nargs="+",
+            help="Only measure these endpoints, by name"
+        )
+        parser.add_argument("--response-cache", action="store_true")
+        parser.add_argument("--output", help="JSON file of the results")
+        parser.add_argument(
+            "--compare", help="JSON file of a previous run to compare to"
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] <= 0 or options["users"] <= 0:
+            raise CommandError("--requests and --users must be positive")
+        previous = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as file:
+                    previous = json.load(file)
+            except (OSError, ValueError) as exc:
+                raise CommandError("Can't read %s: %s" % (
+                    options["compare"], exc
+                ))
+
+        results = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "revision": get_revision(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "requests": options["requests"],
+            "response_cache": options["response_cache"],
+            "datasets": [],
+        }
+        with override_settings(
+            ALLOWED_HOSTS=["testserver"],
+            API_RESPONSE_CACHE={"ENABLED": options["response_cache"]},
+        ):
+            for size in options["sizes"]:
+                results["datasets"].append(self.run(size, options))
+
+        self.report(results, previous)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write("Results written to %s" % options["output"])
+
+    def get_endpoints(self, user):
+        """Return the (name, method, url, data) of the endpoints"""
+        recipe = Recipe.objects.filter(user=user).order_by("-id").first()
+        tag_ids = list(
+            user.tag_set.order_by("id").values_list("id", flat=True)[:2]
+        )
+        recipes_url = reverse("recipe:recipe-list")
+        endpoints = [
+            ("users-me", "get", reverse("users:me"), None),
+            ("tags-list", "get", reverse("recipe:tag-list"), None),
+            ("ingredients-list", "get", reverse("recipe:ingredient-list"),
+             None),
+            ("recipes-list", "get", recipes_url, None),
+            ("recipes-list-big-page", "get", recipes_url,
+             {"page_size": 1000}),
+            ("recipes-filter-tags", "get", recipes_url,
+             {"tags": ",".join(str(pk) for pk in tag_ids)}),
+            ("recipes-filter-price", "get", recipes_url,
+             {"price_min": 5, "price_max": 20}),
+            ("recipes-search", "get", recipes_url, {"search": "creamy"}),
+            ("users-token", "post", reverse("users:token"),
+             {"email": user.email, "password": "password"}),
+        ]
+        if recipe is not None:
+            endpoints.append((
+                "recipes-detail", "get",
+                reverse("recipe:recipe-detail", args=[recipe.pk]), None
+            ))
+        return endpoints
+
+    def run(self, size, options):
+        """Seed a dataset of size recipes and measure every endpoint"""
+        with transaction.atomic():
+            users = seed_dataset(
+                options["users"], max(size // options["users"], 1),
+                email_prefix="benchmark-%d" % size,
+            )
+            user = max(users, key=lambda user: user.recipe_set.count())
+            token, _ = Token.objects.get_or_create(user=user)
+            client = Client(HTTP_AUTHORIZATION="Token %s" % token.key)
+
+            dataset = {
+                "size": size,
+                "user_recipes": user.recipe_set.count(),
+                "endpoints": {},
+            }
+            for name, method, url, data in self.get_endpoints(user):
+                if options["endpoints"] and \
+                        name not in options["endpoints"]:
+                    continue
+                request = getattr(client, method)
+                dataset["endpoints"][name] = self.measure(
+                    lambda: request(url, data), options
+                )
+
+            transaction.set_rollback(True)
+        return dataset
+
+    def measure(self, request, options):
+        """Return the latency, queries and memory of a request"""
+        for _ in range(options["warmup"]):
+            request()
+
+        latencies = []
+        for _ in range(options["requests"]):
+            start = time.perf_counter()
+            response = request()
+            latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise CommandError("%s answered %d" % (
+                response.request["PATH_INFO"], response.status_code
+            ))
+
+        # counted apart so they don't slow down the timed requests
+        with CaptureQueriesContext(connection) as queries:
+            tracemalloc.start()
+            response = request()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        result = {
+            "p%d_ms" % percent: round(percentile(latencies, percent), 3)
+            for percent in PERCENTILES
+        }
+        result.update({
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "queries": len(queries.captured_queries),
+            "peak_allocated_kib": peak // 1024,
+            "response_bytes": len(response.content),
+        })
+        return result
+
+    def report(self, results, previous):
+        """Write a table of the results, with the change of p50 from
+        the previous run"""
+        before = {}
+        for dataset in (previous or {}).get("datasets", []):
+            for name, result in dataset["endpoints"].items():
+                before[dataset["size"], name] = result
+
+        self.stdout.write("%8s %-24s %9s %9s %9s %8s %10s %9s" % (
+            "size", "endpoint", "p50 ms", "p95 ms", "p99 ms", "queries",
+            "alloc KiB", "p50 diff"
+        ))
+        for dataset in results["datasets"]:
+            for name, result in dataset["endpoints"].items():
+                diff = ""
+                old = before.get((dataset["size"], name))
+                if old:
+                    diff = "%+.1f%%" % (
+                        (result["p50_ms"] - old["p50_ms"])
+                        / max(old["p50_ms"], 1e-9) * 100
+                    )
+                self.stdout.write(
+                    "%8d %-24s %9.2f %9.2f %9.2f %8d %10d %9s" % (
+                        dataset["size"], name, result["p50_ms"],
+                        result["p95_ms"], result["p99_ms"],
+                        result["queries"], result["peak_allocated_kib"],
+                        diff,
+                    )
+                )
@@ -0,0 +1,287 @@
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core.asgi import ReadPoolASGIHandler
+from core.benchmarks import percentile, seed_dataset
+from core.models import Recipe
+
+
+MODES = ("wsgi", "asgi", "asgi-pool")
+PERCENTILES = (50, 95, 99)
+EMAIL_PREFIX = "benchmark-asgi"
+
+
+class Command(BaseCommand):
+    """Django command comparing the throughput of the read endpoints
+    served over WSGI and ASGI by many concurrent clients
+
+    The clients are coroutines sending their requests one after the
+    other, in process and without sockets so the numbers measure the
+    handlers:
+
+    - wsgi: the WSGIHandler run by --threads threads, like a threaded
+      WSGI server
+    - asgi: the ASGIHandler of Django, which serves the requests one at
+      a time in the thread of sync_to_async
+    - asgi-pool: the handler of core.asgi serving the reads from a pool
+      of --threads threads
+
+    The threads use their own database connections so the dataset is
+    committed, its users are deleted at the end. --db-latency adds a
+    delay to every query like the round trip to a remote database.
+    """
+
+    help = "Compare the throughput of WSGI and ASGI for concurrent clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=500)
+        parser.add_argument(
+            "--requests", type=int, default=5000,
+            help="Timed requests per mode, spread over the clients"
+        )
+        parser.add_argument(
+            "--threads", type=int, default=settings.ASGI_READ_THREADS,
+            help="Threads of the WSGI server and of the ASGI pool"
+        )
+        parser.add_argument(
+            "--db-latency", type=float, default=0,
+            help="Milliseconds added to every query"
+        )
+        parser.add_argument("--modes", nargs="+", choices=MODES,
+                            default=list(MODES))
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--recipes", type=int, default=1000)
+        parser.add_argument("--response-cache", action="store_true")
+        parser.add_argument("--output", help="JSON file of the results")
+
+    def handle(self, *args, **options):
+        if min(options["clients"], options["requests"],
+               options["threads"], options["users"]) <= 0:
+            raise CommandError(
+                "--clients, --requests, --threads and --users must be "
+                "positive"
+            )
+        results = {
+            "clients": options["clients"],
+            "requests": options["requests"],
+            "threads": options["threads"],
+            "db_latency_ms": options["db_latency"],
+            "modes": {},
+        }
+
+        def add_latency(execute, sql, params, many, context):
+            time.sleep(options["db_latency"] / 1000)
+            return execute(sql, params, many, context)
+
+        def on_connection(sender, connection, **kwargs):
+            # first in the list, the wrappers of the middlewares are
+            # popped from its end when the connection opens during a
+            # request
+            if add_latency not in connection.execute_wrappers:
+                connection.execute_wrappers.insert(0, add_latency)
+
+        users = seed_dataset(
+            options["users"], max(options["recipes"] // options["users"], 1),
+            email_prefix=EMAIL_PREFIX,
+        )
+        if options["db_latency"]:
+            connection_created.connect(on_connection)
+            # the handlers can reuse the connections opened by the seeding
+            for connection in connections.all():
+                on_connection(None, connection)
+        try:
+            user = max(users, key=lambda user: user.recipe_set.count())
+            token, _ = Token.objects.get_or_create(user=user)
+            paths = self.get_paths(user)
+            with override_settings(
+                ALLOWED_HOSTS=["testserver"],
+                API_RESPONSE_CACHE={"ENABLED": options["response_cache"]},
+                REQUEST_PROFILING={"SAMPLE_RATE": 0},
+            ):
+                for mode in options["modes"]:
+                    results["modes"][mode] = asyncio.run(
+                        self.run(mode, paths, token.key, options)
+                    )
+        finally:
+            connection_created.disconnect(on_connection)
+            for connection in connections.all():
+                if add_latency in connection.execute_wrappers:
+                    connection.execute_wrappers.remove(add_latency)
+            get_user_model().objects.filter(
+                email__startswith=EMAIL_PREFIX
+            ).delete()
+
+        self.report(results)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write("Results written to %s" % options["output"])
+
+    def get_paths(self, user):
+        """Return the paths of the list and retrieve requests"""
+        paths = [
+            reverse("recipe:recipe-list"),
+            reverse("recipe:tag-list"),
+            reverse("recipe:ingredient-list"),
+        ]
+        recipe = Recipe.objects.filter(user=user).order_by("-id").first()
+        if recipe is not None:
+            paths.append(reverse("recipe:recipe-detail", args=[recipe.pk]))
+        return paths
+
+    async def run(self, mode, paths, key, options):
+        """Serve the requests of the clients in a mode and return the
+        throughput and the latencies"""
+        executor = None
+        if mode == "wsgi":
+            handler = WSGIHandler()
+            executor = ThreadPoolExecutor(options["threads"])
+            loop = asyncio.get_running_loop()
+
+            async def request(path):
+                return await loop.run_in_executor(
+                    executor, self.call_wsgi, handler, path, key
+                )
+        else:
+            if mode == "asgi":
+                handler = ASGIHandler()
+            else:
+                handler = ReadPoolASGIHandler(options["threads"])
+                executor = handler.executor
+
+            async def request(path):
+                return await self.call_asgi(handler, path, key)
+
+        try:
+            for path in paths:
+                status = await request(path)
+                if status >= 400:
+                    raise CommandError("%s answered %d" % (path, status))
+            return await self.run_clients(request, paths, options)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    async def run_clients(self, request, paths, options):
+        """Send the requests from the concurrent clients"""
+        numbers = iter(range(options["requests"]))
+        latencies, errors = [], 0
+
+        async def client():
+            nonlocal errors
+            # the clients share the numbers, each one sends the next
+            # request once it got its response
+            for number in numbers:
+                start = time.perf_counter()
+                status = await request(paths[number % len(paths)])
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += status >= 400
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options["clients"])))
+        elapsed = time.perf_counter() - start
+
+        result = {
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "errors": errors,
+        }
+        result.update({
+            "p%d_ms" % percent: round(percentile(latencies, percent), 3)
+            for percent in PERCENTILES
+        })
+        return result
+
+    def call_wsgi(self, handler, path, key):
+        """Serve a request like a WSGI server and return its status"""
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": "",
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": "testserver",
+            "HTTP_AUTHORIZATION": "Token %s" % key,
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        statuses = []
+        response = handler(
+            environ, lambda status, headers: statuses.append(status)
+        )
+        try:
+            for _ in response:
+                pass
+        finally:
+            # sends request_finished
+            response.close()
+        return int(statuses[0].split()[0])
+
+    async def call_asgi(self, handler, path, key):
+        """Serve a request like an ASGI server and return its status"""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"authorization", b"Token %s" % key.encode()),
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        statuses = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        await handler(scope, receive, send)
+        return statuses[0]
+
+    def report(self, results):
+        self.stdout.write(
+            "%d clients, %d threads, %.1fms added per query" % (
+                results["clients"], results["threads"],
+                results["db_latency_ms"],
+            )
+        )
+        self.stdout.write("%-10s %10s %9s %9s %9s %7s" % (
+            "mode", "req/s", "p50 ms", "p95 ms", "p99 ms", "errors"
+        ))
+        for mode, result in results["modes"].items():
+            self.stdout.write("%-10s %10.1f %9.2f %9.2f %9.2f %7d" % (
+                mode, result["requests_per_second"], result["p50_ms"],
+                result["p95_ms"], result["p99_ms"], result["errors"],
+            ))
@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.benchmarks import create_recipes, measure
+from recipe.export import EXPORT_FORMATS
+from recipe.views import RecipeViewSet
+
+
+class Command(BaseCommand):
+    """Django command measuring the memory used by the recipe export
+
+    Each size is exported for a new user whose recipes are created in a
+    transaction rolled back at the end, the database is left as it was.
+    Run it with "python manage.py benchmark_export --sizes 10000 100000"
+    """
+
+    help = "Measure the duration and peak memory of the recipe export"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", nargs="+", type=int, default=[10000, 100000],
+            help="Number of recipes exported by each run"
+        )
+        parser.add_argument(
+            "--output", choices=list(EXPORT_FORMATS), default="ndjson"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            "%10s %10s %12s %10s %14s %12s" % (
+                "recipes", "seconds", "bytes", "rows/s",
+                "traced peak", "max rss"
+            )
+        )
+        for size in options["sizes"]:
+            result = self.run(size, options["output"])
+            self.stdout.write(
+                "%10d %10.2f %12d %10d %11d KiB %8d KiB" % (
+                    size, result["seconds"], result["bytes"],
+                    size / max(result["seconds"], 1e-9),
+                    result["peak_traced_kib"], result["max_rss_kib"],
+                )
+            )
+
+    def run(self, size, output):
+        """Export size recipes and return the measures"""
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                "benchmark-export-%d@example.com" % size, "benchmark"
+            )
+            create_recipes(user, size)
+
+            request = APIRequestFactory().get(
+                "/api/recipe/recipes/export/", {"output": output}
+            )
+            force_authenticate(request, user=user)
+            view = RecipeViewSet.as_view({"get": "export"})
+
+            with measure() as result:
+                response = view(request)
+                result["bytes"] = sum(
+                    len(chunk) for chunk in response.streaming_content
+                )
+
+            transaction.set_rollback(True)
+        return result
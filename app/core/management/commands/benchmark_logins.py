@@ -0,0 +1,123 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from core.benchmarks import percentile
+from core.hashers import get_hashing_settings
+
+
+HASHERS = {
+    "pbkdf2": "core.hashers.PBKDF2Hasher",
+    "argon2": "core.hashers.Argon2Hasher",
+}
+PASSWORD = "benchmark-password"
+
+
+class Command(BaseCommand):
+    """Django command measuring the logins per second each password
+    hashing policy allows
+
+    A login is timed by its password check, which is most of its cost.
+    The checks are sent by --threads concurrent request threads to a
+    hashing pool of --workers threads. The logins per core divide the
+    logins by the CPU time the process spent, whatever the number of
+    threads. Argon2 is measured when argon2-cffi is installed. Run it
+    with "python manage.py benchmark_logins --iterations 180000 60000"
+    """
+
+    help = "Measure the logins per second of the password hashers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations", nargs="+", type=int,
+            default=[get_hashing_settings()["PBKDF2_ITERATIONS"]],
+            help="PBKDF2 iterations of each measured policy"
+        )
+        parser.add_argument(
+            "--argon2", action="store_true",
+            help="Fail unless argon2-cffi is installed"
+        )
+        parser.add_argument("--logins", type=int, default=50)
+        parser.add_argument(
+            "--threads", type=int, default=os.cpu_count() or 1,
+            help="Concurrent request threads logging in"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=get_hashing_settings()["WORKERS"],
+            help="Threads of the hashing pool, 0 hashes in the request "
+                 "threads"
+        )
+
+    def handle(self, *args, **options):
+        if options["logins"] <= 0 or options["threads"] <= 0:
+            raise CommandError("--logins and --threads must be positive")
+        has_argon2 = find_spec("argon2") is not None
+        if options["argon2"] and not has_argon2:
+            raise CommandError("argon2-cffi isn't installed")
+
+        policies = [
+            ("pbkdf2", "%d iterations" % iterations,
+             {"PBKDF2_ITERATIONS": iterations})
+            for iterations in options["iterations"]
+        ]
+        if has_argon2:
+            hashing = get_hashing_settings()
+            policies.append(("argon2", "t=%d m=%dKiB p=%d" % (
+                hashing["ARGON2_TIME_COST"], hashing["ARGON2_MEMORY_COST"],
+                hashing["ARGON2_PARALLELISM"]
+            ), {}))
+
+        self.stdout.write("%d request threads, %d hashing workers" % (
+            options["threads"], options["workers"]
+        ))
+        self.stdout.write("%-8s %-24s %10s %14s %9s %9s" % (
+            "hasher", "cost", "logins/s", "logins/s/core", "p50 ms",
+            "p99 ms"
+        ))
+        for hasher, cost, hashing in policies:
+            hashing = dict(
+                getattr(settings, "PASSWORD_HASHING", {}),
+                WORKERS=options["workers"], **hashing
+            )
+            hashers = [HASHERS[hasher]] + [
+                path for path in settings.PASSWORD_HASHERS
+                if path != HASHERS[hasher]
+            ]
+            with override_settings(
+                PASSWORD_HASHERS=hashers, PASSWORD_HASHING=hashing
+            ):
+                result = self.measure(options)
+            self.stdout.write("%-8s %-24s %10.1f %14.1f %9.2f %9.2f" % (
+                hasher, cost, result["logins_per_second"],
+                result["logins_per_core"], result["p50_ms"], result["p99_ms"]
+            ))
+
+    def measure(self, options):
+        """Check the password of every login from the request threads"""
+        encoded = make_password(PASSWORD)
+        latencies = []
+
+        def login(_):
+            start = time.perf_counter()
+            if not check_password(PASSWORD, encoded):
+                raise CommandError("The password check failed")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        with ThreadPoolExecutor(options["threads"]) as executor:
+            start, cpu_start = time.perf_counter(), time.process_time()
+            list(executor.map(login, range(options["logins"])))
+            elapsed = time.perf_counter() - start
+            cpu = time.process_time() - cpu_start
+
+        return {
+            "logins_per_second": options["logins"] / elapsed,
+            "logins_per_core": options["logins"] / max(cpu, 1e-9),
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99),
+        }
@@ -0,0 +1,86 @@
+import timeit
+from collections import OrderedDict
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core import renderers
+
+
+def recipe_page(size):
+    """Return a page of recipes shaped like the output of the API"""
+    return OrderedDict([
+        ("next", "http://testserver/api/recipe/recipes/?cursor=eyJwIjpb"),
+        ("previous", None),
+        ("results", [
+            OrderedDict([
+                ("id", i),
+                ("title", "Roasted leek soup n°%d" % i),
+                ("time_minutes", 5 + i % 120),
+                ("price", "%d.%02d" % (i % 100, i % 97)),
+                ("user", 1),
+                ("link", "https://example.com/recipes/%d" % i),
+                ("tags", [1, 2, 3]),
+                ("ingredients", list(range(i % 8))),
+            ])
+            for i in range(size)
+        ]),
+    ])
+
+
+class Command(BaseCommand):
+    """Django command comparing FastJSONRenderer and FastJSONParser to
+    the JSONRenderer and JSONParser of DRF on pages of recipes
+    Run it with "python manage.py benchmark_renderers --sizes 100 1000"
+    """
+
+    help = "Compare the JSON renderers and parsers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", nargs="+", type=int, default=[100, 1000],
+            help="Number of recipes in the rendered page"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=200,
+            help="Number of renders timed per size"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("orjson installed: %s" % (
+            renderers.orjson is not None
+        ))
+        self.stdout.write("%8s %-8s %12s %12s %8s" % (
+            "recipes", "", "drf ms", "fast ms", "speedup"
+        ))
+        for size in options["sizes"]:
+            data = recipe_page(size)
+            # raw Decimals go through the encoder of DRF
+            data["results"][0]["price"] = Decimal("5.50")
+
+            body = JSONRenderer().render(data)
+            if renderers.FastJSONRenderer().render(data) != body:
+                raise CommandError("The renderers output differ")
+
+            self.compare(
+                size, "render", options["repeat"],
+                lambda: JSONRenderer().render(data),
+                lambda: renderers.FastJSONRenderer().render(data),
+            )
+            self.compare(
+                size, "parse", options["repeat"],
+                lambda: JSONParser().parse(BytesIO(body)),
+                lambda: renderers.FastJSONParser().parse(BytesIO(body)),
+            )
+
+    def compare(self, size, name, repeat, default, fast):
+        """Time both functions and write the mean of a call"""
+        default_ms = timeit.timeit(default, number=repeat) / repeat * 1000
+        fast_ms = timeit.timeit(fast, number=repeat) / repeat * 1000
+        self.stdout.write("%8d %-8s %12.3f %12.3f %7.1fx" % (
+            size, name, default_ms, fast_ms, default_ms / fast_ms
+        ))
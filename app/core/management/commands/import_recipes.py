@@ -0,0 +1,227 @@
+import json
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Tag, Ingredient, Recipe
+from core.shards import shard_for_user
+from recipe.cache import invalidate_scopes
+from recipe.conditional import user_scope
+from recipe.search import refresh_search_vectors
+
+
+RECIPE_FIELDS = ["title", "time_minutes", "price", "link"]
+
+
+class NameCache:
+    """Ids of the tags or the ingredients of each user by name, the
+    names missing from the cache are fetched or created with a few
+    queries per user and batch"""
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = {}
+
+    def load(self, user, names):
+        """Fetch or create the names of the user which aren't cached"""
+        cached = self.ids.setdefault(user.pk, {})
+        missing = [name for name in dict.fromkeys(names) if name not in cached]
+        if missing:
+            # the spellings of a name share the object the database
+            # finds with its own lowercasing
+            objects, _ = self.model.objects.get_or_create_many(
+                user, missing
+            )
+            cached.update(
+                (name, obj.pk) for name, obj in zip(missing, objects)
+            )
+
+    def get_ids(self, user, names):
+        """Return the ids of names already loaded for the user"""
+        cached = self.ids[user.pk]
+        return [cached[name] for name in names]
+
+
+class Command(BaseCommand):
+    """Django command importing recipes from an NDJSON file
+
+    Each line holds a recipe as written by the export of the API:
+    {"title": ..., "time_minutes": ..., "price": ..., "link": ...,
+    "tags": [names], "ingredients": [names], "user": email}
+    "user" is optional when --user is given. The missing tags and
+    ingredients are created. Every batch is written in its own
+    transaction and the offset of the next line is printed after it,
+    an interrupted import is resumed with --offset.
+    Run it with "python manage.py import_recipes dump.ndjson --user
+    me@example.com"
+    """
+
+    help = "Import recipes from an NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="NDJSON file, - for stdin")
+        parser.add_argument(
+            "--user", help="Email of the owner of the rows without one"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Number of lines written in one transaction"
+        )
+        parser.add_argument(
+            "--offset", type=int, default=0,
+            help="Number of lines to skip, to resume an import"
+        )
+        parser.add_argument(
+            "--strict", action="store_true",
+            help="Stop at the first invalid line instead of skipping it"
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] <= 0 or options["offset"] < 0:
+            raise CommandError("--batch-size and --offset must be positive")
+
+        self.strict = options["strict"]
+        self.default_email = options["user"]
+        self.users = {}
+        self.tags = NameCache(Tag)
+        self.ingredients = NameCache(Ingredient)
+
+        if options["path"] == "-":
+            self.import_file(sys.stdin, options)
+        else:
+            try:
+                with open(options["path"], encoding="utf-8") as file:
+                    self.import_file(file, options)
+            except OSError as exc:
+                raise CommandError(exc)
+
+    def import_file(self, file, options):
+        offset = options["offset"]
+        lines = islice(file, offset, None)
+        imported = skipped = 0
+        start = time.perf_counter()
+
+        while True:
+            batch = list(islice(lines, options["batch_size"]))
+            if not batch:
+                break
+
+            rows = []
+            for number, line in enumerate(batch, offset + 1):
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(self.parse_line(line))
+                except ValueError as exc:
+                    if self.strict:
+                        raise CommandError("Line %d: %s" % (number, exc))
+                    self.stderr.write("Line %d skipped: %s" % (number, exc))
+                    skipped += 1
+
+            imported += self.import_rows(rows)
+            offset += len(batch)
+            self.stdout.write(
+                "%d recipes imported, next offset %d, %.0f rows/s" % (
+                    imported, offset,
+                    imported / max(time.perf_counter() - start, 1e-9)
+                )
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            "Imported %d recipes, skipped %d lines in %.1fs" % (
+                imported, skipped, time.perf_counter() - start
+            )
+        ))
+
+    def get_user(self, email):
+        """Return the user with the email, cached for the next rows"""
+        if email not in self.users:
+            try:
+                self.users[email] = get_user_model().objects.get(
+                    email=email
+                )
+            except get_user_model().DoesNotExist:
+                self.users[email] = None
+        if self.users[email] is None:
+            raise ValueError("unknown user %r" % email)
+        return self.users[email]
+
+    def clean_names(self, data, field):
+        names = data.get(field, [])
+        if not isinstance(names, list) or \
+                not all(isinstance(name, str) for name in names):
+            raise ValueError("%s must be a list of names" % field)
+        name_field = Tag._meta.get_field("name")
+        return [name_field.clean(name.strip(), None) for name in names]
+
+    def parse_line(self, line):
+        """Return the (user, recipe fields, tags, ingredients) of a line
+
+        The values are checked with the model fields, the errors are
+        raised as ValueError"""
+        try:
+            data = json.loads(line)
+        except ValueError:
+            raise ValueError("invalid JSON")
+        if not isinstance(data, dict):
+            raise ValueError("expected an object")
+
+        email = data.get("user") or self.default_email
+        if not email:
+            raise ValueError("no user, use --user")
+
+        try:
+            fields = {
+                name: Recipe._meta.get_field(name).clean(
+                    data.get(name, ""), None
+                )
+                for name in RECIPE_FIELDS
+            }
+            tags = self.clean_names(data, "tags")
+            ingredients = self.clean_names(data, "ingredients")
+        except ValidationError as exc:
+            raise ValueError("; ".join(exc.messages))
+
+        return self.get_user(email), fields, tags, ingredients
+
+    def import_rows(self, rows):
+        """Write the parsed rows and return how many were created"""
+        if not rows:
+            return 0
+
+        # one lookup of the missing names per user of the batch
+        names = {}
+        for user, _, tags, ingredients in rows:
+            user_tags, user_ingredients = names.setdefault(
+                user, ({}, {})
+            )
+            user_tags.update(dict.fromkeys(tags))
+            user_ingredients.update(dict.fromkeys(ingredients))
+        for user, (tags, ingredients) in names.items():
+            self.tags.load(user, tags)
+            self.ingredients.load(user, ingredients)
+
+        # the recipes are written on the shard of their user
+        shards = {}
+        for user, fields, tags, ingredients in rows:
+            recipes, tag_ids, ingredient_ids = shards.setdefault(
+                shard_for_user(user), ([], [], [])
+            )
+            recipes.append(Recipe(user=user, **fields))
+            tag_ids.append(self.tags.get_ids(user, tags))
+            ingredient_ids.append(self.ingredients.get_ids(user, ingredients))
+
+        for alias, (recipes, tag_ids, ingredient_ids) in shards.items():
+            Recipe.objects.using(alias).bulk_create_with_relations(
+                recipes, tag_ids, ingredient_ids
+            )
+            # bulk_create doesn't send the post_save signals
+            refresh_search_vectors(
+                [recipe.pk for recipe in recipes], using=alias
+            )
+        invalidate_scopes(*[user_scope("recipe", user.pk) for user in names])
+        return len(rows)
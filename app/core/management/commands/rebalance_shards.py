@@ -0,0 +1,210 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+
+from core.models import RELATED_COLUMNS, Tag, Ingredient, Recipe
+from core.shards import (
+    copy_user_row, delete_user_row, fence_user, get_placement, get_shards,
+    is_cache_shared, set_shard_cache, unfence_user
+)
+from recipe.cache import invalidate_scopes
+from recipe.conditional import user_scope
+from recipe.export import chunked
+from recipe.search import refresh_search_vectors
+
+
+# seconds the writes of a user stay rejected if the command dies
+FENCE_TIMEOUT = 3600
+
+
+class Command(BaseCommand):
+    """Django command moving users with their rows to another shard
+
+    The move is online: the reads of the user are served by the old
+    shard until its rows are copied, then by the new one. The writes are
+    rejected with a 503 during the move, the command waits --grace
+    seconds after fencing them so the writes in progress finish before
+    the copy. The fence is stored in the default database. When
+    SHARD_CACHE is local to each process, the old rows are kept and the
+    writes fenced --directory-wait seconds more, until every process
+    has dropped the old shard from its cache. The users are moved in
+    groups of --group-size sharing that wait. The rows keep their ids.
+    Without users every user is moved to the shard its id places it on,
+    which rebalances the users after a shard is added.
+    Run it with "python manage.py rebalance_shards user@gmail.com
+    --to shard_1"
+    """
+
+    help = "Move users with their recipes, tags and ingredients to a shard"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "emails", nargs="*", help="Users to move, every user if none"
+        )
+        parser.add_argument("--to", help="Shard the users are moved to")
+        parser.add_argument(
+            "--grace", type=float, default=2.0,
+            help="Seconds to wait for the writes in progress"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Rows copied per query"
+        )
+        parser.add_argument(
+            "--directory-wait", type=float,
+            help="Seconds the old rows are kept after the switch, "
+                 "SHARD_CACHE_TTL unless SHARD_CACHE is shared"
+        )
+        parser.add_argument(
+            "--group-size", type=int, default=100,
+            help="Users fenced and switched together"
+        )
+
+    def handle(self, *args, **options):
+        shards = get_shards()
+        if len(shards) < 2:
+            raise CommandError("DATABASE_SHARDS lists a single database")
+        target = options["to"]
+        if target is not None and target not in shards:
+            raise CommandError("Unknown shard %s" % target)
+        if options["emails"] and target is None:
+            raise CommandError("Give the shard of the users with --to")
+        self.grace = options["grace"]
+        self.batch_size = options["batch_size"]
+        self.directory_wait = options["directory_wait"]
+        if self.directory_wait is None:
+            self.directory_wait = 0 if is_cache_shared() else getattr(
+                settings, "SHARD_CACHE_TTL", 300
+            )
+
+        users = get_user_model()._base_manager.using(
+            DEFAULT_DB_ALIAS
+        ).order_by("pk")
+        if options["emails"]:
+            users = list(users.filter(email__in=options["emails"]))
+            missing = set(options["emails"]) - {user.email for user in users}
+            if missing:
+                raise CommandError(
+                    "Unknown users: %s" % ", ".join(sorted(missing))
+                )
+
+        moves = (
+            (user, user.shard or DEFAULT_DB_ALIAS,
+             target or get_placement(user.pk))
+            for user in users
+        )
+        moved = 0
+        for group in chunked(
+            (move for move in moves if move[1] != move[2]),
+            options["group_size"]
+        ):
+            for user, source, destination, count in self.move(group):
+                moved += 1
+                self.stdout.write(
+                    "Moved %s from %s to %s with %d recipes" % (
+                        user.email, source, destination, count
+                    )
+                )
+
+        self.stdout.write(self.style.SUCCESS("Moved %d users" % moved))
+
+    def copy_rows(self, queryset, target, exclude=()):
+        """Copy the rows of a queryset to the target database"""
+        model = queryset.model
+        fields = [
+            field.attname for field in model._meta.concrete_fields
+            if field.attname not in exclude
+        ]
+        count = 0
+        rows = queryset.values(*fields).iterator(chunk_size=self.batch_size)
+        for batch in chunked(rows, self.batch_size):
+            model.objects.using(target).bulk_create(
+                [model(**row) for row in batch]
+            )
+            count += len(batch)
+        return count
+
+    def delete_rows(self, user, alias):
+        """Delete the recipes, tags and ingredients of a user"""
+        for model in (Recipe, Tag, Ingredient):
+            model.objects.using(alias).filter(user=user).delete()
+
+    def move(self, group):
+        """Move a group of (user, source, target), return them with the
+        number of recipes of each user"""
+        moved = []
+        for user, _, _ in group:
+            fence_user(
+                user.pk, FENCE_TIMEOUT + self.grace + self.directory_wait
+            )
+        try:
+            time.sleep(self.grace)
+            for user, source, target in group:
+                count = self.copy_user(user, source, target)
+                moved.append((user, source, target, count))
+        finally:
+            if moved:
+                # the processes whose cache still holds the old shard
+                # read the old rows, the writes stay fenced until then
+                time.sleep(self.directory_wait)
+            for user, source, _, _ in moved:
+                self.delete_rows(user, source)
+                if source != DEFAULT_DB_ALIAS:
+                    delete_user_row(user.pk, source)
+                invalidate_scopes(*[
+                    user_scope(name, user.pk)
+                    for name in ("recipe", "tag", "ingredient")
+                ])
+            for user, _, _ in group:
+                unfence_user(user.pk)
+
+        return moved
+
+    def copy_user(self, user, source, target):
+        """Copy a user and its rows to the target and switch the reads
+        to it, return the number of recipes"""
+        try:
+            with transaction.atomic(using=target):
+                if target != DEFAULT_DB_ALIAS:
+                    copy_user_row(user, target)
+                # rows left by a move which didn't finish
+                self.delete_rows(user, target)
+
+                for model in (Tag, Ingredient):
+                    self.copy_rows(
+                        model.objects.using(source).filter(user=user),
+                        target
+                    )
+                # rebuilt on the target
+                count = self.copy_rows(
+                    Recipe.objects.using(source).filter(user=user),
+                    target, exclude=("search_vector",)
+                )
+                for field in RELATED_COLUMNS:
+                    through = getattr(Recipe, field).through
+                    self.copy_rows(
+                        through.objects.using(source).filter(
+                            recipe__user=user
+                        ),
+                        target, exclude=("id",)
+                    )
+                refresh_search_vectors(list(
+                    Recipe.objects.using(target).filter(
+                        user=user
+                    ).values_list("id", flat=True)
+                ), using=target)
+        except IntegrityError as exc:
+            raise CommandError(
+                "Could not copy %s to %s, are the ids of the shards "
+                "in separate ranges? %s" % (user.email, target, exc)
+            )
+
+        # the reads go to the target from now on
+        get_user_model()._base_manager.using(DEFAULT_DB_ALIAS).filter(
+            pk=user.pk
+        ).update(shard=target)
+        set_shard_cache(user.pk, target)
+        return count
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from core.shards import get_shards
+from recipe.export import chunked
+from recipe.search import refresh_search_vectors, supports_full_text_search
+
+
+class Command(BaseCommand):
+    """Django command rebuilding the search vector of every recipe
+
+    The vectors are built with RECIPE_SEARCH_CONFIG, the ones built
+    with a previous configuration don't match the queries of the new
+    one. Run it after changing the setting with "python manage.py
+    rebuild_search_vectors"
+    """
+
+    help = "Rebuild the full text search vectors of the recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Recipes rebuilt per query"
+        )
+
+    def handle(self, *args, **options):
+        for alias in get_shards():
+            if not supports_full_text_search(alias):
+                self.stdout.write("%s has no search vectors" % alias)
+                continue
+
+            count = 0
+            ids = Recipe.objects.using(alias).order_by("pk").values_list(
+                "pk", flat=True
+            ).iterator(chunk_size=options["batch_size"])
+            for batch in chunked(ids, options["batch_size"]):
+                refresh_search_vectors(batch, using=alias)
+                count += len(batch)
+            self.stdout.write(self.style.SUCCESS(
+                "Rebuilt the search vectors of %d recipes on %s" % (
+                    count, alias
+                )
+            ))
@@ -0,0 +1,93 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.benchmarks import seed_dataset
+
+
+class Command(BaseCommand):
+    """Django command filling the database with a synthetic dataset
+
+    The recipes are spread over the users like a Zipf distribution,
+    --exponent 0 gives every user the same number of recipes. Every
+    user has the same tag and ingredient names and the password given
+    with --password.
+    Run it with "python manage.py seed_data --users 1000
+    --recipes-per-user 1000"
+    """
+
+    help = "Create users with skewed recipes, tags and ingredients"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument(
+            "--recipes-per-user", type=int, default=100,
+            help="Average number of recipes of a user"
+        )
+        parser.add_argument(
+            "--tags", type=int, default=10, help="Tags of each user"
+        )
+        parser.add_argument(
+            "--ingredients", type=int, default=50,
+            help="Ingredients of each user"
+        )
+        parser.add_argument(
+            "--exponent", type=float, default=1.1,
+            help="Skew of the number of recipes per user"
+        )
+        parser.add_argument(
+            "--email-prefix", default="seed",
+            help="The users are <prefix>-<n>@example.com"
+        )
+        parser.add_argument("--password", default="password")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        for name in ("users", "recipes_per_user", "batch_size"):
+            if options[name] <= 0:
+                raise CommandError("--%s must be positive" % (
+                    name.replace("_", "-")
+                ))
+        if options["tags"] < 0 or options["ingredients"] < 0:
+            raise CommandError("--tags and --ingredients can't be negative")
+
+        prefix = options["email_prefix"]
+        if get_user_model().objects.filter(
+            email__startswith=prefix + "-", email__endswith="@example.com"
+        ).exists():
+            raise CommandError(
+                "Users %s-*@example.com already exist, use another "
+                "--email-prefix" % prefix
+            )
+
+        start = time.perf_counter()
+        total = options["users"] * options["recipes_per_user"]
+
+        def log(inserted):
+            self.stdout.write("%d/%d recipes, %.0f rows/s" % (
+                inserted, total,
+                inserted / max(time.perf_counter() - start, 1e-9)
+            ))
+
+        with transaction.atomic():
+            seed_dataset(
+                options["users"],
+                options["recipes_per_user"],
+                tags=options["tags"],
+                ingredients=options["ingredients"],
+                exponent=options["exponent"],
+                email_prefix=prefix,
+                password=options["password"],
+                batch_size=options["batch_size"],
+                seed=options["seed"],
+                log=log,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            "Created %d users and %d recipes in %.1fs" % (
+                options["users"], total, time.perf_counter() - start
+            )
+        ))
@@ -1,7 +1,9 @@
+import random
 import time
-from django.core.management.base import BaseCommand
-from django.db.utils import OperationalError
+
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connections
+from django.db.utils import OperationalError
 
 # base command allows us to create base django command like "python3 manage.py createsuperuser"
 # here the command that we create is "python manage.py wait_for_db"
@@ -10,22 +12,47 @@ from django.db import connections
 
 class Command(BaseCommand):
 
-    """Django command to pause execution until database is ready """
+    """Django command to pause execution until database is ready
+
+    Every attempt opens a connection, the delay between the attempts
+    doubles up to --max-delay with a random jitter so the containers
+    started together don't retry in step. The command fails once
+    --timeout seconds have passed."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument(
+            "--timeout", type=float, default=60,
+            help="Seconds to wait before failing"
+        )
+        parser.add_argument(
+            "--delay", type=float, default=0.5,
+            help="Seconds to wait after the first attempt"
+        )
+        parser.add_argument("--max-delay", type=float, default=5)
 
     def handle(self, *args, **options):
-        # a function handle should contain the logic of the command 
-        self.stdout.write("Waiting for database") # write on the terminal the msg
-        db_conn = None # at first our db is not ready so our connection is false
-        
-        while not db_conn: # while our db_connection is not ready:
+        self.stdout.write("Waiting for database")
+        connection = connections[options["database"]]
+        deadline = time.monotonic() + options["timeout"]
+        delay = options["delay"]
+
+        while True:
             try:
-                # our db connections with our databse "default " is the Database key in our settings file 
-                db_conn = connections["default"]
-
-            except OperationalError: # if our database is not ready => throw an operationnalerror: 
-                self.stdout.write("Database is not available yet Wait 1 sec..")
-                time.sleep(1)
-                # it print into the terminal that msg and sleep the process 1 sec 
-        
+                # getting the connection doesn't connect, this does
+                connection.ensure_connection()
+                break
+            except OperationalError as exc:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError("Database is not available: %s" % exc)
+
+                wait = min(random.uniform(delay / 2, delay), remaining)
+                self.stdout.write(
+                    "Database is not available yet, retrying in %.1f sec.."
+                    % wait
+                )
+                time.sleep(wait)
+                delay = min(delay * 2, options["max_delay"])
+
         self.stdout.write(self.style.SUCCESS("Database is ready !"))
-        # once the db_conne = True => our database is ready to go 
\ No newline at end of file
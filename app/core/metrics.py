@@ -0,0 +1,369 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+
+
+DEFAULT_METRICS = {
+    "ENABLED": True,
+    "PATH": "/metrics",
+    # bearer token the scraper must send, None leaves /metrics open
+    "TOKEN": None,
+    # directory shared by the worker processes, each one writes its
+    # metrics there and /metrics adds them up. None keeps the metrics
+    # of each process to itself
+    "MULTIPROCESS_DIR": None,
+    # seconds between two writes of the metrics of a process
+    "FLUSH_INTERVAL": 1,
+}
+
+# name, help and upper bounds of the buckets of each histogram
+HISTOGRAMS = (
+    (
+        "http_request_duration_seconds", "Time spent serving the requests",
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    (
+        "http_request_queries", "Database queries run by the requests",
+        (0, 1, 2, 3, 5, 10, 20, 50, 100),
+    ),
+    (
+        "http_response_size_bytes", "Size of the response bodies",
+        (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152),
+    ),
+)
+LABELS = ("route", "method", "status")
+# file of MULTIPROCESS_DIR adding up the metrics of the stopped workers
+AGGREGATE_FILE = "metrics-aggregate.json"
+METHODS = {"GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH", "DELETE"}
+
+
+def get_metrics_settings():
+    """Return the metrics settings merged with the defaults"""
+    options = dict(DEFAULT_METRICS)
+    options.update(getattr(settings, "METRICS", {}))
+    return options
+
+
+def new_series():
+    """Return the request count and the empty histograms of a series,
+    a histogram is its count per bucket (the last one is +Inf) and the
+    sum of its values"""
+    return [0, [
+        [[0] * (len(buckets) + 1), 0] for _, _, buckets in HISTOGRAMS
+    ]]
+
+
+def merge_series(total, series):
+    total[0] += series[0]
+    for histogram, other in zip(total[1], series[1]):
+        histogram[0] = [a + b for a, b in zip(histogram[0], other[0])]
+        histogram[1] += other[1]
+
+
+def merge_snapshots(snapshots):
+    """Return the series and the counters of the snapshots added up"""
+    series, counters = {}, {}
+    for snapshot in snapshots:
+        for key, count, histograms in snapshot["series"]:
+            total = series.setdefault(tuple(key), new_series())
+            merge_series(total, [count, histograms])
+        for name, (help_text, value) in snapshot["counters"].items():
+            counter = counters.setdefault(name, [help_text, 0])
+            counter[1] += value
+    return series, counters
+
+
+def read_snapshot(path):
+    """Return the snapshot saved in a file, None when it can't be read"""
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(path, snapshot):
+    # readers see the old or the new file, never a partial one
+    with open(path + ".tmp", "w") as file:
+        json.dump(snapshot, file)
+    os.replace(path + ".tmp", path)
+
+
+def is_running(pid):
+    """Return whether a process of this host has the pid"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class DirectoryLock:
+    """flock() of a directory, shared by the readers of its files and
+    exclusive for the process folding them"""
+
+    def __init__(self, directory, exclusive=False):
+        self.directory = directory
+        self.operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+
+    def __enter__(self):
+        self.fd = os.open(self.directory, os.O_RDONLY)
+        fcntl.flock(self.fd, self.operation)
+        return self
+
+    def __exit__(self, *exc_info):
+        # closing the descriptor releases the lock
+        os.close(self.fd)
+
+
+def format_labels(labels):
+    return ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\")
+                     .replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Metrics:
+    """Request metrics of the process aggregated by route, method and
+    status
+
+    A request is recorded with one lock acquisition and a bisect per
+    histogram. With MULTIPROCESS_DIR, the process writes its metrics to
+    its own file at most once per FLUSH_INTERVAL, the files of the
+    workers which stopped keep counting in the totals like counters
+    should. The file is named after the pid and a random id drawn when
+    the process starts, a worker reusing the pid of a stopped one
+    doesn't overwrite its file. The first flush of a process folds the
+    files of the stopped workers into AGGREGATE_FILE and deletes them,
+    so the directory holds a file per running worker and one for the
+    others. Collectors registered by the apps add their own counters."""
+
+    def __init__(self, timer=time.monotonic):
+        self.timer = timer
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.collectors = []
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._start(os.getpid())
+            self._flushed_at = 0
+
+    def _start(self, pid):
+        self._pid, self._run_id = pid, uuid.uuid4().hex[:12]
+        self._series = {}
+        self._folded = False
+
+    def register(self, collector):
+        """Add a function returning (name, help, value) counters"""
+        self.collectors.append(collector)
+
+    def observe(self, route, method, status, values):
+        """Record a request, values holds the observation of each
+        histogram, None to leave one out"""
+        if method not in METHODS:
+            method = "other"
+        key = (route, method, str(status))
+        with self._lock:
+            if self._pid != os.getpid():
+                # a forked worker doesn't report the requests of its
+                # parent and writes its own file
+                self._start(os.getpid())
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = new_series()
+            series[0] += 1
+            for (_, _, buckets), value, histogram in zip(
+                HISTOGRAMS, values, series[1]
+            ):
+                if value is not None:
+                    histogram[0][bisect_left(buckets, value)] += 1
+                    histogram[1] += value
+        self.maybe_flush()
+
+    def snapshot(self):
+        """Return the metrics of the process as JSON compatible data"""
+        with self._lock:
+            series = [
+                [list(key), count, [[list(counts), total]
+                                    for counts, total in histograms]]
+                for key, (count, histograms) in self._series.items()
+            ]
+        counters = {}
+        for collector in self.collectors:
+            for name, help_text, value in collector():
+                counters[name] = [help_text, value]
+        return {"series": series, "counters": counters}
+
+    def get_file(self, directory):
+        return os.path.join(
+            directory, "metrics-%d-%s.json" % (self._pid, self._run_id)
+        )
+
+    def flush(self):
+        """Write the metrics of the process to its file"""
+        directory = get_metrics_settings()["MULTIPROCESS_DIR"]
+        if not directory:
+            return
+        if not self._folded:
+            self.fold(directory)
+            self._folded = True
+        write_snapshot(self.get_file(directory), self.snapshot())
+        self._flushed_at = self.timer()
+
+    def fold(self, directory):
+        """Add the files of the stopped workers to AGGREGATE_FILE and
+        delete them
+
+        The aggregate lists the files it holds, /metrics skips them
+        until they are deleted so their requests are counted once. The
+        pids are checked on this host, MULTIPROCESS_DIR mustn't be
+        shared with the processes of another one."""
+        aggregate_path = os.path.join(directory, AGGREGATE_FILE)
+        with DirectoryLock(directory, exclusive=True):
+            aggregate = read_snapshot(aggregate_path)
+            folded = aggregate["folded"] if aggregate else []
+            snapshots = [aggregate] if aggregate else []
+            stopped = []
+            for path in glob.glob(os.path.join(directory, "metrics-*-*.json")):
+                name = os.path.basename(path)
+                try:
+                    pid = int(name.split("-")[1])
+                except ValueError:
+                    continue
+                if name in folded or is_running(pid):
+                    continue
+                snapshot = read_snapshot(path)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+                    stopped.append(name)
+            if not stopped:
+                return
+
+            series, counters = merge_snapshots(snapshots)
+            write_snapshot(aggregate_path, {
+                "series": [
+                    [list(key), count, histograms]
+                    for key, (count, histograms) in series.items()
+                ],
+                "counters": counters,
+                # the files deleted by an earlier fold are forgotten
+                "folded": [
+                    name for name in folded
+                    if os.path.exists(os.path.join(directory, name))
+                ] + stopped,
+            })
+            for name in stopped:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def maybe_flush(self):
+        options = get_metrics_settings()
+        if not options["MULTIPROCESS_DIR"] or \
+                self.timer() - self._flushed_at < options["FLUSH_INTERVAL"]:
+            return
+        # a single thread writes, the others go on
+        if self._flush_lock.acquire(blocking=False):
+            try:
+                self.flush()
+            finally:
+                self._flush_lock.release()
+
+    def collect(self):
+        """Return the series and the counters of every process"""
+        snapshots = [self.snapshot()]
+        directory = get_metrics_settings()["MULTIPROCESS_DIR"]
+        if directory:
+            with DirectoryLock(directory):
+                snapshots.extend(self.read_files(directory))
+        return merge_snapshots(snapshots)
+
+    def read_files(self, directory):
+        """Return the snapshots of the other processes and the
+        aggregate of the stopped ones"""
+        aggregate_path = os.path.join(directory, AGGREGATE_FILE)
+        aggregate = read_snapshot(aggregate_path)
+        skipped = {self.get_file(directory), aggregate_path}
+        snapshots = []
+        if aggregate is not None:
+            skipped.update(
+                os.path.join(directory, name) for name in aggregate["folded"]
+            )
+            snapshots.append(aggregate)
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            if path not in skipped:
+                snapshot = read_snapshot(path)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        return snapshots
+
+    def render(self):
+        """Return the metrics in the Prometheus text format"""
+        series, counters = self.collect()
+        keys = sorted(series)
+        lines = [
+            "# HELP http_requests_total Requests served",
+            "# TYPE http_requests_total counter",
+        ]
+        for key in keys:
+            lines.append("http_requests_total{%s} %d" % (
+                format_labels(zip(LABELS, key)), series[key][0]
+            ))
+
+        for index, (name, help_text, buckets) in enumerate(HISTOGRAMS):
+            lines.append("# HELP %s %s" % (name, help_text))
+            lines.append("# TYPE %s histogram" % name)
+            for key in keys:
+                counts, total = series[key][1][index]
+                labels = list(zip(LABELS, key))
+                cumulative = 0
+                for bound, count in zip(buckets + ("+Inf",), counts):
+                    cumulative += count
+                    lines.append("%s_bucket{%s} %d" % (
+                        name, format_labels(labels + [("le", bound)]),
+                        cumulative
+                    ))
+                lines.append("%s_sum{%s} %s" % (
+                    name, format_labels(labels), format_value(total)
+                ))
+                lines.append("%s_count{%s} %d" % (
+                    name, format_labels(labels), cumulative
+                ))
+
+        for name in sorted(counters):
+            help_text, value = counters[name]
+            lines.append("# HELP %s %s" % (name, help_text))
+            lines.append("# TYPE %s counter" % name)
+            lines.append("%s %s" % (name, format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,231 @@
+import hmac
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, JsonResponse
+from django.utils.module_loading import import_string
+
+from core.health import health_check
+from core.metrics import QueryCounter, get_metrics_settings, metrics
+from core.profiling import (
+    RequestProfile, current_profile, get_profiling_settings,
+    wants_server_timing
+)
+from core.routers import pin_user, read_alias
+
+
+def has_metrics_token(request):
+    """Return whether the request carries the bearer token of /metrics,
+    any request does while no TOKEN is set"""
+    token = get_metrics_settings()["TOKEN"]
+    if not token:
+        return True
+    return hmac.compare_digest(
+        request.META.get("HTTP_AUTHORIZATION", ""), "Bearer " + token
+    )
+
+
+class HealthCheckMiddleware:
+    """Answer the liveness and readiness probes before any other
+    middleware, the probes skip the authentication, the sessions and the
+    url resolution
+
+    /healthz only tells the process is up, /readyz also checks the
+    databases (the result is cached for a few seconds, see core.health)
+    and fails with a 503 while they are down or while the process is
+    saturated. The errors, the connections and the requests in flight
+    are only detailed to the clients sending the token of /metrics. The
+    other requests are counted while they run."""
+
+    liveness_path = "/healthz"
+    readiness_path = "/readyz"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def respond(self, status, data):
+        response = JsonResponse(data, status=status)
+        response["Cache-Control"] = "no-store"
+        return response
+
+    def __call__(self, request):
+        path = request.path_info.rstrip("/")
+        if path == self.liveness_path:
+            return self.respond(200, {"status": "ok"})
+        if path == self.readiness_path:
+            ready, data = health_check.readiness(
+                detailed=has_metrics_token(request)
+            )
+            return self.respond(200 if ready else 503, data)
+
+        health_check.started()
+        try:
+            return self.get_response(request)
+        finally:
+            health_check.finished()
+
+
+class MetricsMiddleware:
+    """Record the duration, the queries and the response size of every
+    request by route name and status, and serve them on /metrics in the
+    Prometheus text format, see core.metrics"""
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = get_metrics_settings()
+        if request.path_info == options["PATH"]:
+            if not has_metrics_token(request):
+                return HttpResponse(status=401)
+            return HttpResponse(
+                metrics.render(), content_type=self.content_type
+            )
+        if not options["ENABLED"]:
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        # the route names keep the number of series bounded
+        match = getattr(request, "resolver_match", None)
+        route = match.view_name if match is not None else "unmatched"
+        size = None if response.streaming else len(response.content)
+        metrics.observe(
+            route, request.method, response.status_code,
+            (duration, counter.count, size)
+        )
+        return response
+
+
+class ProfilingMiddleware:
+    """Profile a sample of the requests, see core.profiling
+
+    The queries of a profiled request are timed on every database with
+    an execute wrapper, the authentication, the serializers and the
+    rendering time themselves. The timings are sent in a Server-Timing
+    header to the clients allowed by HEADER or TOKEN and the slow
+    queries are logged with the view and the serializer which ran them.
+    The requests left out only cost a call to random()."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = get_profiling_settings()
+        if random.random() >= options["SAMPLE_RATE"]:
+            return self.get_response(request)
+
+        profile = RequestProfile(options["SLOW_QUERY_MS"])
+        token = current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+
+        if wants_server_timing(request, options):
+            response["Server-Timing"] = profile.server_timing()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return None
+        view_class = getattr(view_func, "cls", None)
+        if view_class is None:
+            profile.view = view_func.__name__
+            return None
+        # the action of a viewset, RecipeViewSet.retrieve for example
+        action = getattr(view_func, "actions", {}).get(
+            request.method.lower()
+        )
+        profile.view = view_class.__name__ + ("." + action if action else "")
+        return None
+
+
+class NonAPIMiddleware:
+    """Run the middlewares of NON_API_MIDDLEWARE for the urls outside
+    of API_URL_PREFIX only
+
+    The API is authenticated with tokens, its requests don't need the
+    sessions, the CSRF cookie, the messages or the user of the
+    sessions, which the admin still uses. The wrapped middlewares only
+    get their process_request, process_response and process_view hooks
+    called."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = getattr(settings, "API_URL_PREFIX", "/api/")
+
+        handler = get_response
+        self.view_hooks = []
+        for path in reversed(getattr(settings, "NON_API_MIDDLEWARE", [])):
+            middleware = import_string(path)(handler)
+            if hasattr(middleware, "process_view"):
+                self.view_hooks.insert(0, middleware.process_view)
+            handler = middleware
+        self.handler = handler
+
+    def is_api(self, request):
+        return request.path_info.startswith(self.prefix)
+
+    def __call__(self, request):
+        if self.is_api(request):
+            return self.get_response(request)
+        return self.handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.is_api(request):
+            return None
+        for hook in self.view_hooks:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+
+class ReplicaMiddleware:
+    """Reset the read replica chosen by core.routers.ReplicaReadMixin at
+    the end of the request and pin the users who sent a write to the
+    primary for REPLICA_PIN_SECONDS, so their next reads can't miss
+    what they wrote while the replicas catch up
+
+    The pins are kept by user id in the cache named by
+    REPLICA_PIN_CACHE, which must be shared by the processes. The user
+    is the one the view authenticated, the anonymous writes pin
+    nobody."""
+
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request.replica_token is not None:
+                read_alias.reset(request.replica_token)
+
+        if request.method not in self.safe_methods:
+            # set on the request by the authentication of the view
+            user = getattr(request, "user", None)
+            if user is not None and user.is_authenticated:
+                pin_user(user.pk)
+        return response
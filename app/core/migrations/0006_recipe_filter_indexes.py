@@ -0,0 +1,33 @@
+# Generated by Django 3.0.14 on 2026-10-18 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'price'], name='core_recipe_user_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'time_minutes'], name='core_recipe_user_time_idx'),
+        ),
+        # the auto created through tables only have a (recipe_id, x_id)
+        # unique index, those indexes serve the lookups by tag/ingredient
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_tags_tag_recipe_idx '
+            'ON core_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX core_recipe_tags_tag_recipe_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_ingr_ingr_recipe_idx '
+            'ON core_recipe_ingredients (ingredient_id, recipe_id)',
+            'DROP INDEX core_recipe_ingr_ingr_recipe_idx',
+        ),
+    ]
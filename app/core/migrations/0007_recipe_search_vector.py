@@ -0,0 +1,62 @@
+# Generated by Django 3.0.14 on 2026-10-18 03:56
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+# built with RECIPE_SEARCH_CONFIG like recipe.search, the command
+# rebuild_search_vectors rebuilds them when it changes
+FILL_SEARCH_VECTOR_SQL = """
+UPDATE core_recipe SET search_vector =
+    setweight(to_tsvector(%(config)s, core_recipe.title), 'A') ||
+    setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(core_tag.name, ' ')
+        FROM core_tag
+        INNER JOIN core_recipe_tags
+            ON core_recipe_tags.tag_id = core_tag.id
+        WHERE core_recipe_tags.recipe_id = core_recipe.id
+    ), '')), 'B') ||
+    setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(core_ingredient.name, ' ')
+        FROM core_ingredient
+        INNER JOIN core_recipe_ingredients
+            ON core_recipe_ingredients.ingredient_id = core_ingredient.id
+        WHERE core_recipe_ingredients.recipe_id = core_recipe.id
+    ), '')), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    """Fill the search vectors and index them, postgres only"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(FILL_SEARCH_VECTOR_SQL, {
+        'config': getattr(settings, 'RECIPE_SEARCH_CONFIG', 'english'),
+    })
+    schema_editor.execute(
+        'CREATE INDEX core_recipe_search_vector_idx '
+        'ON core_recipe USING gin (search_vector)'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX core_recipe_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
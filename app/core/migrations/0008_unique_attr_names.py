@@ -0,0 +1,73 @@
+from django.db import migrations
+from django.db.models import Count, Min
+from django.db.models.functions import Lower
+
+
+def merge_duplicates(apps, model_name, relation, column):
+    """Merge the objects of a user sharing the same lowercased name
+
+    The object with the smallest id is kept and the recipes linked to
+    the duplicates are linked to it instead."""
+    model = apps.get_model('core', model_name)
+    through = apps.get_model('core', 'Recipe')._meta.get_field(
+        relation
+    ).remote_field.through
+
+    groups = model.objects.annotate(
+        lower_name=Lower('name')
+    ).values('user_id', 'lower_name').annotate(
+        count=Count('id'), keep_id=Min('id')
+    ).filter(count__gt=1)
+
+    for group in groups:
+        duplicate_ids = list(model.objects.annotate(
+            lower_name=Lower('name')
+        ).filter(
+            user_id=group['user_id'], lower_name=group['lower_name']
+        ).exclude(id=group['keep_id']).values_list('id', flat=True))
+
+        linked = set(through.objects.filter(
+            **{column: group['keep_id']}
+        ).values_list('recipe_id', flat=True))
+        stale_ids = []
+        for link_id, recipe_id in through.objects.filter(
+            **{'%s__in' % column: duplicate_ids}
+        ).values_list('id', 'recipe_id'):
+            if recipe_id in linked:
+                # the recipe is already linked to the kept object
+                stale_ids.append(link_id)
+            else:
+                through.objects.filter(id=link_id).update(
+                    **{column: group['keep_id']}
+                )
+                linked.add(recipe_id)
+
+        through.objects.filter(id__in=stale_ids).delete()
+        model.objects.filter(id__in=duplicate_ids).delete()
+
+
+def merge_duplicate_names(apps, schema_editor):
+    merge_duplicates(apps, 'Tag', 'tags', 'tag_id')
+    merge_duplicates(apps, 'Ingredient', 'ingredients', 'ingredient_id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+        # django can't express a constraint on lower(name) yet
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_tag_user_lower_name_uniq '
+            'ON core_tag (user_id, LOWER(name))',
+            'DROP INDEX core_tag_user_lower_name_uniq',
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_ingr_user_lower_name_uniq '
+            'ON core_ingredient (user_id, LOWER(name))',
+            'DROP INDEX core_ingr_user_lower_name_uniq',
+        ),
+    ]
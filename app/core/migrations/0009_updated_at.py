@@ -0,0 +1,40 @@
+# Generated by Django 3.0.14 on 2026-10-18 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_unique_attr_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        # sqlite rebuilds the tables to add a column and loses the unique
+        # indexes created with RunSQL in 0008, they are created again
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX IF NOT EXISTS core_tag_user_lower_name_uniq '
+            'ON core_tag (user_id, LOWER(name))',
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX IF NOT EXISTS core_ingr_user_lower_name_uniq '
+            'ON core_ingredient (user_id, LOWER(name))',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='shard',
+            field=models.CharField(blank=True, editable=False, max_length=63),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 05:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_user_shard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_generation',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
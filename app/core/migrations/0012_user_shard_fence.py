@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_user_token_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='shard_fenced_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,10 +1,14 @@
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models.functions import Lower
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import (
                                     BaseUserManager, AbstractBaseUser, 
                                     PermissionsMixin
                                             )
 from django.conf import settings
 
+from core.shards import shard_for_user
+
 class UserManager(BaseUserManager):
 
     def create_user(self, email, password=None, **extra_fields):
@@ -36,11 +40,206 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # alias of the database holding the recipes, tags and ingredients
+    # of the user, empty for the default database, see core.shards
+    shard = models.CharField(max_length=63, blank=True, editable=False)
+    # the writes of the user are rejected until then while
+    # rebalance_shards moves its rows
+    shard_fenced_until = models.DateTimeField(
+        null=True, blank=True, editable=False
+    )
+    # generation of the signed tokens accepted for the user, increased
+    # to revoke the tokens issued before, see core.tokens
+    token_generation = models.PositiveIntegerField(
+        default=0, editable=False
+    )
 
     objects = UserManager()
     USERNAME_FIELD = "email"
 
 
+class ShardedQuerySet(models.QuerySet):
+    """Queryset of the models whose rows live on the shard of their user"""
+
+    def on_shard(self, user):
+        """Return the queryset on the database holding the rows of the
+        user, unless the queryset was given a database"""
+        if self._db is not None:
+            return self
+        alias = shard_for_user(user)
+        # the default database is left to the routers, the reads may
+        # go to a replica
+        return self if alias == DEFAULT_DB_ALIAS else self.using(alias)
+
+    def for_user(self, user):
+        """Return the objects of the user from its shard"""
+        return self.on_shard(user).filter(user=user)
+
+    def create(self, **kwargs):
+        # the routers only get the model, the shard of the user is
+        # chosen here
+        user = kwargs.get("user", kwargs.get("user_id"))
+        if user is not None:
+            queryset = self.on_shard(user)
+            if queryset is not self:
+                return queryset.create(**kwargs)
+        return super().create(**kwargs)
+
+
+class RecipeAttrQuerySet(ShardedQuerySet):
+    """Queryset shared by the tags and the ingredients
+
+    Their names are unique per user whatever their case, the database
+    enforces it with a unique index on (user_id, lower(name))"""
+
+    # looks the names up in the database of the user, lowered by it
+    MATCH_NAMES_SQL = (
+        "WITH wanted (num, name) AS (VALUES %(values)s) "
+        "SELECT %(columns)s, LOWER(wanted.name) AS lower_name "
+        "FROM wanted LEFT JOIN %(table)s ON %(table)s.%(user)s = %%s "
+        "AND LOWER(%(table)s.%(name)s) = LOWER(wanted.name) "
+        "ORDER BY wanted.num"
+    )
+
+    def match_names(self, user, names):
+        """Return the names lowered by the database of the user and the
+        object of the user matching each one, None when it's missing
+
+        The database may not lowercase like Python, sqlite only lowers
+        the ASCII letters, so the names are compared with its LOWER in
+        the query looking them up."""
+        using = self.on_shard(user).db
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        columns = ", ".join(
+            "%s.%s" % (quote(meta.db_table), quote(field.column))
+            for field in meta.concrete_fields
+        )
+        size = max(connection.ops.bulk_batch_size(["num", "name"], names), 1)
+
+        matches = []
+        for start in range(0, len(names), size):
+            batch = names[start:start + size]
+            sql = self.MATCH_NAMES_SQL % {
+                "values": ", ".join(["(%s, %s)"] * len(batch)),
+                "columns": columns,
+                "table": quote(meta.db_table),
+                "user": quote(meta.get_field("user").column),
+                "name": quote(meta.get_field("name").column),
+            }
+            params = [
+                value for row in enumerate(batch, start) for value in row
+            ]
+            for obj in self.raw(sql, params + [user.pk], using=using):
+                matches.append(
+                    (obj.lower_name, obj if obj.pk is not None else None)
+                )
+        return matches
+
+    def filter_lower_names(self, user, lower_names):
+        """Return the objects of the user with the given names lowered
+        by the database, annotated with their lower_name"""
+        return self.for_user(user).annotate(
+            lower_name=Lower("name")
+        ).filter(lower_name__in=lower_names)
+
+    def insert_names(self, user, names, batch_size=None):
+        """Insert the objects of the user with the given names with
+        INSERT ... ON CONFLICT DO NOTHING and return the ones inserted,
+        the names a concurrent call inserted first are left out
+
+        The inserted rows are told by RETURNING, supported by postgres
+        and sqlite 3.35 or later. They are annotated with their
+        lower_name like the objects of filter_lower_names."""
+        using = self.on_shard(user).db
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        fields = [
+            field for field in meta.concrete_fields if not field.primary_key
+        ]
+        objs = [self.model(user=user, name=name) for name in names]
+        size = connection.ops.bulk_batch_size(fields, objs)
+        if batch_size:
+            size = min(size, batch_size)
+
+        inserted = {}
+        with connection.cursor() as cursor:
+            for start in range(0, len(objs), size):
+                batch = objs[start:start + size]
+                params = [
+                    field.get_db_prep_save(
+                        field.pre_save(obj, add=True), connection
+                    )
+                    for obj in batch for field in fields
+                ]
+                cursor.execute(
+                    "%s %s (%s) VALUES %s %s RETURNING %s, %s, "
+                    "LOWER(%s)" % (
+                        connection.ops.insert_statement(True),
+                        quote(meta.db_table),
+                        ", ".join(quote(field.column) for field in fields),
+                        ", ".join(
+                            ["(%s)" % ", ".join(["%s"] * len(fields))]
+                            * len(batch)
+                        ),
+                        connection.ops.ignore_conflicts_suffix_sql(True),
+                        quote(meta.pk.column),
+                        quote(meta.get_field("name").column),
+                        quote(meta.get_field("name").column),
+                    ),
+                    params
+                )
+                inserted.update(
+                    (name, (pk, lower_name))
+                    for pk, name, lower_name in cursor.fetchall()
+                )
+
+        created = []
+        for obj in objs:
+            if obj.name in inserted:
+                obj.pk, obj.lower_name = inserted[obj.name]
+                obj._state.adding, obj._state.db = False, using
+                created.append(obj)
+        return created
+
+    def get_or_create_many(self, user, names, batch_size=None):
+        """Return the objects of the user with the given names, the
+        missing ones are created with INSERT ... ON CONFLICT DO NOTHING
+        so concurrent calls never create duplicates.
+
+        Returns the object of each name, the spellings of a name share
+        it, along with the names lowered by the database which were
+        inserted by this call."""
+        names = list(names)
+        matches = self.match_names(user, names)
+        # the first spelling of a name is the one created
+        wanted, found = {}, {}
+        for (key, obj), name in zip(matches, names):
+            wanted.setdefault(key, name)
+            if obj is not None:
+                found[key] = obj
+
+        missing = [key for key in wanted if key not in found]
+        created = []
+        if missing:
+            for obj in self.insert_names(
+                user, [wanted[key] for key in missing], batch_size
+            ):
+                found[obj.lower_name] = obj
+                created.append(obj.lower_name)
+            # the names a concurrent call inserted first
+            lost = [key for key in missing if key not in found]
+            if lost:
+                found.update(
+                    (obj.lower_name, obj)
+                    for obj in self.filter_lower_names(user, lost)
+                )
+
+        return [found[key] for key, _ in matches], created
+
+
 class Tag(models.Model):
     """Tag to be used for a recipe"""
     
@@ -49,6 +248,18 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        # matches the (name, id) ordering used to paginate the tags
+        indexes = [
+            models.Index(
+                fields=["user", "name", "id"],
+                name="core_tag_user_name_idx"
+            ),
+        ]
 
     def __str__(self):
         
@@ -63,11 +274,63 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE
     )
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        # matches the (name, id) ordering used to paginate the ingredients
+        indexes = [
+            models.Index(
+                fields=["user", "name", "id"],
+                name="core_ingr_user_name_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+# column of the through tables of the recipes pointing to the related
+# object, by many to many field
+RELATED_COLUMNS = {"tags": "tag_id", "ingredients": "ingredient_id"}
+
+
+class RecipeQuerySet(ShardedQuerySet):
+
+    def bulk_create_with_relations(self, recipes, tag_ids, ingredient_ids,
+                                   batch_size=None):
+        """Insert recipes with their tags and ingredients in batches
+
+        tag_ids and ingredient_ids hold the list of related ids of
+        each recipe, in the same order as the recipes. The recipes, then
+        the rows of both through tables, are written with bulk_create
+        inside a single transaction."""
+        connection = connections[self.db]
+
+        with transaction.atomic(using=self.db):
+            if connection.features.can_return_rows_from_bulk_insert:
+                self.bulk_create(recipes, batch_size=batch_size)
+            else:
+                # the database can't return the ids of a bulk insert
+                # so the recipes are inserted one by one
+                for recipe in recipes:
+                    recipe.save(force_insert=True, using=self.db)
+
+            for field, ids_per_recipe in (
+                ("tags", tag_ids), ("ingredients", ingredient_ids)
+            ):
+                through = getattr(self.model, field).through
+                column = RELATED_COLUMNS[field]
+                through.objects.using(self.db).bulk_create([
+                    through(recipe_id=recipe.pk, **{column: related_id})
+                    for recipe, ids in zip(recipes, ids_per_recipe)
+                    for related_id in dict.fromkeys(ids)
+                ], batch_size=batch_size)
+
+        return recipes
+
+
 class Recipe(models.Model):
     """Recipe model """
 
@@ -81,6 +344,31 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField("Tag")
     ingredients = models.ManyToManyField("Ingredient")
+    # weighted title, tag and ingredient names, only maintained on
+    # postgres where it's GIN indexed for the full text search
+    search_vector = SearchVectorField(null=True, editable=False)
+    # also touched when the tags or the ingredients of the recipe change
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # matches the id ordering used to paginate the recipes
+            models.Index(
+                fields=["user", "id"],
+                name="core_recipe_user_id_idx"
+            ),
+            # used by the price and time range filters
+            models.Index(
+                fields=["user", "price"],
+                name="core_recipe_user_price_idx"
+            ),
+            models.Index(
+                fields=["user", "time_minutes"],
+                name="core_recipe_user_time_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.title
\ No newline at end of file
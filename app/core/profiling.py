@@ -0,0 +1,182 @@
+import contextvars
+import hashlib
+import hmac
+import logging
+import re
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUEST_PROFILING = {
+    # share of the requests profiled, 0 disables the profiling
+    "SAMPLE_RATE": 0.0,
+    # queries of the profiled requests taking at least these
+    # milliseconds are logged with their view and serializer
+    "SLOW_QUERY_MS": 100,
+    # send the timings to every client in a Server-Timing header
+    "HEADER": True,
+    # with HEADER off, the timings are only sent to the requests with
+    # this token in an X-Profiling-Token header
+    "TOKEN": None,
+}
+
+# the profile of the request being served, None when it isn't sampled
+current_profile = contextvars.ContextVar("current_profile", default=None)
+
+# literals and lists of placeholders which make two queries differ
+FINGERPRINT_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def get_profiling_settings():
+    """Return the profiling settings merged with the defaults"""
+    options = dict(DEFAULT_REQUEST_PROFILING)
+    options.update(getattr(settings, "REQUEST_PROFILING", {}))
+    return options
+
+
+def wants_server_timing(request, options):
+    """Return True if the timings of the request are sent to its client,
+    they tell how the API spends its time"""
+    if options["HEADER"]:
+        return True
+    token = options["TOKEN"]
+    return bool(token) and hmac.compare_digest(
+        request.META.get("HTTP_X_PROFILING_TOKEN", ""), token
+    )
+
+
+def fingerprint(sql):
+    """Return the query with its values replaced, the queries which only
+    differ by their values have the same fingerprint"""
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class RequestProfile:
+    """Time spent by a request in each phase and in the database
+
+    The time of the queries run during a phase is counted in "db" only,
+    the phases report the rest of their time."""
+
+    phases = ("auth", "serializer", "render")
+
+    def __init__(self, slow_query_ms, timer=time.perf_counter):
+        self.timer = timer
+        self.slow_query_ms = slow_query_ms
+        self.started = timer()
+        self.durations = defaultdict(float)
+        self.queries = 0
+        self.view = None
+        self.phase = None
+        self.serializer = None
+
+    @contextmanager
+    def measure(self, phase, serializer=None):
+        # the phases nested in another one are part of it
+        if self.phase is not None:
+            yield
+            return
+
+        self.phase, self.serializer = phase, serializer
+        started, db_before = self.timer(), self.durations["db"]
+        try:
+            yield
+        finally:
+            elapsed = self.timer() - started
+            self.durations[phase] += \
+                elapsed - (self.durations["db"] - db_before)
+            self.phase = self.serializer = None
+
+    def execute(self, execute, sql, params, many, context):
+        """Database execute wrapper timing the queries"""
+        started = self.timer()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = self.timer() - started
+            self.queries += 1
+            self.durations["db"] += elapsed
+            if elapsed * 1000 >= self.slow_query_ms:
+                self.log_slow_query(sql, elapsed, context)
+
+    def log_slow_query(self, sql, elapsed, context):
+        normalized = fingerprint(sql)
+        digest = hashlib.md5(normalized.encode()).hexdigest()[:12]
+        logger.warning(
+            "Slow query %.1fms on %s in %s by %s [%s] %s",
+            elapsed * 1000, context["connection"].alias,
+            self.view or "-", self.serializer or self.phase or "view",
+            digest, normalized,
+            extra={
+                "duration_ms": elapsed * 1000,
+                "fingerprint": digest,
+                "view": self.view,
+                "phase": self.phase,
+                "serializer": self.serializer,
+            }
+        )
+
+    def server_timing(self):
+        """Return the value of the Server-Timing header"""
+        total = self.timer() - self.started
+        metrics = [
+            "%s;dur=%.2f" % (phase, self.durations[phase] * 1000)
+            for phase in self.phases if phase in self.durations
+        ]
+        metrics.append('db;dur=%.2f;desc="%d queries"' % (
+            self.durations["db"] * 1000, self.queries
+        ))
+        metrics.append("total;dur=%.2f" % (total * 1000))
+        return ", ".join(metrics)
+
+
+def measure(phase, serializer=None):
+    """Return a context manager timing a phase of the profiled request,
+    it does nothing when the request isn't profiled"""
+    profile = current_profile.get()
+    if profile is None:
+        return nullcontext()
+    return profile.measure(phase, serializer)
+
+
+class ProfiledSerializerMixin:
+    """Time the validation, the saving and the representation of a
+    serializer in the request profile"""
+
+    def get_profile_name(self):
+        child = getattr(self, "child", None)
+        if child is not None:
+            return "%s(many=True)" % type(child).__name__
+        return type(self).__name__
+
+    def is_valid(self, raise_exception=False):
+        with measure("serializer", self.get_profile_name()):
+            return super().is_valid(raise_exception=raise_exception)
+
+    def save(self, **kwargs):
+        with measure("serializer", self.get_profile_name()):
+            return super().save(**kwargs)
+
+    @property
+    def data(self):
+        with measure("serializer", self.get_profile_name()):
+            return super().data
+
+
+class ProfiledListSerializer(ProfiledSerializerMixin,
+                             serializers.ListSerializer):
+    pass
@@ -0,0 +1,91 @@
+import codecs
+import io
+
+from django.conf import settings
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.profiling import measure
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# escaped by JSONRenderer so the output is a javascript subset
+LINE_SEPARATORS = (
+    ("\u2028".encode(), b"\\u2028"),
+    ("\u2029".encode(), b"\\u2029"),
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON renderer encoding with orjson when it's installed
+
+    The output is the same as the one of JSONRenderer: the datetimes,
+    dates and times go through the encoder of DRF, so do the Decimals
+    and every type orjson doesn't know. The stdlib encoder is used when
+    orjson is missing, for indented or non compact output, when the
+    output must be ASCII, and when orjson can't encode the data (an
+    integer above 64 bits for example).
+
+    Unlike the stdlib, orjson renders NaN and infinite floats as null
+    instead of rejecting them, and it writes float exponents without
+    their sign (1e16 instead of 1e+16)."""
+
+    def use_orjson(self, indent):
+        return orjson is not None and indent is None and self.compact \
+            and not self.ensure_ascii
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with measure("render"):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if data is None:
+            return b""
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if not self.use_orjson(indent):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """JSON parser decoding with orjson when it's installed
+
+    orjson only reads UTF-8 and rejects NaN and Infinity like the
+    strict JSONParser. A body it can't decode is parsed again by
+    JSONParser, which returns the data or raises the same ParseError
+    as before."""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != "utf-8":
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(
+                io.BytesIO(body), media_type, parser_context
+            )
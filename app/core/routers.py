@@ -0,0 +1,153 @@
+import contextvars
+import random
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from rest_framework.permissions import SAFE_METHODS
+
+from core.shards import SHARDED_MODELS, is_sharded, shard_for_user
+
+
+# replica the reads of the current request go to, None for the primary
+read_alias = contextvars.ContextVar("read_alias", default=None)
+
+
+def get_replicas():
+    """Return the aliases of the read replicas of the primary"""
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def choose_replica():
+    """Return a replica for a request, None when there is none"""
+    replicas = get_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+def get_pin_cache():
+    return caches[getattr(settings, "REPLICA_PIN_CACHE", "default")]
+
+
+def get_pin_key(user_id):
+    return "replica-pin:%s" % user_id
+
+
+def pin_user(user_id):
+    """Keep the reads of the user on the primary for REPLICA_PIN_SECONDS
+    so the replicas can catch up with its writes"""
+    get_pin_cache().set(
+        get_pin_key(user_id), True,
+        getattr(settings, "REPLICA_PIN_SECONDS", 5)
+    )
+
+
+def is_pinned(user_id):
+    return bool(get_pin_cache().get(get_pin_key(user_id)))
+
+
+class ReplicaReadMixin:
+    """Send the safe requests of the view to a read replica, unless the
+    request user wrote within REPLICA_PIN_SECONDS
+
+    The replica is chosen once the request is authenticated: the pins
+    are kept by user id, whatever the token the user sent. The alias is
+    reset by ReplicaMiddleware at the end of the request and isn't set
+    without it."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        django_request = request._request
+        # without ReplicaMiddleware the alias would outlive the request
+        if request.method not in SAFE_METHODS or \
+                getattr(django_request, "replica_token", False) is not None:
+            return
+        user = request.user
+        if user.is_authenticated and is_pinned(user.pk):
+            return
+        replica = choose_replica()
+        if replica is not None:
+            django_request.replica_token = read_alias.set(replica)
+
+
+class ReplicaRouter:
+    """Send the reads to the replica chosen for the request
+
+    The reads go to the primary unless ReplicaReadMixin selected a
+    replica for the request, so the management commands, the signals
+    and the tests keep reading what they write. The reads made inside
+    a transaction of the primary stay on the primary too, as do the
+    models of REPLICA_EXCLUDED_MODELS: a token created by a POST must be
+    found by the next request even if the replica is late."""
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if alias is None:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label in getattr(
+            settings, "REPLICA_EXCLUDED_MODELS", []
+        ):
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # an object read from a replica is saved on the primary, the
+        # others are written where they come from like without router
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in get_replicas():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ShardRouter:
+    """Send the rows of each user to its shard, see core.shards
+
+    The querysets of the views pick the shard of the request user with
+    for_user(), the router places the objects they save and the related
+    objects they load. The other models and the queries without an
+    instance are left to the next router."""
+
+    def get_shard(self, model, instance):
+        if instance is None or model._meta.label_lower not in SHARDED_MODELS:
+            return None
+        if isinstance(instance, get_user_model()):
+            return shard_for_user(instance)
+        user_id = getattr(instance, "user_id", None)
+        return shard_for_user(user_id) if user_id is not None else None
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded():
+            return None
+        instance = hints.get("instance")
+        # the related objects of a recipe are on the database it was
+        # read from
+        if instance is not None and instance._state.db and \
+                model._meta.label_lower in SHARDED_MODELS and \
+                not isinstance(instance, get_user_model()):
+            return instance._state.db
+        return self.get_shard(model, instance)
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded():
+            return None
+        return self.get_shard(model, hints.get("instance"))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the rows of a shard point to the users of the default database
+        # through a copy of their row on the shard
+        user_model = get_user_model()
+        for user, obj in ((obj1, obj2), (obj2, obj1)):
+            if isinstance(user, user_model) and \
+                    obj._meta.label_lower in SHARDED_MODELS:
+                return True
+        return None
@@ -0,0 +1,209 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+
+
+# the tables of the rows of a user which live on the shard of the user
+SHARDED_MODELS = {
+    "core.tag", "core.ingredient", "core.recipe",
+    "core.recipe_tags", "core.recipe_ingredients",
+}
+# tables whose ids are kept when a user moves, their ids come from a
+# separate range on every shard so they can't collide
+RANGED_TABLES = ("core_tag", "core_ingredient", "core_recipe")
+
+DIRECTORY_PREFIX = "user-shard:"
+# cache backends holding their entries in each process
+LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def get_shards():
+    """Return the aliases of the shards, the default database first"""
+    return getattr(settings, "DATABASE_SHARDS", [DEFAULT_DB_ALIAS])
+
+
+def is_sharded():
+    return len(get_shards()) > 1
+
+
+def get_cache():
+    return caches[getattr(settings, "SHARD_CACHE", "default")]
+
+
+def is_cache_shared():
+    """Return True if the entries of SHARD_CACHE are seen by every
+    process, a local cache keeps the old shard of a moved user until
+    its entry expires"""
+    alias = getattr(settings, "SHARD_CACHE", "default")
+    return settings.CACHES[alias]["BACKEND"] not in LOCAL_CACHES
+
+
+def get_placement(user_id):
+    """Return the shard a new user is placed on"""
+    shards = get_shards()
+    return shards[user_id % len(shards)]
+
+
+def shard_for_user(user):
+    """Return the alias of the database holding the rows of a user
+
+    The shard is stored on the user in the default database and cached
+    in SHARD_CACHE for SHARD_CACHE_TTL seconds. A moved user is found
+    on its new shard at once when the cache is shared by the processes,
+    otherwise once the entry expires, rebalance_shards keeps the rows
+    on the old shard until then. The users created before the sharding
+    have no shard and stay on the default database."""
+    user_id = getattr(user, "pk", user)
+    if user_id is None or not is_sharded():
+        return DEFAULT_DB_ALIAS
+
+    key = DIRECTORY_PREFIX + str(user_id)
+    alias = get_cache().get(key)
+    if alias is None:
+        alias = get_user_model()._base_manager.using(
+            DEFAULT_DB_ALIAS
+        ).filter(pk=user_id).values_list("shard", flat=True).first()
+        alias = alias or DEFAULT_DB_ALIAS
+        set_shard_cache(user_id, alias)
+    return alias
+
+
+def set_shard_cache(user_id, alias):
+    get_cache().set(
+        DIRECTORY_PREFIX + str(user_id), alias,
+        getattr(settings, "SHARD_CACHE_TTL", 300)
+    )
+
+
+def copy_user_row(user, alias):
+    """Create the row of a user on a shard
+
+    The shard only needs it as the target of the foreign keys, it has
+    no email or password and is never used to authenticate."""
+    model = get_user_model()
+    model._base_manager.using(alias).bulk_create([model(
+        pk=user.pk,
+        email="user-%d@shard.invalid" % user.pk,
+        password=make_password(None),
+        shard=alias,
+    )], ignore_conflicts=True)
+
+
+def delete_user_row(user_id, alias):
+    """Delete the row of a user from a shard with every row of the user
+    the shard holds"""
+    get_user_model()._base_manager.using(alias).filter(
+        pk=user_id
+    ).delete()
+
+
+def place_user(user):
+    """Store the shard of a new user, chosen by its id"""
+    if not is_sharded():
+        return DEFAULT_DB_ALIAS
+
+    alias = get_placement(user.pk)
+    if alias != DEFAULT_DB_ALIAS:
+        copy_user_row(user, alias)
+    get_user_model()._base_manager.using(DEFAULT_DB_ALIAS).filter(
+        pk=user.pk
+    ).update(shard=alias)
+    user.shard = alias
+    set_shard_cache(user.pk, alias)
+    return alias
+
+
+def reserve_ids(using, **kwargs):
+    """Start the ids of the sharded tables of a shard at its range
+
+    Connected to post_migrate. The shard at index i of DATABASE_SHARDS
+    creates its ids from i * SHARD_ID_SPAN, a user can then be moved
+    with its ids. Only postgres and sqlite are supported, the ids of a
+    moved user also move the sqlite counters of its new shard."""
+    shards = get_shards()
+    if using not in shards or shards.index(using) == 0:
+        return
+    start = shards.index(using) * getattr(settings, "SHARD_ID_SPAN", 10**8)
+
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for table in RANGED_TABLES:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT pg_get_serial_sequence(%s, 'id')", [table]
+                )
+                sequence = cursor.fetchone()[0]
+                cursor.execute("SELECT last_value FROM %s" % sequence)
+                if cursor.fetchone()[0] < start:
+                    cursor.execute(
+                        "SELECT setval(%s, %s, false)", [sequence, start]
+                    )
+            elif connection.vendor == "sqlite":
+                cursor.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = %s",
+                    [table]
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute(
+                        "INSERT INTO sqlite_sequence (name, seq) "
+                        "VALUES (%s, %s)", [table, start - 1]
+                    )
+                elif row[0] < start - 1:
+                    cursor.execute(
+                        "UPDATE sqlite_sequence SET seq = %s "
+                        "WHERE name = %s", [start - 1, table]
+                    )
+
+
+def fence_user(user_id, seconds):
+    """Reject the writes of a user for at most the given seconds
+
+    The fence is stored in the default database, every process sees it
+    at once whatever SHARD_CACHE is."""
+    get_user_model()._base_manager.using(DEFAULT_DB_ALIAS).filter(
+        pk=user_id
+    ).update(shard_fenced_until=timezone.now() + timedelta(seconds=seconds))
+
+
+def unfence_user(user_id):
+    get_user_model()._base_manager.using(DEFAULT_DB_ALIAS).filter(
+        pk=user_id
+    ).update(shard_fenced_until=None)
+
+
+def is_moving(user):
+    """Return True while the rows of a user are moved to another shard"""
+    return is_sharded() and get_user_model()._base_manager.using(
+        DEFAULT_DB_ALIAS
+    ).filter(pk=user.pk, shard_fenced_until__gt=timezone.now()).exists()
+
+
+class UserMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Your data is being moved, retry in a few seconds."
+    default_code = "user_moving"
+    # sent as Retry-After by the exception handler of DRF
+    wait = 5
+
+
+class ShardFenceMixin:
+    """Reject the writes of a user while rebalance_shards moves its rows,
+    the reads are still served by the old shard"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS and is_moving(request.user):
+            raise UserMoving()
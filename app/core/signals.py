@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from core.authentication import token_cache
+from core.shards import delete_user_row, is_sharded, place_user
+from core.tokens import revocations, revoke_tokens
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Stop accepting a deleted token"""
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, **kwargs):
+    """Reload the cached user of the tokens when the user changes, the
+    user may have been deactivated"""
+    if created:
+        return
+
+    keys = ()
+    if token_cache.get_shared_cache() is not None:
+        keys = Token.objects.filter(user=instance).values_list(
+            "key", flat=True
+        )
+    token_cache.delete_user(instance.pk, keys)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_created(sender, instance, created, using, **kwargs):
+    """Place a new user on a shard"""
+    if created and using == DEFAULT_DB_ALIAS:
+        place_user(instance)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, using, **kwargs):
+    """Delete the rows of a deleted user from its shard"""
+    shard = instance.shard
+    if using == DEFAULT_DB_ALIAS and is_sharded() and \
+            shard not in ("", DEFAULT_DB_ALIAS) and \
+            shard in connections.databases:
+        delete_user_row(instance.pk, shard)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_deactivated(sender, instance, created, using, **kwargs):
+    """Revoke the signed tokens of a deactivated user"""
+    if not created and not instance.is_active and using == DEFAULT_DB_ALIAS:
+        revoke_tokens(instance)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_revoked_on_delete(sender, instance, using, **kwargs):
+    """Stop accepting the signed tokens of a deleted user, its tokens
+    can't be refreshed anymore and the access ones expire"""
+    if using == DEFAULT_DB_ALIAS:
+        revocations.set(instance.pk, instance.token_generation + 1)
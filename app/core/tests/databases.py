@@ -0,0 +1,30 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def add_test_database(alias):
+    """Register a database alias configured like the default one and
+    create its test database with every table
+
+    The tests of the routers use it to get several databases without
+    declaring them in the settings. Returns the function removing it."""
+    settings_dict = dict(connections.databases[DEFAULT_DB_ALIAS])
+    if settings_dict["ENGINE"] == "django.db.backends.sqlite3":
+        settings_dict["NAME"] = ":memory:"
+    else:
+        settings_dict["NAME"] = "%s_%s" % (settings_dict["NAME"], alias)
+    settings_dict["TEST"] = {}
+    connections.databases[alias] = settings_dict
+    connections.ensure_defaults(alias)
+    connections.prepare_test_settings(alias)
+
+    creation = connections[alias].creation
+    old_name = creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+
+    def remove():
+        creation.destroy_test_db(old_name, verbosity=0)
+        del connections[alias]
+        del connections.databases[alias]
+
+    return remove
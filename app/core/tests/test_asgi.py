@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core.asgi import ReadPoolASGIHandler
+from core.models import Recipe
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+@override_settings(
+    ALLOWED_HOSTS=["testserver"], API_RESPONSE_CACHE={"ENABLED": False}
+)
+class ReadPoolASGIHandlerTests(TransactionTestCase):
+    """Test the pool of threads serving the reads over ASGI"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "asgi@gmail.com",
+            "testpass"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=10, price=2
+        )
+        self.handler = ReadPoolASGIHandler(max_workers=2)
+        self.addCleanup(self.handler.executor.shutdown)
+
+    def request(self, method, path, body=b""):
+        """Send a request to the handler, return its status, headers,
+        body and the thread which served the view"""
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": b"",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"authorization", b"Token %s" % self.token.key.encode()),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+        messages, threads = [], []
+
+        async def receive():
+            return {"type": "http.request", "body": body}
+
+        async def send(message):
+            messages.append(message)
+
+        def record_thread(sender, **kwargs):
+            threads.append(threading.current_thread().name)
+
+        request_started.connect(record_thread)
+        try:
+            asyncio.run(self.handler(scope, receive, send))
+        finally:
+            request_started.disconnect(record_thread)
+        start, *bodies = messages
+        return (
+            start["status"], dict(start["headers"]),
+            b"".join(message["body"] for message in bodies), threads[0]
+        )
+
+    def test_list_served_by_pool(self):
+        """Test that a list request is served by the pool of threads"""
+        status, headers, body, thread = self.request("GET", RECIPES_URL)
+
+        self.assertEqual(status, 200)
+        self.assertIn(b"application/json", headers[b"Content-Type"])
+        self.assertIn(b'"Soup"', body)
+        self.assertTrue(thread.startswith("asgi-read"))
+
+    def test_retrieve_served_by_pool(self):
+        """Test that a recipe is retrieved by the pool of threads"""
+        url = reverse("recipe:recipe-detail", args=[self.recipe.pk])
+
+        status, _, body, thread = self.request("GET", url)
+
+        self.assertEqual(status, 200)
+        self.assertIn(b'"Soup"', body)
+        self.assertTrue(thread.startswith("asgi-read"))
+
+    def test_writes_not_pooled(self):
+        """Test that the writes are served by the ASGIHandler"""
+        status, _, body, thread = self.request(
+            "POST", RECIPES_URL,
+            b'{"title": "Stew", "time_minutes": 60, "price": "8.00",'
+            b' "tags": [], "ingredients": []}'
+        )
+
+        self.assertEqual(status, 201, body)
+        self.assertFalse(thread.startswith("asgi-read"))
+        self.assertTrue(Recipe.objects.filter(title="Stew").exists())
+
+    def test_unknown_path_not_pooled(self):
+        """Test that the paths without a view aren't pooled"""
+        status, _, _, thread = self.request("GET", "/api/missing/")
+
+        self.assertEqual(status, 404)
+        self.assertFalse(thread.startswith("asgi-read"))
+
+    def test_benchmark(self):
+        """Test that the benchmark compares the modes"""
+        out = StringIO()
+
+        call_command(
+            "benchmark_asgi", clients=5, requests=20, threads=2,
+            users=2, recipes=10, stdout=out
+        )
+
+        output = out.getvalue()
+        for mode in ("wsgi", "asgi", "asgi-pool"):
+            self.assertRegex(output, r"\n%s +[\d.]+ .* 0\n" % mode)
+        self.assertFalse(get_user_model().objects.filter(
+            email__startswith="benchmark-asgi"
+        ).exists())
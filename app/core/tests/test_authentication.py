@@ -0,0 +1,138 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import LRUCache, TokenCache, token_cache
+
+
+ME_URL = reverse("users:me")
+SHARED_TOKEN_CACHE = {
+    "CACHES": {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        "tokens": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "tokens",
+        },
+    },
+    "TOKEN_AUTH_CACHE": {"CACHE_ALIAS": "tokens"},
+}
+
+
+class LRUCacheTests(TestCase):
+    """Test the in process cache used for the tokens"""
+
+    def setUp(self):
+        self.now = 0
+        self.cache = LRUCache(max_size=2, ttl=10, timer=lambda: self.now)
+
+    def test_least_recently_used_evicted(self):
+        """Test that the least recently used entry is evicted first"""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("c"), 3)
+
+    def test_entries_expire(self):
+        """Test that an entry isn't returned after its ttl"""
+        self.cache.set("a", 1)
+        self.now = 10
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(len(self.cache), 0)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test that the token authentication is cached"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "cached@gmail.com",
+            "testpass"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token.key)
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_token_lookup_cached(self):
+        """Test that the token is only looked up by the first request"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_deleted_token_rejected(self):
+        """Test that a deleted token is removed from the cache"""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test that the token of a deactivated user is rejected"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_token_not_cached(self):
+        """Test that an invalid token is still rejected"""
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+
+        for _ in range(2):
+            res = self.client.get(ME_URL)
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(**SHARED_TOKEN_CACHE)
+    def test_shared_cache(self):
+        """Test that the shared cache serves and invalidates tokens"""
+        self.client.get(ME_URL)
+        # another process has an empty local cache
+        token_cache.clear()
+
+        with self.assertNumQueries(0):
+            self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        token_cache.clear()
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        caches["tokens"].clear()
+
+    @override_settings(**SHARED_TOKEN_CACHE)
+    def test_revoked_in_other_process(self):
+        """Test that a token deleted by a process is rejected at once by
+        another process sharing the cache"""
+        first, second = TokenCache(), TokenCache()
+        self.addCleanup(caches["tokens"].clear)
+        credentials = (self.user, self.token)
+        first.set(self.token.key, credentials)
+        self.assertIsNotNone(second.get(self.token.key))
+        self.assertIsNotNone(first.get(self.token.key))
+
+        second.delete(self.token.key)
+
+        self.assertIsNone(first.get(self.token.key))
+        self.assertIsNone(second.get(self.token.key))
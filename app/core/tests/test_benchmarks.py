@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.benchmarks import percentile
+from core.models import Recipe
+
+
+class BenchmarkTests(TestCase):
+    """Test the benchmark helpers and commands"""
+
+    def test_percentile(self):
+        """Test the nearest rank percentile"""
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3, 1, 2], 100), 3)
+        self.assertEqual(percentile([3, 1, 2], 0), 1)
+
+    def test_benchmark_api(self):
+        """Test that the results of every endpoint are written"""
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        out = StringIO()
+
+        call_command(
+            "benchmark_api", sizes=[20], users=2, requests=3, warmup=0,
+            output=path, stdout=out
+        )
+
+        with open(path) as file:
+            results = json.load(file)
+        dataset = results["datasets"][0]
+        self.assertEqual(dataset["size"], 20)
+        self.assertIn("recipes-list", dataset["endpoints"])
+        self.assertEqual(
+            set(dataset["endpoints"]["recipes-detail"]),
+            {"p50_ms", "p95_ms", "p99_ms", "mean_ms", "queries",
+             "peak_allocated_kib", "response_bytes"}
+        )
+        # the dataset is rolled back
+        self.assertFalse(Recipe.objects.exists())
+
+        # a second run is compared to the first one
+        call_command(
+            "benchmark_api", sizes=[20], users=2, requests=3, warmup=0,
+            endpoints=["tags-list"], compare=path, stdout=out
+        )
+        self.assertIn("%", out.getvalue().splitlines()[-1])
+
+    def test_benchmark_export(self):
+        """Test the export benchmark on a small dataset"""
+        out = StringIO()
+
+        call_command("benchmark_export", sizes=[10], stdout=out)
+
+        self.assertIn("10", out.getvalue().splitlines()[1])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_renderers(self):
+        """Test the renderer benchmark checks and times both renderers"""
+        out = StringIO()
+
+        call_command("benchmark_renderers", sizes=[5], repeat=1, stdout=out)
+
+        self.assertIn("render", out.getvalue())
+        self.assertIn("parse", out.getvalue())
@@ -1,5 +1,8 @@
+from itertools import count
 from unittest.mock import patch
+
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
 
@@ -13,31 +16,47 @@ from django.test import TestCase
 
 # the patch function can be used as a context manager or a decorator
 
-# OperationnaError is an error that is thrown by django when the db is not available
+# getting a connection doesn't connect, ensure_connection raises the
+# OperationalError when the db is not available
+ENSURE_CONNECTION = (
+    "django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection"
+)
+
+
 class CommandTests(TestCase):
 
     def test_wait_for_db_ready(self):
         """Test waiting for db when db is available"""
         #this test is runned when the database is ready 
-        # "django.db.utils.ConnectionHandler.__getitem__": it's where we check if 
-        # our database is available or not 
-        with patch("django.db.utils.ConnectionHandler.__getitem__") as gi:
-            gi.return_value = True # the value that we want to return for our mock 
+        with patch(ENSURE_CONNECTION) as ensure:
             call_command("wait_for_db")
-            self.assertEqual(gi.call_count, 1)
+            self.assertEqual(ensure.call_count, 1)
             # call_count return how many time the patch function is called
     # this decorator return the time sleep has an argument for our test method 
 
     @patch("time.sleep", return_value=True)
     def test_wait_for_db(self, ts):
         """Test waiting for db """
-        with patch("django.db.utils.ConnectionHandler.__getitem__") as gi:
+        with patch(ENSURE_CONNECTION) as ensure:
             # the side_effect function raises an Error when the mock test is called 
             #the main thing in this test is to loop or call the side_effect function 5 times
             # just to wait for our database to be available and for the 6 times the db 'll be ready
-            #Our test is True when the call count >= 5 
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command("wait_for_db")
-            self.assertEqual(gi.call_count, 6)
+            ensure.side_effect = [OperationalError] * 5 + [None]
+            call_command("wait_for_db", delay=1, max_delay=4)
+            self.assertEqual(ensure.call_count, 6)
+
+        # the delays double with a jitter up to the maximum
+        delays = [call.args[0] for call in ts.call_args_list]
+        for delay, maximum in zip(delays, [1, 2, 4, 4, 4]):
+            self.assertTrue(maximum / 2 <= delay <= maximum)
 
+    @patch("time.sleep", return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """Test that the command fails when the db stays unavailable"""
+        # every call to the clock is 10 seconds later
+        with patch(ENSURE_CONNECTION, side_effect=OperationalError), \
+                patch("time.monotonic", side_effect=count(0, 10)):
+            with self.assertRaises(CommandError):
+                call_command("wait_for_db", timeout=30)
 
+        self.assertEqual(ts.call_count, 2)
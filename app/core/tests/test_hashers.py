@@ -0,0 +1,126 @@
+import threading
+import time
+from importlib.util import find_spec
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.hashers import HashingBusy, hashing_pool
+
+
+TOKEN_URL = reverse("users:token")
+
+
+@override_settings(PASSWORD_HASHING={"PBKDF2_ITERATIONS": 1000})
+class PasswordHashingTests(TestCase):
+    """Test the password hashing policy and the hashing pool"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "hashing@gmail.com",
+            "testpass"
+        )
+        self.client = APIClient()
+
+    def login(self):
+        return self.client.post(TOKEN_URL, {
+            "email": "hashing@gmail.com", "password": "testpass"
+        })
+
+    def test_iterations(self):
+        """Test that the passwords are hashed with the set iterations"""
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+
+    def test_rehash_on_login(self):
+        """Test that a password hashed with other iterations is rehashed
+        when the user logs in"""
+        with self.settings(PASSWORD_HASHING={"PBKDF2_ITERATIONS": 2000}):
+            res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$2000$"))
+
+    def test_hashed_in_pool(self):
+        """Test that the hashes run in the threads of the pool"""
+        thread = hashing_pool.run(threading.current_thread)
+        self.assertTrue(thread.name.startswith("hashing"))
+
+        with self.settings(PASSWORD_HASHING={"WORKERS": 0}):
+            thread = hashing_pool.run(threading.current_thread)
+        self.assertIs(thread, threading.current_thread())
+
+    @override_settings(
+        PASSWORD_HASHING={
+            "PBKDF2_ITERATIONS": 1000, "WORKERS": 1, "MAX_PENDING": 1
+        }
+    )
+    def test_busy(self):
+        """Test that the logins fail at once when the pool is full"""
+        release = threading.Event()
+        blocking = threading.Thread(
+            target=hashing_pool.run, args=(release.wait,)
+        )
+        blocking.start()
+        self.addCleanup(blocking.join)
+        self.addCleanup(release.set)
+        while hashing_pool._pending == 0:
+            time.sleep(0.01)
+
+        with self.assertRaises(HashingBusy):
+            make_password("testpass")
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res["Retry-After"], "1")
+
+    @override_settings(
+        PASSWORD_HASHING={"PBKDF2_ITERATIONS": 1000, "WORKERS": 1}
+    )
+    def test_default_bound(self):
+        """Test that by default twice the workers can wait for a hash"""
+        release = threading.Event()
+        for _ in range(2):
+            blocking = threading.Thread(
+                target=hashing_pool.run, args=(release.wait,)
+            )
+            blocking.start()
+            self.addCleanup(blocking.join)
+        self.addCleanup(release.set)
+        while hashing_pool._pending < 2:
+            time.sleep(0.01)
+
+        with self.assertRaises(HashingBusy):
+            make_password("testpass")
+
+    @skipUnless(find_spec("argon2"), "argon2-cffi isn't installed")
+    def test_rehash_to_argon2(self):
+        """Test that the passwords move to argon2 when it's preferred"""
+        with self.settings(PASSWORD_HASHERS=[
+            "core.hashers.Argon2Hasher", "core.hashers.PBKDF2Hasher"
+        ]):
+            self.login()
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("argon2$"))
+
+    def test_benchmark(self):
+        """Test that the benchmark measures every policy"""
+        out = StringIO()
+
+        call_command(
+            "benchmark_logins", iterations=[1000, 2000], logins=4,
+            threads=2, stdout=out
+        )
+
+        output = out.getvalue()
+        self.assertRegex(output, r"pbkdf2 +1000 iterations +[\d.]+")
+        self.assertRegex(output, r"pbkdf2 +2000 iterations +[\d.]+")
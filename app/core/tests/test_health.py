@@ -0,0 +1,90 @@
+from unittest.mock import patch
+
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+
+from core.health import HealthCheck, health_check
+
+
+class HealthCheckTests(TestCase):
+    """Test the liveness and readiness endpoints"""
+
+    def setUp(self):
+        health_check.reset()
+
+    def test_liveness(self):
+        """Test that /healthz answers without touching the database"""
+        with self.assertNumQueries(0):
+            res = self.client.get("/healthz")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), {"status": "ok"})
+        self.assertEqual(res["Cache-Control"], "no-store")
+        self.assertFalse(hasattr(res.wsgi_request, "session"))
+
+    @override_settings(METRICS={})
+    def test_readiness_cached(self):
+        """Test that the database is checked once per TTL"""
+        with self.assertNumQueries(1):
+            res = self.client.get("/readyz")
+            self.client.get("/readyz/")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.json()["databases"]["default"]["ok"])
+        self.assertEqual(res.json()["workers"]["in_flight"], 0)
+
+    @override_settings(METRICS={"TOKEN": "secret"})
+    def test_readiness_database_down(self):
+        """Test that /readyz fails while a database is down and only
+        details why to the clients with the token of /metrics"""
+        with patch(
+            "django.db.backends.utils.CursorWrapper.execute",
+            side_effect=DatabaseError("connection refused")
+        ), self.assertLogs("core.health", "WARNING"):
+            res = self.client.get("/readyz")
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res.json(), {
+            "status": "unavailable", "databases": {"default": {"ok": False}}
+        })
+
+        res = self.client.get("/readyz", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res.json()["databases"]["default"], {
+            "ok": False, "error": "connection refused"
+        })
+        self.assertEqual(res.json()["workers"]["in_flight"], 0)
+
+    @override_settings(HEALTH_CHECK={"MAX_IN_FLIGHT": 2})
+    def test_readiness_saturated(self):
+        """Test that a process serving its capacity isn't ready"""
+        check = HealthCheck()
+        check.started()
+        ready, data = check.readiness(detailed=True)
+        self.assertTrue(ready)
+        self.assertEqual(data["workers"]["saturation"], 0.5)
+
+        check.started()
+        ready, data = check.readiness()
+        self.assertFalse(ready)
+
+        check.finished()
+        self.assertTrue(check.readiness()[0])
+
+    def test_requests_counted(self):
+        """Test that the requests in flight are counted while they run"""
+        counts = []
+
+        def get_response(request):
+            counts.append(health_check.in_flight)
+            return HttpResponse()
+
+        with patch("django.core.handlers.base.BaseHandler._get_response",
+                   side_effect=get_response):
+            self.client.get("/api/users/me/")
+
+        self.assertEqual(counts, [1])
+        self.assertEqual(health_check.in_flight, 0)
@@ -0,0 +1,149 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import Tag, Ingredient, Recipe
+
+
+class ImportRecipesTests(TestCase):
+    """Test the import_recipes command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "import@gmail.com",
+            "testpass"
+        )
+
+    def write_dump(self, lines):
+        """Write the lines to a temporary file and return its path"""
+        file = tempfile.NamedTemporaryFile(
+            "w", suffix=".ndjson", delete=False
+        )
+        with file:
+            for line in lines:
+                if not isinstance(line, str):
+                    line = json.dumps(line)
+                file.write(line + "\n")
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def import_recipes(self, lines, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_recipes", self.write_dump(lines), user=self.user.email,
+            stdout=out, stderr=err, **options
+        )
+        return out.getvalue(), err.getvalue()
+
+    def recipe(self, title, tags=(), ingredients=(), **fields):
+        data = {
+            "title": title, "time_minutes": 10, "price": "5.00",
+            "tags": list(tags), "ingredients": list(ingredients),
+        }
+        data.update(fields)
+        return data
+
+    def test_import_recipes(self):
+        """Test that the recipes are created with their relations"""
+        out, _ = self.import_recipes([
+            self.recipe("Soup", tags=["Vegan"], ingredients=["Leek"]),
+            self.recipe("Salad", tags=["vegan", "Cold"], link="x.com"),
+        ], batch_size=1)
+
+        soup = Recipe.objects.get(title="Soup")
+        salad = Recipe.objects.get(title="Salad")
+        self.assertEqual(soup.user, self.user)
+        self.assertEqual(
+            list(soup.ingredients.values_list("name", flat=True)), ["Leek"]
+        )
+        self.assertEqual(salad.link, "x.com")
+        # the names are matched whatever their case
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(
+            sorted(salad.tags.values_list("name", flat=True)),
+            ["Cold", "Vegan"]
+        )
+        self.assertIn("next offset 2", out)
+
+    def test_existing_names_reused(self):
+        """Test that the tags the user already has are linked"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+
+        self.import_recipes([self.recipe("Soup", tags=["Vegan"])])
+
+        self.assertEqual(Tag.objects.count(), 1)
+        self.assertEqual(
+            list(Recipe.objects.get(title="Soup").tags.all()), [tag]
+        )
+
+    def test_non_ascii_names(self):
+        """Test that the names the database lowercases unlike Python are
+        matched"""
+        tag = Tag.objects.create(user=self.user, name="Éclair")
+
+        self.import_recipes([
+            self.recipe("Tart", tags=["Éclair"]),
+            self.recipe("Pie", tags=["Éclair", "ÉCLAIR"]),
+        ])
+
+        self.assertEqual(
+            list(Recipe.objects.get(title="Tart").tags.all()), [tag]
+        )
+        self.assertIn(tag, Recipe.objects.get(title="Pie").tags.all())
+
+    def test_row_user(self):
+        """Test that the user of a row overrides --user"""
+        user2 = get_user_model().objects.create_user(
+            "other@gmail.com",
+            "testpass"
+        )
+
+        self.import_recipes([
+            self.recipe("Soup", ingredients=["Salt"], user=user2.email)
+        ])
+
+        self.assertEqual(Recipe.objects.get().user, user2)
+        self.assertEqual(Ingredient.objects.get().user, user2)
+
+    def test_invalid_lines_skipped(self):
+        """Test that the invalid lines are reported and skipped"""
+        _, err = self.import_recipes([
+            "not json",
+            self.recipe("Soup", price="abc"),
+            self.recipe("Stew", user="missing@gmail.com"),
+            self.recipe("Salad"),
+        ])
+
+        self.assertEqual(
+            list(Recipe.objects.values_list("title", flat=True)), ["Salad"]
+        )
+        self.assertIn("Line 1 skipped", err)
+        self.assertIn("Line 2 skipped", err)
+        self.assertIn("Line 3 skipped", err)
+
+    def test_strict_stops_at_invalid_line(self):
+        """Test that --strict stops the import at the invalid line"""
+        with self.assertRaisesMessage(CommandError, "Line 2"):
+            self.import_recipes([
+                self.recipe("Soup"),
+                self.recipe("Stew", time_minutes="long"),
+            ], strict=True, batch_size=1)
+
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_resume_from_offset(self):
+        """Test that the lines before the offset are skipped"""
+        self.import_recipes(
+            [self.recipe("Soup"), self.recipe("Stew"), self.recipe("Salad")],
+            offset=2
+        )
+
+        self.assertEqual(
+            list(Recipe.objects.values_list("title", flat=True)), ["Salad"]
+        )
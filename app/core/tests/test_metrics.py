@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.metrics import AGGREGATE_FILE, Metrics, metrics
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+METRICS_URL = "/metrics"
+
+
+# /metrics is open without a token, as outside of production
+@override_settings(METRICS={})
+class MetricsTests(TestCase):
+    """Test the recording and the rendering of the request metrics"""
+
+    def setUp(self):
+        metrics.reset()
+        self.user = get_user_model().objects.create_user(
+            "metrics@gmail.com",
+            "testpass"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_render_histograms(self):
+        """Test that the observations land in cumulative buckets"""
+        registry = Metrics()
+        registry.observe("recipe:recipe-list", "GET", 200, (0.003, 2, None))
+        registry.observe("recipe:recipe-list", "GET", 200, (0.2, 2, 600))
+        registry.observe("recipe:recipe-list", "BREW", 405, (0.2, 0, 10))
+
+        text = registry.render()
+
+        labels = 'route="recipe:recipe-list",method="GET",status="200"'
+        self.assertIn("http_requests_total{%s} 2" % labels, text)
+        self.assertIn(
+            'http_request_duration_seconds_bucket{%s,le="0.005"} 1' % labels,
+            text
+        )
+        self.assertIn(
+            'http_request_duration_seconds_bucket{%s,le="+Inf"} 2' % labels,
+            text
+        )
+        self.assertIn(
+            "http_request_duration_seconds_sum{%s} 0.203" % labels, text
+        )
+        # the size of a streamed response is unknown
+        self.assertIn("http_response_size_bytes_count{%s} 1" % labels, text)
+        self.assertIn('method="other",status="405"', text)
+
+    def test_requests_recorded(self):
+        """Test that the API requests are served by /metrics"""
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+        self.client.get("/api/missing/")
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("text/plain"))
+        text = res.content.decode()
+        self.assertIn(
+            'http_requests_total{route="recipe:recipe-list",method="GET",'
+            'status="200"} 2', text
+        )
+        self.assertIn(
+            'http_requests_total{route="unmatched",method="GET",'
+            'status="404"} 1', text
+        )
+        self.assertIn(
+            'http_request_queries_bucket{route="recipe:recipe-list",'
+            'method="GET",status="200",le="+Inf"} 2', text
+        )
+        self.assertIn("api_response_cache_misses_total", text)
+
+    @override_settings(METRICS={"TOKEN": "scraper-secret"})
+    def test_token_required(self):
+        """Test that /metrics checks the token when one is set"""
+        self.assertEqual(
+            self.client.get(METRICS_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION="Bearer scraper-secret"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_multiprocess(self):
+        """Test that the metrics of the workers are added up"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        worker = Metrics()
+        worker.observe("users:me", "GET", 200, (0.01, 1, 100))
+        with open(os.path.join(directory, "metrics-1.json"), "w") as file:
+            json.dump(worker.snapshot(), file)
+
+        with self.settings(METRICS={"MULTIPROCESS_DIR": directory}):
+            metrics.observe("users:me", "GET", 200, (0.01, 1, 100))
+            self.assertTrue(os.path.exists(metrics.get_file(directory)))
+            text = metrics.render()
+
+        self.assertIn(
+            'http_requests_total{route="users:me",method="GET",'
+            'status="200"} 2', text
+        )
+
+    def test_multiprocess_pid_reused(self):
+        """Test that a worker reusing the pid of a stopped one keeps
+        the file of the stopped worker"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        with self.settings(METRICS={"MULTIPROCESS_DIR": directory}):
+            for _ in range(2):
+                worker = Metrics()
+                worker.observe("users:me", "GET", 200, (0.01, 1, 100))
+            text = Metrics().render()
+
+        self.assertEqual(len(os.listdir(directory)), 2)
+        self.assertIn(
+            'http_requests_total{route="users:me",method="GET",'
+            'status="200"} 2', text
+        )
+
+    def test_stopped_workers_folded(self):
+        """Test that the files of the stopped workers are added to the
+        aggregate file and deleted"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        stopped = Metrics()
+        stopped.observe("users:me", "GET", 200, (0.01, 1, 100))
+        # a pid above the default pid_max of linux is never running
+        stopped._pid = 2 ** 22 + 1
+
+        with self.settings(METRICS={"MULTIPROCESS_DIR": directory}):
+            stopped.flush()
+            worker = Metrics()
+            worker.observe("users:me", "GET", 200, (0.01, 1, 100))
+            text = Metrics().render()
+
+        self.assertEqual(
+            sorted(os.listdir(directory)),
+            sorted([AGGREGATE_FILE, os.path.basename(
+                worker.get_file(directory)
+            )])
+        )
+        self.assertIn(
+            'http_requests_total{route="users:me",method="GET",'
+            'status="200"} 2', text
+        )
@@ -0,0 +1,131 @@
+import sys
+from unittest.mock import Mock, patch
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+
+from core.db import check_connections
+
+
+ME_URL = reverse("users:me")
+ADMIN_LOGIN_URL = reverse("admin:login")
+
+DEVELOPMENT_MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+PRODUCTION_MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "core.middleware.NonAPIMiddleware",
+]
+
+
+def count_calls(request):
+    """Return the number of python calls made to perform the request"""
+    calls = 0
+
+    def profile(frame, event, arg):
+        nonlocal calls
+        if event == "call":
+            calls += 1
+
+    sys.setprofile(profile)
+    try:
+        request()
+    finally:
+        sys.setprofile(None)
+    return calls
+
+
+@override_settings(MIDDLEWARE=PRODUCTION_MIDDLEWARE)
+class NonAPIMiddlewareTests(TestCase):
+    """Test the middleware stack of the production profile"""
+
+    def test_api_skips_session_middlewares(self):
+        """Test that the API requests skip the wrapped middlewares"""
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotIn("X-Frame-Options", res)
+        self.assertFalse(hasattr(res.wsgi_request, "session"))
+
+    def test_admin_runs_session_middlewares(self):
+        """Test that the admin still gets the sessions and the CSRF"""
+        res = self.client.get(ADMIN_LOGIN_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["X-Frame-Options"], "DENY")
+        self.assertIn("csrftoken", res.cookies)
+
+        client = Client(enforce_csrf_checks=True)
+        res = client.post(ADMIN_LOGIN_URL, {"username": "a", "password": "b"})
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_api_middleware_overhead(self):
+        """Test that an API request runs less code than with the full
+        middleware stack"""
+        # a client loads the middlewares on its first request
+        client = Client()
+        client.get(ME_URL)
+        calls = count_calls(lambda: client.get(ME_URL))
+
+        with self.settings(MIDDLEWARE=DEVELOPMENT_MIDDLEWARE):
+            client = Client()
+            client.get(ME_URL)
+            full_calls = count_calls(lambda: client.get(ME_URL))
+
+        self.assertLess(calls, full_calls)
+
+
+class CheckConnectionsTests(TestCase):
+    """Test the health check of the persistent connections"""
+
+    def get_connection(self, health_checks, usable):
+        connection = Mock(in_atomic_block=False, health_checked_at=None)
+        connection.settings_dict = {"CONN_HEALTH_CHECKS": health_checks}
+        connection.is_usable.return_value = usable
+        return connection
+
+    def test_broken_connection_closed(self):
+        """Test that a connection which stopped working is closed"""
+        broken = self.get_connection(True, False)
+        working = self.get_connection(True, True)
+
+        with patch("core.db.connections") as connections:
+            connections.all.return_value = [broken, working]
+            check_connections()
+
+        broken.close.assert_called_once_with()
+        working.close.assert_not_called()
+
+    def test_health_checks_disabled(self):
+        """Test that the connections aren't tested without the setting"""
+        connection = self.get_connection(False, False)
+
+        with patch("core.db.connections") as connections:
+            connections.all.return_value = [connection]
+            check_connections()
+
+        connection.is_usable.assert_not_called()
+
+    def test_checks_throttled(self):
+        """Test that a connection is tested once per interval"""
+        connection = self.get_connection(True, True)
+        connection.settings_dict["CONN_HEALTH_CHECK_INTERVAL"] = 5
+
+        with patch("core.db.connections") as connections, \
+                patch("core.db.time.monotonic") as monotonic:
+            connections.all.return_value = [connection]
+            for now in (100, 101, 104.9, 105):
+                monotonic.return_value = now
+                check_connections()
+
+        self.assertEqual(connection.is_usable.call_count, 2)
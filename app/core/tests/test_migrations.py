@@ -0,0 +1,51 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from core.models import Recipe, Tag
+
+
+merge_migration = import_module("core.migrations.0008_unique_attr_names")
+
+
+class MergeDuplicateNamesTests(TestCase):
+    """Test the migration merging the tags sharing a name"""
+
+    def setUp(self):
+        # the unique index is dropped to create the duplicates, the
+        # test transaction restores it
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX core_tag_user_lower_name_uniq")
+        self.user = get_user_model().objects.create_user(
+            "merge@gmail.com",
+            "testpass"
+        )
+
+    def sample_recipe(self, title):
+        return Recipe.objects.create(
+            user=self.user, title=title, time_minutes=5, price=1
+        )
+
+    def test_duplicates_merged(self):
+        """Test that duplicates are merged into the oldest tag"""
+        kept = Tag.objects.create(user=self.user, name="Vegan")
+        duplicate = Tag.objects.create(user=self.user, name="VEGAN")
+        other = Tag.objects.create(user=self.user, name="Dessert")
+        both = self.sample_recipe("Both")
+        both.tags.add(kept, duplicate)
+        only_duplicate = self.sample_recipe("Duplicate")
+        only_duplicate.tags.add(duplicate, other)
+
+        merge_migration.merge_duplicate_names(apps, None)
+
+        self.assertEqual(
+            set(Tag.objects.values_list("id", flat=True)),
+            {kept.id, other.id}
+        )
+        self.assertEqual(list(both.tags.all()), [kept])
+        self.assertEqual(
+            set(only_duplicate.tags.all()), {kept, other}
+        )
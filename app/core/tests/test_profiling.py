@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.profiling import fingerprint
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+@override_settings(
+    REQUEST_PROFILING={"SAMPLE_RATE": 1, "SLOW_QUERY_MS": 1000},
+    API_RESPONSE_CACHE={"ENABLED": False},
+)
+class ProfilingTests(TestCase):
+    """Test the profiling of the requests"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "profile@gmail.com",
+            "testpass"
+        )
+        self.client = APIClient()
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=10, price=2
+        )
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+
+    def get_timings(self, response):
+        """Return the metrics of the Server-Timing header by name"""
+        return {
+            metric.split(";")[0]: metric
+            for metric in response["Server-Timing"].split(", ")
+        }
+
+    def test_fingerprint(self):
+        """Test that the values of the queries are replaced"""
+        self.assertEqual(
+            fingerprint(
+                "SELECT * FROM t WHERE a = 'it''s' AND b IN (%s, %s,  %s)"
+                " LIMIT 21"
+            ),
+            "SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?"
+        )
+
+    def test_server_timing(self):
+        """Test that the phases of a request are timed"""
+        res = self.client.get(RECIPES_URL)
+
+        timings = self.get_timings(res)
+        self.assertEqual(
+            set(timings), {"auth", "serializer", "render", "db", "total"}
+        )
+        self.assertRegex(timings["db"], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+    @override_settings(
+        REQUEST_PROFILING={"SAMPLE_RATE": 1, "SLOW_QUERY_MS": 0}
+    )
+    def test_slow_queries_logged(self):
+        """Test that a slow query names its view and serializer"""
+        with self.assertLogs("core.profiling", "WARNING") as logs:
+            self.client.post(RECIPES_URL, {
+                "title": "Stew", "time_minutes": 60, "price": 8,
+                "tags": [self.recipe.tags.get().pk],
+            })
+
+        messages = "\n".join(logs.output)
+        self.assertIn("in RecipeViewSet.create by auth [", messages)
+        # the tags are looked up when the recipe is validated
+        self.assertRegex(
+            messages,
+            r'in RecipeViewSet.create by RecipeSerializer \[\w+\] SELECT .*'
+            r'FROM "core_tag"'
+        )
+
+    @override_settings(REQUEST_PROFILING={
+        "SAMPLE_RATE": 1, "HEADER": False, "TOKEN": "debug-secret"
+    })
+    def test_server_timing_restricted(self):
+        """Test that without HEADER only the requests with the token get
+        the timings"""
+        res = self.client.get(RECIPES_URL)
+        self.assertNotIn("Server-Timing", res)
+
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILING_TOKEN="wrong")
+        self.assertNotIn("Server-Timing", res)
+
+        res = self.client.get(
+            RECIPES_URL, HTTP_X_PROFILING_TOKEN="debug-secret"
+        )
+        self.assertIn("total", self.get_timings(res))
+
+    @override_settings(REQUEST_PROFILING={"SAMPLE_RATE": 0})
+    def test_not_sampled(self):
+        """Test that the requests left out aren't profiled"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn("Server-Timing", res)
@@ -0,0 +1,124 @@
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import skipIf
+
+from django.test import TestCase
+from django.utils.translation import gettext_lazy
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core import renderers
+from core.renderers import FastJSONParser, FastJSONRenderer
+
+
+class FastJSONRendererTests(TestCase):
+    """Test that the fast renderer outputs what JSONRenderer does"""
+
+    def assertSameOutput(self, data, accepted_media_type=None):
+        self.assertEqual(
+            FastJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type)
+        )
+
+    def test_recipe_list(self):
+        """Test a page of serialized recipes"""
+        self.assertSameOutput(OrderedDict([
+            ("next", "http://testserver/api/recipe/recipes/?cursor=e30="),
+            ("previous", None),
+            ("results", [
+                OrderedDict([
+                    ("id", 1), ("title", "Crème brûlée \U0001f370"),
+                    ("time_minutes", 45), ("price", "12.50"),
+                    ("user", 3), ("link", ""), ("tags", [1, 2]),
+                    ("ingredients", []),
+                ]),
+            ]),
+        ]))
+
+    def test_decimals_and_dates(self):
+        """Test the values encoded by the encoder of DRF"""
+        self.assertSameOutput({
+            "decimals": [Decimal("5.5"), Decimal("0.10"), Decimal("999")],
+            "utc": datetime(2021, 3, 1, 12, 30, tzinfo=timezone.utc),
+            "offset": datetime(
+                2021, 3, 1, 12, 30, 15, 120,
+                tzinfo=timezone(timedelta(hours=2))
+            ),
+            "naive": datetime(2021, 3, 1, 12, 30, 15, 500000),
+            "date": date(2021, 3, 1),
+            "time": time(8, 5),
+            "duration": timedelta(minutes=90),
+            "uuid": uuid.UUID("12345678123456781234567812345678"),
+            "lazy": gettext_lazy("Invalid cursor"),
+            "set": {1},
+            "tuple": (1, "a"),
+        })
+
+    def test_line_separators_escaped(self):
+        """Test that U+2028 and U+2029 are escaped"""
+        self.assertSameOutput({"title": "a\u2028b\u2029c"})
+        self.assertIn(b"\\u2028", FastJSONRenderer().render(["\u2028"]))
+
+    def test_indented_output(self):
+        """Test that the indented output falls back to the stdlib"""
+        self.assertSameOutput(
+            {"a": [1, 2]}, "application/json; indent=4"
+        )
+
+    def test_big_integer(self):
+        """Test that an integer orjson can't encode is still rendered"""
+        self.assertSameOutput({"big": 2 ** 70})
+
+    def test_none(self):
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    @skipIf(renderers.orjson is None, "orjson isn't installed")
+    def test_unknown_type_rejected(self):
+        """Test that an object no encoder knows raises a TypeError"""
+        with self.assertRaises(TypeError):
+            FastJSONRenderer().render({"object": object()})
+
+
+class FastJSONParserTests(TestCase):
+    """Test that the fast parser reads what JSONParser does"""
+
+    def parse(self, parser, body, encoding="utf-8"):
+        return parser.parse(
+            BytesIO(body), parser_context={"encoding": encoding}
+        )
+
+    def test_parse(self):
+        """Test a recipe payload"""
+        body = '{"title": "Soupe à l\'oignon", "price": 5.5, ' \
+            '"tags": [1, 2], "link": null}'.encode()
+
+        self.assertEqual(
+            self.parse(FastJSONParser(), body),
+            self.parse(JSONParser(), body)
+        )
+
+    def test_other_encoding(self):
+        """Test that a body which isn't UTF-8 is decoded"""
+        body = '{"title": "Crème"}'.encode("latin-1")
+
+        self.assertEqual(
+            self.parse(FastJSONParser(), body, "latin-1"),
+            {"title": "Crème"}
+        )
+
+    def test_invalid_json(self):
+        """Test that invalid bodies raise the error of JSONParser"""
+        for body in (b"{", b"[NaN]", b""):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as fast:
+                    self.parse(FastJSONParser(), body)
+                with self.assertRaises(ParseError) as default:
+                    self.parse(JSONParser(), body)
+                self.assertEqual(
+                    str(fast.exception), str(default.exception)
+                )
@@ -0,0 +1,168 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.routers import ReplicaRouter, read_alias
+from core.tests.databases import add_test_database
+from core.tokens import signer
+from recipe.conditional import user_scope, versions
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+@override_settings(
+    DATABASE_REPLICAS=["replica"],
+    API_RESPONSE_CACHE={"ENABLED": False},
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Test that the reads go to the replica and the writes don't"""
+
+    # the replica is a separate empty database so the tests can tell
+    # where a read went
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.remove_replica = add_test_database("replica")
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.remove_replica()
+
+    def setUp(self):
+        caches["default"].clear()
+        self.user = get_user_model().objects.create_user(
+            "replica@gmail.com",
+            "testpass"
+        )
+        self.client = APIClient()
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + token.key)
+        Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=10, price=2
+        )
+        self.age_versions()
+
+    def age_versions(self):
+        """Date the last changes of the user before the replica lag, the
+        conditional lists are read from the primary until then"""
+        scopes = [
+            user_scope(name, self.user.pk)
+            for name in ("recipe", "tag", "ingredient")
+        ]
+        cache = caches["default"]
+        for scope, (token, last_modified) in zip(
+            scopes, versions.get_many(scopes)
+        ):
+            cache.set(
+                versions.key_prefix + scope, (token, last_modified - 3600),
+                None
+            )
+
+    def get_titles(self):
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe["title"] for recipe in res.data["results"]]
+
+    def test_router(self):
+        """Test the database chosen for the reads and the writes"""
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Recipe), "default")
+
+        token = read_alias.set("replica")
+        try:
+            self.assertEqual(router.db_for_read(Recipe), "replica")
+            self.assertEqual(router.db_for_read(Token), "default")
+            # a recipe read from the replica is saved on the primary
+            recipe = Recipe.objects.using("default").get()
+            recipe._state.db = "replica"
+            self.assertEqual(
+                router.db_for_write(Recipe, instance=recipe), "default"
+            )
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Recipe), "default")
+        finally:
+            read_alias.reset(token)
+
+    def test_reads_from_replica(self):
+        """Test that the list is read from the replica"""
+        # the replica didn't get the recipe
+        self.assertEqual(self.get_titles(), [])
+        # the alias is only set during the request
+        self.assertIsNone(read_alias.get())
+
+    def test_reads_pinned_after_write(self):
+        """Test that a client reads from the primary after a write"""
+        res = self.client.post(RECIPES_URL, {
+            "title": "Stew", "time_minutes": 60, "price": 8
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(self.get_titles(), ["Stew", "Soup"])
+
+        # the other clients still read from the replica
+        other = get_user_model().objects.create_user(
+            "other@gmail.com",
+            "testpass"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + (
+            Token.objects.create(user=other).key
+        ))
+        self.assertEqual(self.get_titles(), [])
+
+    def test_pin_follows_user(self):
+        """Test that a write pins the reads of the user whatever the
+        token they are sent with"""
+        self.client.post(RECIPES_URL, {
+            "title": "Stew", "time_minutes": 60, "price": 8
+        })
+        self.age_versions()
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + signer.issue(self.user)["access"]
+        )
+
+        self.assertEqual(self.get_titles(), ["Stew", "Soup"])
+
+    @override_settings(REPLICA_PIN_SECONDS=-1)
+    def test_pin_expires(self):
+        """Test that the reads go back to the replica after the pin"""
+        self.client.post(RECIPES_URL, {
+            "title": "Stew", "time_minutes": 60, "price": 8
+        })
+        self.age_versions()
+
+        self.assertEqual(self.get_titles(), [])
+
+    @override_settings(
+        REPLICA_PIN_SECONDS=-1, API_RESPONSE_CACHE={"ENABLED": True}
+    )
+    def test_cached_responses_read_from_primary(self):
+        """Test that a late replica never fills the response cache"""
+        self.client.post(RECIPES_URL, {
+            "title": "Stew", "time_minutes": 60, "price": 8
+        })
+        self.age_versions()
+
+        self.assertEqual(self.get_titles(), ["Stew", "Soup"])
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "HIT")
+        self.assertEqual(len(res.data["results"]), 2)
+
+    def test_recent_changes_read_from_primary(self):
+        """Test that a list changed within the replica lag is read from
+        the primary, also by the clients which aren't pinned"""
+        Recipe.objects.create(
+            user=self.user, title="Stew", time_minutes=60, price=8
+        )
+
+        self.assertEqual(self.get_titles(), ["Stew", "Soup"])
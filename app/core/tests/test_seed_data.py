@@ -0,0 +1,70 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, F
+from django.test import TestCase
+
+from core.benchmarks import zipf_counts
+from core.models import Ingredient, Recipe
+
+
+class SeedDataTests(TestCase):
+    """Test the seed_data command"""
+
+    def seed(self, **options):
+        params = {
+            "users": 5, "recipes_per_user": 20, "tags": 3,
+            "ingredients": 6, "batch_size": 30,
+        }
+        params.update(options)
+        call_command("seed_data", stdout=StringIO(), **params)
+
+    def test_zipf_counts(self):
+        """Test the split of the recipes between the users"""
+        self.assertEqual(zipf_counts(100, 4, 0), [25, 25, 25, 25])
+
+        counts = zipf_counts(100, 4, 1)
+        self.assertEqual(sum(counts), 100)
+        self.assertEqual(counts, sorted(counts, reverse=True))
+
+    def test_seed_data(self):
+        """Test that the users own skewed recipes with shared names"""
+        self.seed()
+
+        users = get_user_model().objects.filter(
+            email__endswith="@example.com"
+        )
+        self.assertEqual(users.count(), 5)
+        self.assertTrue(users[0].check_password("password"))
+        self.assertEqual(Recipe.objects.count(), 100)
+
+        counts = users.annotate(recipes=Count("recipe")).values_list(
+            "recipes", flat=True
+        )
+        self.assertGreater(max(counts), 20)
+
+        # every user has the same ingredient names
+        names = Ingredient.objects.values("name").annotate(
+            users=Count("user")
+        )
+        self.assertEqual(len(names), 6)
+        self.assertTrue(all(name["users"] == 5 for name in names))
+
+        # the recipes only use the ingredients of their user
+        links = Recipe.ingredients.through.objects
+        self.assertTrue(links.exists())
+        self.assertFalse(
+            links.exclude(recipe__user=F("ingredient__user")).exists()
+        )
+
+    def test_existing_prefix_rejected(self):
+        """Test that seeding twice with the same prefix is refused"""
+        self.seed()
+
+        with self.assertRaises(CommandError):
+            self.seed()
+
+        self.seed(email_prefix="other")
+        self.assertEqual(Recipe.objects.count(), 200)
@@ -0,0 +1,242 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.benchmarks import seed_dataset
+from core.models import Recipe, Tag, Ingredient
+from core.shards import fence_user, get_placement, shard_for_user
+from core.tests.databases import add_test_database
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENTS_URL = reverse("recipe:ingredient-list")
+
+SHARDS = ["default", "shard_1"]
+
+
+@override_settings(
+    DATABASE_SHARDS=SHARDS,
+    SHARD_ID_SPAN=1000,
+    API_RESPONSE_CACHE={"ENABLED": False},
+)
+class ShardingTests(TransactionTestCase):
+    """Test that the rows of a user live on its shard"""
+
+    databases = set(SHARDS)
+
+    @classmethod
+    def setUpClass(cls):
+        # the ids of the shard are reserved when it's migrated
+        with override_settings(DATABASE_SHARDS=SHARDS, SHARD_ID_SPAN=1000):
+            cls.remove_shard = add_test_database("shard_1")
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.remove_shard()
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def create_user(self, shard):
+        """Create users until one is placed on the shard"""
+        while True:
+            user = get_user_model().objects.create_user(
+                "user%d@gmail.com" % get_user_model().objects.count(),
+                "testpass"
+            )
+            if user.shard == shard:
+                return user
+
+    def get_client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def create_recipe(self, client):
+        """Create a recipe with a tag and an ingredient with the API"""
+        tag = client.post(TAGS_URL, {"name": "Vegan"}).data
+        ingredient = client.post(INGREDIENTS_URL, {"name": "Salt"}).data
+        res = client.post(RECIPES_URL, {
+            "title": "Soup", "time_minutes": 10, "price": 2,
+            "tags": [tag["id"]], "ingredients": [ingredient["id"]],
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data
+
+    def test_users_placed(self):
+        """Test that the users are spread over the shards by id"""
+        users = [
+            get_user_model().objects.create_user(email, "testpass")
+            for email in ("first@gmail.com", "second@gmail.com")
+        ]
+
+        self.assertEqual({user.shard for user in users}, set(SHARDS))
+        for user in users:
+            self.assertEqual(user.shard, get_placement(user.pk))
+            self.assertEqual(shard_for_user(user), user.shard)
+            # the shard gets a row for the foreign keys
+            self.assertTrue(get_user_model().objects.using(
+                user.shard
+            ).filter(pk=user.pk).exists())
+
+    def test_seeded_users_placed(self):
+        """Test that the seeded users are placed and their rows are
+        inserted on their shard"""
+        users = seed_dataset(4, 3, tags=2, ingredients=3, exponent=0)
+
+        self.assertEqual({user.shard for user in users}, set(SHARDS))
+        for user in users:
+            self.assertEqual(
+                get_user_model().objects.get(pk=user.pk).shard,
+                get_placement(user.pk)
+            )
+            self.assertEqual(Recipe.objects.for_user(user).count(), 3)
+            self.assertEqual(Tag.objects.for_user(user).count(), 2)
+            recipes = Recipe.objects.using(user.shard).filter(user=user)
+            self.assertFalse(recipes.exclude(
+                ingredients__user=user
+            ).exists())
+
+    def test_api_uses_shard(self):
+        """Test that the API writes and reads the rows on the shard"""
+        user = self.create_user("shard_1")
+        client = self.get_client(user)
+
+        recipe = self.create_recipe(client)
+
+        self.assertGreaterEqual(recipe["id"], 1000)
+        for model in (Recipe, Tag, Ingredient):
+            self.assertFalse(model.objects.using("default").exists())
+            self.assertEqual(model.objects.using("shard_1").count(), 1)
+        self.assertEqual(
+            Recipe.objects.using("shard_1").get().tags.get().name, "Vegan"
+        )
+
+        res = client.get(RECIPES_URL)
+        self.assertEqual(res.data["results"], [recipe])
+        res = client.get(reverse("recipe:recipe-detail", args=[recipe["id"]]))
+        self.assertEqual(res.data["tags"][0]["name"], "Vegan")
+        res = client.post(RECIPES_URL + "bulk/", [{
+            "title": "Stew", "time_minutes": 60, "price": 8,
+            "tags": recipe["tags"], "ingredients": [],
+        }], format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.using("shard_1").count(), 2)
+
+    def test_rebalance_moves_user(self):
+        """Test that a user is moved with its rows and ids"""
+        user = self.create_user("shard_1")
+        client = self.get_client(user)
+        recipe = self.create_recipe(client)
+        out = StringIO()
+
+        call_command(
+            "rebalance_shards", user.email, to="default", grace=0,
+            directory_wait=0, stdout=out
+        )
+
+        self.assertIn("Moved 1 users", out.getvalue())
+        self.assertEqual(shard_for_user(user), "default")
+        self.assertFalse(Recipe.objects.using("shard_1").exists())
+        self.assertFalse(
+            get_user_model().objects.using("shard_1").filter(
+                pk=user.pk
+            ).exists()
+        )
+        res = client.get(RECIPES_URL)
+        self.assertEqual(res.data["results"], [recipe])
+
+        # without users, the users go back to the shard of their id
+        call_command(
+            "rebalance_shards", grace=0, directory_wait=0, stdout=out
+        )
+
+        self.assertEqual(shard_for_user(user), "shard_1")
+        self.assertFalse(Recipe.objects.using("default").exists())
+        res = client.get(RECIPES_URL)
+        self.assertEqual(res.data["results"], [recipe])
+
+    def test_rebalance_errors(self):
+        """Test the users and the shards are checked"""
+        with self.assertRaises(CommandError):
+            call_command("rebalance_shards", "missing@gmail.com", to="default")
+        with self.assertRaises(CommandError):
+            call_command("rebalance_shards", to="shard_9")
+
+    def test_writes_rejected_while_moving(self):
+        """Test that a user being moved can read but not write"""
+        user = self.create_user("shard_1")
+        client = self.get_client(user)
+        # fenced by the command in another process
+        fence_user(user.pk, 60)
+
+        res = client.post(TAGS_URL, {"name": "Vegan"})
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn("Retry-After", res)
+        self.assertEqual(client.get(TAGS_URL).status_code, status.HTTP_200_OK)
+
+        fence_user(user.pk, -1)
+        res = client.post(TAGS_URL, {"name": "Vegan"})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_rebalance_waits_for_local_caches(self):
+        """Test that with a cache local to each process the old rows are
+        kept and the writes fenced until the cached shards expire"""
+        user = self.create_user("shard_1")
+        client = self.get_client(user)
+        recipe = self.create_recipe(client)
+        stale = caches["default"].get("user-shard:%d" % user.pk)
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            if seconds != 300:
+                return
+            # a process which still caches the old shard
+            caches["default"].set("user-shard:%d" % user.pk, stale)
+            res = client.get(RECIPES_URL)
+            self.assertEqual(res.data["results"], [recipe])
+            res = client.post(TAGS_URL, {"name": "Lunch"})
+            self.assertEqual(
+                res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        with mock.patch(
+            "core.management.commands.rebalance_shards.time.sleep", sleep
+        ), mock.patch(
+            "core.management.commands.rebalance_shards.is_cache_shared",
+            return_value=False
+        ):
+            call_command(
+                "rebalance_shards", user.email, to="default", grace=0,
+                stdout=StringIO()
+            )
+
+        self.assertEqual(waits, [0, 300])
+        self.assertFalse(Recipe.objects.using("shard_1").exists())
+        caches["default"].clear()
+        res = client.post(TAGS_URL, {"name": "Lunch"})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_user_deleted(self):
+        """Test that deleting a user deletes its rows on the shard"""
+        user = self.create_user("shard_1")
+        self.create_recipe(self.get_client(user))
+
+        user.delete()
+
+        self.assertFalse(Recipe.objects.using("shard_1").exists())
+        self.assertFalse(Tag.objects.using("shard_1").exists())
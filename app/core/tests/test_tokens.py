@@ -0,0 +1,231 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.tokens import (
+    ACCESS, REFRESH, InvalidToken, TokenSigner, revocations
+)
+
+
+SIGNED_TOKEN_URL = reverse("users:signed-token")
+REFRESH_URL = reverse("users:refresh-token")
+REVOKE_URL = reverse("users:revoke-tokens")
+ME_URL = reverse("users:me")
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+class TokenSignerTests(TestCase):
+    """Test the signing and the verification of the tokens"""
+
+    def setUp(self):
+        self.now = 1000
+        self.signer = TokenSigner(timer=lambda: self.now)
+        self.user = get_user_model()(pk=7, token_generation=2)
+
+    def test_verify(self):
+        """Test that a token gives back its user and generation"""
+        token = self.signer.sign(ACCESS, self.user, 60)
+
+        self.assertEqual(self.signer.verify(token, ACCESS), (7, 2))
+
+    def test_invalid_tokens(self):
+        """Test that the tampered, expired and misused tokens fail"""
+        token = self.signer.sign(ACCESS, self.user, 60)
+        claims, signature = token.split(".")
+        other = self.signer.sign(ACCESS, get_user_model()(pk=8), 60)
+
+        for bad, kind in (
+            ("%s.%s" % (other.split(".")[0], signature), ACCESS),
+            (claims, ACCESS),
+            ("é.é", ACCESS),
+            (token, REFRESH),
+        ):
+            with self.assertRaises(InvalidToken):
+                self.signer.verify(bad, kind)
+
+        self.now += 60
+        with self.assertRaisesMessage(InvalidToken, "expired"):
+            self.signer.verify(token, ACCESS)
+
+    @override_settings(SIGNED_TOKENS={"SECRET": "other"})
+    def test_secret(self):
+        """Test that the tokens signed with another secret fail"""
+        token = TokenSigner().sign(ACCESS, self.user, 60)
+
+        with self.settings(SIGNED_TOKENS={"SECRET": "rotated"}):
+            with self.assertRaises(InvalidToken):
+                TokenSigner().verify(token, ACCESS)
+
+    @override_settings(
+        PRODUCTION=True, SECRET_KEY="public", DEVELOPMENT_SECRET_KEY="public"
+    )
+    def test_development_key_refused(self):
+        """Test that no token is signed with the public development key
+        in production"""
+        with self.assertRaises(ImproperlyConfigured):
+            TokenSigner().sign(ACCESS, self.user, 60)
+
+        with self.settings(SIGNED_TOKENS={"SECRET": "private"}):
+            token = TokenSigner().sign(ACCESS, self.user, 60)
+            self.assertEqual(TokenSigner().verify(token, ACCESS), (7, 2))
+
+
+class SignedTokenApiTests(TestCase):
+    """Test the signed tokens through the API"""
+
+    def setUp(self):
+        revocations.clear()
+        self.user = get_user_model().objects.create_user(
+            "signed@gmail.com",
+            "testpass",
+            name="Signed"
+        )
+        self.client = APIClient()
+        res = self.client.post(SIGNED_TOKEN_URL, {
+            "email": "signed@gmail.com", "password": "testpass"
+        })
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.tokens = res.data
+
+    def tearDown(self):
+        revocations.clear()
+
+    def authenticate(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + access)
+
+    def test_bad_credentials(self):
+        """Test that no token is given for a wrong password"""
+        res = self.client.post(SIGNED_TOKEN_URL, {
+            "email": "signed@gmail.com", "password": "wrong"
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_authenticated_without_database(self):
+        """Test that an access token is accepted without reading the
+        user or a token from the database"""
+        self.authenticate(self.tokens["access"])
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        for query in queries.captured_queries:
+            self.assertNotIn('"core_user"', query["sql"])
+            self.assertNotIn('"authtoken_token"', query["sql"])
+
+    def test_retrieve_profile(self):
+        """Test that the user of an access token is loaded when needed"""
+        self.authenticate(self.tokens["access"])
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data, {"email": "signed@gmail.com", "name": "Signed"}
+        )
+
+    def test_refresh_token_not_access(self):
+        """Test that a refresh token can't authenticate a request"""
+        self.authenticate(self.tokens["refresh"])
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res["WWW-Authenticate"], "Token")
+
+    def test_refresh(self):
+        """Test that a refresh token gives new tokens"""
+        res = self.client.post(REFRESH_URL, {
+            "refresh": self.tokens["refresh"]
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.authenticate(res.data["access"])
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK
+        )
+
+    def test_refresh_inactive_user(self):
+        """Test that the tokens of a deactivated user aren't refreshed"""
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.post(REFRESH_URL, {
+            "refresh": self.tokens["refresh"]
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke(self):
+        """Test that the revoked tokens are rejected"""
+        self.authenticate(self.tokens["access"])
+
+        res = self.client.post(REVOKE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_generation, 1)
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+        res = self.client.post(REFRESH_URL, {
+            "refresh": self.tokens["refresh"]
+        })
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_in_other_process(self):
+        """Test that a refresh sees the revocation of another process"""
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            token_generation=1
+        )
+
+        res = self.client.post(REFRESH_URL, {
+            "refresh": self.tokens["refresh"]
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.authenticate(self.tokens["access"])
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_deleted_user(self):
+        """Test that the tokens of a deleted user are refused, also by
+        a process which didn't see the deletion"""
+        self.authenticate(self.tokens["access"])
+        self.user.delete()
+
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+        revocations.clear()
+        self.assertEqual(
+            self.client.get(ME_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+        res = self.client.post(TAGS_URL, {"name": "Vegan"})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user(self):
+        """Test that deactivating a user revokes its tokens"""
+        self.authenticate(self.tokens["access"])
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code,
+            status.HTTP_401_UNAUTHORIZED
+        )
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_generation, 1)
@@ -0,0 +1,268 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication, get_authorization_header
+)
+from rest_framework.permissions import SAFE_METHODS
+
+from core.authentication import LRUCache
+from core.profiling import measure
+
+
+DEFAULT_SIGNED_TOKENS = {
+    # seconds an access token is accepted, it bounds how long a revoked
+    # token or a deactivated user can still be served by a process
+    # which didn't see the revocation
+    "ACCESS_TTL": 300,
+    # seconds a refresh token can be exchanged for new tokens
+    "REFRESH_TTL": 14 * 24 * 3600,
+    # key signing the tokens, the SECRET_KEY when None. The tokens are
+    # refused in production when it's the development key of settings
+    "SECRET": None,
+    # alias of a django cache shared by the processes where the
+    # revocations are published, None keeps them to the process
+    "CACHE_ALIAS": None,
+    # number of users whose revocation is kept in each process
+    "MAX_REVOKED": 10000,
+}
+
+ACCESS, REFRESH = "a", "r"
+
+
+class InvalidToken(Exception):
+    """The token is malformed, badly signed, expired or revoked"""
+
+
+def get_signed_token_settings():
+    """Return the signed token settings merged with the defaults"""
+    options = dict(DEFAULT_SIGNED_TOKENS)
+    options.update(getattr(settings, "SIGNED_TOKENS", {}))
+    return options
+
+
+def encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def get_key(secret):
+    # derived so the SECRET_KEY isn't used as is by another signer
+    return hashlib.sha256(
+        b"core.tokens.signed-token:" + secret.encode()
+    ).digest()
+
+
+class TokenSigner:
+    """Sign and verify the (kind, user id, generation, expiry) tokens
+
+    A token is the base64 of its JSON claims and of their HMAC-SHA256,
+    it is verified without the database. The generation is the
+    token_generation of the user when the token was issued, increasing
+    it revokes every token issued before."""
+
+    def __init__(self, timer=time.time):
+        self.timer = timer
+        self._keys = {}
+
+    def get_key(self):
+        secret = get_signed_token_settings()["SECRET"] or settings.SECRET_KEY
+        # the development key is public, anyone could sign tokens with it
+        if not secret or getattr(settings, "PRODUCTION", False) and \
+                secret == getattr(settings, "DEVELOPMENT_SECRET_KEY", None):
+            raise ImproperlyConfigured(
+                "The signed tokens need SIGNED_TOKENS['SECRET'] or a "
+                "SECRET_KEY of their own in production"
+            )
+        key = self._keys.get(secret)
+        if key is None:
+            key = self._keys[secret] = get_key(secret)
+        return key
+
+    def sign(self, kind, user, ttl):
+        claims = json.dumps(
+            [kind, user.pk, user.token_generation, int(self.timer() + ttl)],
+            separators=(",", ":")
+        ).encode()
+        signature = hmac.new(self.get_key(), claims, hashlib.sha256)
+        return "%s.%s" % (encode(claims), encode(signature.digest()))
+
+    def issue(self, user):
+        """Return a new access and refresh token for the user"""
+        options = get_signed_token_settings()
+        return {
+            "access": self.sign(ACCESS, user, options["ACCESS_TTL"]),
+            "refresh": self.sign(REFRESH, user, options["REFRESH_TTL"]),
+            "expires_in": options["ACCESS_TTL"],
+        }
+
+    def verify(self, token, kind):
+        """Return the (user id, generation) of a valid token of a kind,
+        raise InvalidToken otherwise"""
+        try:
+            claims, signature = token.split(".")
+            claims, signature = decode(claims), decode(signature)
+        except (ValueError, TypeError):
+            raise InvalidToken("Malformed token.")
+        expected = hmac.new(self.get_key(), claims, hashlib.sha256)
+        if not hmac.compare_digest(expected.digest(), signature):
+            raise InvalidToken("Invalid token signature.")
+
+        # the claims were signed by this module
+        token_kind, user_id, generation, expires_at = json.loads(claims)
+        if token_kind != kind:
+            raise InvalidToken("Wrong token type.")
+        if expires_at <= self.timer():
+            raise InvalidToken("Token expired.")
+        if generation < revocations.get(user_id):
+            raise InvalidToken("Token revoked.")
+        return user_id, generation
+
+
+class Revocations:
+    """Lowest token generation still accepted for the recently revoked
+    users
+
+    Each process keeps the revocations it made or received in memory
+    for ACCESS_TTL, after which the revoked access tokens have expired.
+    With CACHE_ALIAS the revocations are also published to a django
+    cache shared by the processes and looked up there, otherwise
+    another process accepts the revoked access tokens until they expire.
+    The refresh tokens are always checked against the database."""
+
+    key_prefix = "token-generation:"
+
+    def __init__(self):
+        self._local = None
+
+    @property
+    def local(self):
+        if self._local is None:
+            options = get_signed_token_settings()
+            self._local = LRUCache(
+                options["MAX_REVOKED"], options["ACCESS_TTL"]
+            )
+        return self._local
+
+    def get_shared_cache(self):
+        alias = get_signed_token_settings()["CACHE_ALIAS"]
+        return caches[alias] if alias else None
+
+    def get(self, user_id):
+        """Return the lowest generation accepted for a user"""
+        generation = self.local.get(user_id)
+        if generation is not None:
+            return generation
+        shared = self.get_shared_cache()
+        if shared is None:
+            return 0
+        generation = shared.get(self.key_prefix + str(user_id), 0)
+        if generation:
+            self.local.set(user_id, generation)
+        return generation
+
+    def set(self, user_id, generation):
+        self.local.set(user_id, generation)
+        shared = self.get_shared_cache()
+        if shared is not None:
+            shared.set(
+                self.key_prefix + str(user_id), generation,
+                get_signed_token_settings()["ACCESS_TTL"]
+            )
+
+    def clear(self):
+        self.local.clear()
+
+
+signer = TokenSigner()
+revocations = Revocations()
+
+
+def get_token_user(user_id):
+    """Return the user of a verified access token without querying it,
+    its fields are loaded from the database on first access"""
+    return get_user_model().from_db(DEFAULT_DB_ALIAS, ["id"], [user_id])
+
+
+def refresh_tokens(token):
+    """Return new tokens for a refresh token, the user is read from the
+    database so the deactivated users and the revoked tokens fail"""
+    user_id, generation = signer.verify(token, REFRESH)
+    user = get_user_model()._base_manager.using(DEFAULT_DB_ALIAS).filter(
+        pk=user_id, is_active=True
+    ).first()
+    if user is None:
+        raise InvalidToken("User inactive or deleted.")
+    if generation != user.token_generation:
+        # the process which revoked the tokens may not be this one
+        revocations.set(user.pk, user.token_generation)
+        raise InvalidToken("Token revoked.")
+    return signer.issue(user)
+
+
+def revoke_tokens(user):
+    """Revoke every signed token issued to the user"""
+    model = get_user_model()
+    model._base_manager.using(DEFAULT_DB_ALIAS).filter(pk=user.pk).update(
+        token_generation=F("token_generation") + 1
+    )
+    user.token_generation = model._base_manager.using(
+        DEFAULT_DB_ALIAS
+    ).values_list("token_generation", flat=True).get(pk=user.pk)
+    revocations.set(user.pk, user.token_generation)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authentication with the signed access tokens sent as
+    "Authorization: Bearer <token>", the token of a read is verified
+    without the database and its user is only read when a view needs its
+    fields. The writes read the user to check it's still active."""
+
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(
+                "Invalid token header. A single token must be provided."
+            )
+
+        with measure("auth"):
+            try:
+                user_id, generation = signer.verify(
+                    auth[1].decode("latin1"), ACCESS
+                )
+            except InvalidToken as exc:
+                raise exceptions.AuthenticationFailed(str(exc))
+            if request.method in SAFE_METHODS:
+                return get_token_user(user_id), None
+
+            # the writes hit the database anyway, they check the user so
+            # a deleted one can't leave rows pointing to it
+            user = get_user_model()._base_manager.using(
+                DEFAULT_DB_ALIAS
+            ).filter(pk=user_id, is_active=True).first()
+            if user is None or user.token_generation != generation:
+                raise exceptions.AuthenticationFailed(
+                    "User inactive or deleted, or token revoked."
+                )
+        return user, None
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = 'recipe'
+
+    def ready(self):
+        # connect the signal receivers keeping the search vectors fresh
+        from recipe import signals  # noqa: F401
+
+        from core.metrics import metrics
+        from recipe.cache import response_cache
+
+        metrics.register(response_cache.collect_metrics)
@@ -0,0 +1,160 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.response import Response
+
+from core.routers import read_alias
+from recipe.conditional import versions
+
+
+DEFAULT_API_RESPONSE_CACHE = {
+    # only safe with a cache shared by the processes
+    "ENABLED": False,
+    # alias of the django cache holding the responses
+    "ALIAS": "default",
+    # seconds a response stays cached when nothing invalidates it
+    "TTL": 300,
+}
+
+
+def get_response_cache_settings():
+    """Return the response cache settings merged with the defaults"""
+    options = dict(DEFAULT_API_RESPONSE_CACHE)
+    options.update(getattr(settings, "API_RESPONSE_CACHE", {}))
+    return options
+
+
+class ResponseCache:
+    """Serialized API responses cached per user, url and version
+
+    A response is stored under the versions of the scopes it was built
+    from, so a bumped version can never serve it again. The keys are
+    also indexed by scope so invalidate() deletes them right away."""
+
+    key_prefix = "api-response:"
+    index_prefix = "api-response-index:"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def get_cache(self):
+        return caches[get_response_cache_settings()["ALIAS"]]
+
+    def is_enabled(self):
+        return get_response_cache_settings()["ENABLED"]
+
+    def get_key(self, request, etag):
+        """Return the key of a request for the given versions"""
+        params = sorted(request.query_params.lists())
+        raw = "%s|%s|%s|%s" % (request.user.pk, request.path, params, etag)
+        return self.key_prefix + hashlib.md5(raw.encode()).hexdigest()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get(self, key):
+        """Return the cached (status, data) pair of a key"""
+        cached = self.get_cache().get(key)
+        self._count("misses" if cached is None else "hits")
+        return cached
+
+    def set(self, key, scopes, status_code, data):
+        """Cache a response and index its key under its scopes"""
+        cache = self.get_cache()
+        ttl = get_response_cache_settings()["TTL"]
+        cache.set(key, (status_code, data), ttl)
+
+        index_keys = [self.index_prefix + scope for scope in scopes]
+        indexes = cache.get_many(index_keys)
+        cache.set_many({
+            index_key: indexes.get(index_key, set()) | {key}
+            for index_key in index_keys
+        }, ttl)
+
+    def invalidate(self, *scopes):
+        """Delete the responses built from the given scopes"""
+        cache = self.get_cache()
+        index_keys = [self.index_prefix + scope for scope in scopes]
+        keys = set()
+        for indexed in cache.get_many(index_keys).values():
+            keys |= indexed
+
+        if keys:
+            cache.delete_many(list(keys))
+            self._count("evictions", len(keys))
+        cache.delete_many(index_keys)
+
+    def stats(self):
+        """Return the hit, miss and eviction counts of this process"""
+        with self._lock:
+            return dict(self._stats)
+
+    def collect_metrics(self):
+        """Return the counters of the cache for the /metrics endpoint"""
+        return [
+            ("api_response_cache_%s_total" % name,
+             "Responses cache %s" % name, value)
+            for name, value in sorted(self.stats().items())
+        ]
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+response_cache = ResponseCache()
+
+
+def invalidate_scopes(*scopes):
+    """Give new versions to the scopes and drop their cached responses"""
+    versions.bump(*scopes)
+    if response_cache.is_enabled():
+        response_cache.invalidate(*scopes)
+
+
+class CachedResponseMixin:
+    """Cache the serialized responses of the list action, the views
+    wrap their other read actions with cached()
+
+    A cached hit neither queries the database nor runs the serializer,
+    the response is built from the data stored by the first request.
+    The scopes come from get_version_scopes like the ETags. A miss is
+    read from the primary: a replica may not have the writes behind the
+    current versions yet, its response would be served until the next
+    write."""
+
+    def cached(self, handler, request, *args, **kwargs):
+        if not response_cache.is_enabled():
+            return handler(request, *args, **kwargs)
+
+        scopes = self.get_version_scopes()
+        etag = getattr(self, "version_etag", None)
+        if etag is None:
+            etag, _ = versions.get_validators(scopes)
+        key = response_cache.get_key(request, etag)
+
+        cached = response_cache.get(key)
+        if cached is not None:
+            status_code, data = cached
+            response = Response(data, status=status_code)
+            response["X-Cache"] = "HIT"
+            return response
+
+        token = read_alias.set(None)
+        try:
+            response = handler(request, *args, **kwargs)
+        finally:
+            read_alias.reset(token)
+        if response.status_code == 200:
+            response_cache.set(key, scopes, response.status_code,
+                               response.data)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
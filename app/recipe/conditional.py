@@ -0,0 +1,129 @@
+import hashlib
+import math
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import (
+    get_conditional_response, patch_vary_headers, quote_etag
+)
+from django.utils.http import http_date
+
+from core.routers import read_alias
+
+
+class VersionStore:
+    """Versions of the user collections kept in the django cache
+
+    A version is a random token with the time of the last change of the
+    scope, a scope being for example "recipe:<user id>", see
+    user_scope(). Every write
+    bumps the versions of the scopes it affects, a scope missing from
+    the cache gets a new version so an evicted version can only cause a
+    full response, never a stale one."""
+
+    key_prefix = "api-version:"
+
+    def get_cache(self):
+        return caches[getattr(settings, "API_VERSION_CACHE", "default")]
+
+    def _new_version(self, previous=None):
+        # the time is rounded up to the second as in the HTTP headers,
+        # and it always moves forward so If-Modified-Since can't miss a
+        # change made during the same second as the previous one
+        last_modified = math.ceil(time.time())
+        if previous is not None:
+            last_modified = max(last_modified, previous[1] + 1)
+        return uuid.uuid4().hex, last_modified
+
+    def get_many(self, scopes):
+        """Return the version of each scope"""
+        cache = self.get_cache()
+        keys = {self.key_prefix + scope: scope for scope in scopes}
+        versions = cache.get_many(list(keys))
+
+        missing = {
+            key: self._new_version()
+            for key in keys if key not in versions
+        }
+        for key, version in missing.items():
+            # another process may have created the version meanwhile
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+
+        return [versions[key] for key in keys]
+
+    def bump(self, *scopes):
+        """Give a new version to the scopes after a change"""
+        cache = self.get_cache()
+        keys = [self.key_prefix + scope for scope in scopes]
+        previous = cache.get_many(keys)
+        cache.set_many({
+            key: self._new_version(previous.get(key)) for key in keys
+        }, None)
+
+    def get_validators(self, scopes):
+        """Return the ETag and Last-Modified timestamp of the scopes"""
+        versions = self.get_many(scopes)
+        digest = hashlib.md5(
+            ":".join(token for token, _ in versions).encode()
+        ).hexdigest()
+        last_modified = max(timestamp for _, timestamp in versions)
+        return quote_etag(digest), last_modified
+
+
+versions = VersionStore()
+
+
+def user_scope(name, user_id, *parts):
+    """Return the version scope of a user collection or object"""
+    return ":".join(str(part) for part in (name, user_id) + parts)
+
+
+class ConditionalGetMixin:
+    """Answer conditional GET requests of the list action, the views
+    wrap their other read actions with conditional()
+
+    The ETag and Last-Modified headers come from the versions of the
+    scopes returned by get_version_scopes, a request whose validators
+    match gets a 304 before any row is loaded. Within
+    REPLICA_PIN_SECONDS of the last change of the scopes, the lag the
+    replicas are given to catch up, the rows are read from the primary:
+    the rows of a late replica would be validated by the new ETag until
+    the next write."""
+
+    def get_version_scopes(self):
+        """Return the scopes the response of the current action uses"""
+        raise NotImplementedError
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = versions.get_validators(
+            self.get_version_scopes()
+        )
+        # kept for the response cache, it's keyed on the same versions
+        self.version_etag = etag
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            recent = time.time() < last_modified + getattr(
+                settings, "REPLICA_PIN_SECONDS", 5
+            )
+            token = read_alias.set(None) if recent else None
+            try:
+                response = handler(request, *args, **kwargs)
+            finally:
+                if token is not None:
+                    read_alias.reset(token)
+
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            # the same url returns a different collection for every user
+            patch_vary_headers(response, ["Authorization"])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
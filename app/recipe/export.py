@@ -0,0 +1,102 @@
+import csv
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from core.models import Recipe
+
+
+EXPORT_FIELDS = ["id", "title", "time_minutes", "price", "link"]
+EXPORT_RELATIONS = {"tags": "tag__name", "ingredients": "ingredient__name"}
+
+# separator of the tag and ingredient names in a csv cell
+CSV_LIST_SEPARATOR = ";"
+
+
+def get_export_chunk_size():
+    """Return the number of recipes loaded from the database at once"""
+    return getattr(settings, "API_EXPORT_CHUNK_SIZE", 2000)
+
+
+def chunked(iterable, size):
+    """Yield lists of at most size items"""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def load_related_names(recipe_ids, using=None):
+    """Return {field: {recipe id: [names]}} for the given recipes
+
+    One query per relation reads the names through the join table, the
+    names are ordered so an export is the same every time it's made"""
+    related = {}
+    for field, lookup in EXPORT_RELATIONS.items():
+        through = getattr(Recipe, field).through
+        names = {}
+        rows = through.objects.using(using).filter(
+            recipe_id__in=recipe_ids
+        ).order_by("recipe_id", lookup).values_list("recipe_id", lookup)
+        for recipe_id, name in rows.iterator():
+            names.setdefault(recipe_id, []).append(name)
+        related[field] = names
+    return related
+
+
+def iter_recipes(queryset, chunk_size=None):
+    """Yield the recipes of the queryset as dicts with their tag and
+    ingredient names
+
+    The rows are read with a database cursor chunk_size rows at a time
+    and the names of each chunk are fetched before it's yielded, so
+    only one chunk is ever held in memory. iterator() ignores
+    prefetch_related, the prefetching is done here chunk by chunk."""
+    chunk_size = chunk_size or get_export_chunk_size()
+    rows = queryset.prefetch_related(None).values(*EXPORT_FIELDS)
+
+    for chunk in chunked(rows.iterator(chunk_size=chunk_size), chunk_size):
+        related = load_related_names(
+            [row["id"] for row in chunk], queryset.db
+        )
+        for row in chunk:
+            for field in EXPORT_RELATIONS:
+                row[field] = related[field].get(row["id"], [])
+            yield row
+
+
+class Echo:
+    """File like object returning what is written to it, csv.writer
+    then gives back each line instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def render_ndjson(recipes):
+    """Yield a JSON document per recipe, one per line"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    for recipe in recipes:
+        yield encoder.encode(recipe) + "\n"
+
+
+def render_csv(recipes):
+    """Yield the csv header then a line per recipe"""
+    columns = EXPORT_FIELDS + list(EXPORT_RELATIONS)
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for recipe in recipes:
+        yield writer.writerow([
+            CSV_LIST_SEPARATOR.join(recipe[column])
+            if column in EXPORT_RELATIONS else recipe[column]
+            for column in columns
+        ])
+
+
+# ?output= value: (renderer, content type, file extension)
+EXPORT_FORMATS = {
+    "ndjson": (render_ndjson, "application/x-ndjson", "ndjson"),
+    "csv": (render_csv, "text/csv", "csv"),
+}
@@ -0,0 +1,215 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on a stable (sort key, id) ordering
+
+    The cursor holds the sort key values of the last row of the page so
+    the next page is fetched with a WHERE clause on those values
+    instead of an OFFSET, every page costs the same whatever its depth.
+    The ordering is taken from the queryset and the primary key is
+    appended to it in order to break ties between equal sort keys."""
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = _("Invalid cursor")
+
+    def get_default_page_size(self):
+        """Return the page size used when the client doesn't ask one"""
+        return api_settings.PAGE_SIZE or 100
+
+    def get_max_page_size(self):
+        """Return the biggest page size a client can ask for"""
+        return getattr(settings, "API_MAX_PAGE_SIZE", 1000)
+
+    def get_page_size(self, request):
+        """Return the page size asked in the query params if it's valid"""
+        page_size = request.query_params.get(self.page_size_query_param)
+        try:
+            page_size = int(page_size)
+        except (TypeError, ValueError):
+            return self.get_default_page_size()
+
+        if page_size <= 0:
+            return self.get_default_page_size()
+
+        return min(page_size, self.get_max_page_size())
+
+    def get_ordering(self, queryset):
+        """Return the ordering as a list of (field, descending) tuples"""
+        order_by = queryset.query.order_by or queryset.model._meta.ordering
+        ordering = []
+        for field in order_by:
+            if not isinstance(field, str):
+                raise ValueError("Keyset pagination needs field names")
+            descending = field.startswith("-")
+            name = field.lstrip("-")
+            if name == "pk":
+                name = queryset.model._meta.pk.name
+            ordering.append((name, descending))
+
+        # the primary key makes the ordering total so no row can be
+        # skipped or returned twice between two pages
+        pk_name = queryset.model._meta.pk.name
+        if pk_name not in [name for name, _ in ordering]:
+            descending = ordering[0][1] if ordering else False
+            ordering.append((pk_name, descending))
+
+        return ordering
+
+    def get_ordering_field(self, queryset, name):
+        """Return the model field or the annotation a sort key value of
+        the cursor is converted with"""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def encode_cursor(self, position, reverse):
+        """Return the url for the given position and direction"""
+        cursor = json.dumps(
+            {"p": position, "r": int(reverse)},
+            cls=DjangoJSONEncoder,
+            separators=(",", ":")
+        )
+        encoded = b64encode(cursor.encode("utf-8")).decode("ascii")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        """Return the position and direction stored in the cursor"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            cursor = json.loads(b64decode(encoded.encode("ascii")))
+            position = cursor["p"]
+            reverse = bool(cursor["r"])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        # a value the database can't compare with its field would fail
+        # the query with a 500
+        try:
+            position = [
+                field.to_python(value)
+                for field, value in zip(self.ordering_fields, position)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, reverse
+
+    def get_position(self, item):
+        """Return the sort key values of a row, model instance or dict"""
+        if isinstance(item, dict):
+            return [item[name] for name, _ in self.ordering]
+        return [getattr(item, name) for name, _ in self.ordering]
+
+    def get_keyset_filter(self, position, reverse):
+        """Return the filter selecting the rows after the position
+
+        For an ordering (a, b) this builds a >= x AND (a > x OR (a = x
+        AND b > y)) with lt instead of gt for descending fields. The
+        leading bound on a is redundant but lets the database start a
+        range scan of the (user, a, b) index at the position instead of
+        reading every row before it"""
+        keyset = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, position):
+            lookup = "lt" if descending != reverse else "gt"
+            keyset |= equal & Q(**{"%s__%s" % (name, lookup): value})
+            equal &= Q(**{name: value})
+
+        (name, descending), value = self.ordering[0], position[0]
+        lookup = "lte" if descending != reverse else "gte"
+        return Q(**{"%s__%s" % (name, lookup): value}) & keyset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return one page of rows starting at the requested cursor"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.ordering_fields = [
+            self.get_ordering_field(queryset, name)
+            for name, _ in self.ordering
+        ]
+
+        cursor = self.decode_cursor(request)
+        reverse = False
+        if cursor is not None:
+            position, reverse = cursor
+            queryset = queryset.filter(
+                self.get_keyset_filter(position, reverse)
+            )
+
+        order_by = [
+            ("-" if descending != reverse else "") + name
+            for name, descending in self.ordering
+        ]
+        # we fetch one more row to know if there is a page after this one
+        page = list(queryset.order_by(*order_by)[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+
+        if reverse:
+            page.reverse()
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = page
+        return page
+
+    def get_next_link(self):
+        """Return the url of the next page"""
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), False)
+
+    def get_previous_link(self):
+        """Return the url of the previous page"""
+        if not self.has_previous:
+            return None
+        if not self.page:
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), True)
+
+    def get_paginated_response(self, data):
+        """Return the page with the links to its neighbours"""
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
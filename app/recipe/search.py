@@ -0,0 +1,88 @@
+from functools import reduce
+from operator import and_
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Exists, F, OuterRef, Q
+
+from core.models import Recipe, Tag, Ingredient
+
+
+# the title weights more than the tag names which weight more than
+# the ingredient names when the results are ranked
+REFRESH_SEARCH_VECTOR_SQL = """
+UPDATE core_recipe SET search_vector =
+    setweight(to_tsvector(%(config)s, core_recipe.title), 'A') ||
+    setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(core_tag.name, ' ')
+        FROM core_tag
+        INNER JOIN core_recipe_tags
+            ON core_recipe_tags.tag_id = core_tag.id
+        WHERE core_recipe_tags.recipe_id = core_recipe.id
+    ), '')), 'B') ||
+    setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(core_ingredient.name, ' ')
+        FROM core_ingredient
+        INNER JOIN core_recipe_ingredients
+            ON core_recipe_ingredients.ingredient_id = core_ingredient.id
+        WHERE core_recipe_ingredients.recipe_id = core_recipe.id
+    ), '')), 'C')
+WHERE core_recipe.id = ANY(%(ids)s)
+"""
+
+
+def get_search_config():
+    """Return the postgres text search configuration to use"""
+    return getattr(settings, "RECIPE_SEARCH_CONFIG", "english")
+
+
+def supports_full_text_search(using="default"):
+    """Return True when the database has a maintained search vector"""
+    return connections[using].vendor == "postgresql"
+
+
+def refresh_search_vectors(recipe_ids, using="default"):
+    """Rebuild the search vector of the given recipes in one query"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or not supports_full_text_search(using):
+        return
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(REFRESH_SEARCH_VECTOR_SQL, {
+            "config": get_search_config(),
+            "ids": recipe_ids,
+        })
+
+
+def _contains(model, relation, term):
+    """Return a filter checking a related name contains the term"""
+    through = getattr(Recipe, relation).through
+    column = "%s__name__icontains" % model._meta.model_name
+    return Q(Exists(through.objects.filter(
+        recipe_id=OuterRef("pk"), **{column: term}
+    )))
+
+
+def search_recipes(queryset, text):
+    """Return the recipes matching the text, best matches first
+
+    Postgres uses the GIN indexed search vector and orders the recipes
+    by rank, other databases fall back to a slower scan where every
+    word has to be found in the title, a tag or an ingredient"""
+    if supports_full_text_search(queryset.db):
+        query = SearchQuery(text, config=get_search_config())
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F("search_vector"), query)
+        ).order_by("-rank", "-id")
+
+    words = text.split()
+    if not words:
+        return queryset.none()
+
+    return queryset.filter(reduce(and_, [
+        Q(title__icontains=word) |
+        _contains(Tag, "tags", word) |
+        _contains(Ingredient, "ingredients", word)
+        for word in words
+    ]))
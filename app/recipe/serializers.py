@@ -1,35 +1,156 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.translation import gettext_lazy as _
+
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
 from core.models import Tag, Ingredient, Recipe
+from core.profiling import ProfiledListSerializer, ProfiledSerializerMixin
+
+
+class UserManyRelatedField(serializers.ManyRelatedField):
+    """List of primary keys resolved with a single query
+
+    The primary keys are looked up with one IN query on the objects of
+    the request user, the ids of other users objects are rejected like
+    ids which don't exist. Every missing id is reported in one error."""
+
+    default_error_messages = {
+        "does_not_exist": _(
+            "Invalid pk(s) {pk_value} - objects do not exist."
+        ),
+    }
+
+    def to_pk(self, value):
+        """Convert a submitted value to a primary key"""
+        model = self.child_relation.get_queryset().model
+        try:
+            return model._meta.pk.to_python(value)
+        except (DjangoValidationError, TypeError, ValueError):
+            self.child_relation.fail(
+                "incorrect_type", data_type=type(value).__name__
+            )
+
+    def resolve(self, pks):
+        """Return a dict of the objects of the pks, missing ones are None
+
+        The objects are kept in context["related_objects"] when the
+        serializer context has it, so several serializers sharing their
+        context resolve every id only once."""
+        queryset = self.child_relation.get_queryset()
+        cache = self.context.get("related_objects")
+        if cache is None:
+            cache = {}
+        cache = cache.setdefault(queryset.model._meta.label, {})
+
+        unknown = [pk for pk in dict.fromkeys(pks) if pk not in cache]
+        if unknown:
+            found = queryset.in_bulk(unknown)
+            for pk in unknown:
+                cache[pk] = found.get(pk)
+
+        return {pk: cache[pk] for pk in pks}
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        pks = [self.to_pk(value) for value in data]
+        objects = self.resolve(pks)
 
+        missing = [pk for pk in dict.fromkeys(pks) if objects[pk] is None]
+        if missing:
+            self.fail("does_not_exist", pk_value=missing)
 
-class TagSerializer(serializers.ModelSerializer):
+        return [objects[pk] for pk in pks]
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field limited to the objects of the request user"""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return UserManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get("request")
+        if request is None:
+            return queryset
+        return queryset.for_user(request.user)
+
+
+def preload_related_objects(serializer, items):
+    """Resolve the related ids of a list of payloads
+
+    Every UserManyRelatedField of the serializer resolves the ids
+    found in all the payloads with one query, the serializers of the
+    payloads then find them in the context shared with this one."""
+    for field in serializer.fields.values():
+        if not isinstance(field, UserManyRelatedField):
+            continue
+
+        pks = []
+        for item in items:
+            values = item.get(field.field_name) \
+                if isinstance(item, dict) else None
+            if not isinstance(values, list):
+                continue
+            for value in values:
+                try:
+                    pks.append(field.to_pk(value))
+                except serializers.ValidationError:
+                    # reported when the payload is validated
+                    pass
+        field.resolve(pks)
+
+
+class TagSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """Serializer for tag object"""
 
     class Meta:
         model = Tag
+        list_serializer_class = ProfiledListSerializer
         fields = ('id', 'name')
         read_only_Fields = ('id',)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(ProfiledSerializerMixin,
+                           serializers.ModelSerializer):
     """Serializer for ingredient object"""
 
     class Meta:
         
         model = Ingredient
+        list_serializer_class = ProfiledListSerializer
         fields = ("id", "name")
         read_only_fields = ("id", )
 
-class RecipeSerializer(serializers.ModelSerializer):
+
+class RecipeSerializer(ProfiledSerializerMixin,
+                       serializers.ModelSerializer):
     """Serializer for recipe"""
 
-    ingredients = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all(), many=True)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
+    ingredients = UserPrimaryKeyRelatedField(
+        queryset=Ingredient.objects.all(), many=True
+    )
+    tags = UserPrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
 
     class Meta:
         model = Recipe
-        fields = ["title", "time_minutes", "price", "user", "link", "tags", "ingredients"]
+        list_serializer_class = ProfiledListSerializer
+        fields = [
+            "id", "title", "time_minutes", "price", "user", "link", "tags",
+            "ingredients"
+        ]
+        # the recipes always belong to the authenticated user
+        read_only_fields = ["id", "user"]
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe.cache import invalidate_scopes
+from recipe.conditional import user_scope
+from recipe.search import refresh_search_vectors, supports_full_text_search
+
+
+def _recipes_using(instance):
+    """Return the ids of the recipes linked to a tag or ingredient"""
+    return list(instance.recipe_set.values_list("id", flat=True))
+
+
+def _recipes_changed(user_id, recipe_ids):
+    """Invalidate the recipe list and the recipes"""
+    invalidate_scopes(
+        user_scope("recipe", user_id),
+        *[user_scope("recipe", user_id, pk) for pk in recipe_ids]
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_created(sender, instance, created, **kwargs):
+    """Start the collections of a new user with new versions, a reused
+    user id can't get the cached responses of a deleted user"""
+    if created:
+        invalidate_scopes(*[
+            user_scope(name, instance.pk)
+            for name in ("recipe", "tag", "ingredient")
+        ])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    """Invalidate a saved or deleted recipe"""
+    _recipes_changed(instance.user_id, [instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, using, **kwargs):
+    """Rebuild the search vector of a saved recipe"""
+    refresh_search_vectors([instance.pk], using=using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             using, **kwargs):
+    """Update the recipes whose tags or ingredients changed"""
+    if reverse and action == "pre_clear":
+        # the recipes are unknown once the rows are deleted
+        instance._cleared_recipe_ids = _recipes_using(instance)
+        return
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == "post_clear":
+        recipe_ids = getattr(instance, "_cleared_recipe_ids", [])
+    else:
+        recipe_ids = list(pk_set)
+
+    Recipe.objects.using(using).filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+    _recipes_changed(instance.user_id, recipe_ids)
+    refresh_search_vectors(recipe_ids, using=using)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attr_saved(sender, instance, created, using, **kwargs):
+    """Update the recipes using a renamed tag or ingredient"""
+    invalidate_scopes(user_scope(sender._meta.model_name, instance.user_id))
+    if not created and supports_full_text_search(using):
+        refresh_search_vectors(_recipes_using(instance), using=using)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attr_deleting(sender, instance, using, **kwargs):
+    """Remember the recipes using a tag before it's deleted"""
+    instance._deleted_recipe_ids = _recipes_using(instance)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attr_deleted(sender, instance, using, **kwargs):
+    """Update the recipes which used a deleted tag or ingredient"""
+    recipe_ids = getattr(instance, "_deleted_recipe_ids", [])
+    invalidate_scopes(user_scope(sender._meta.model_name, instance.user_id))
+    Recipe.objects.using(using).filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+    _recipes_changed(instance.user_id, recipe_ids)
+    refresh_search_vectors(recipe_ids, using=using)
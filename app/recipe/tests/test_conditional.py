@@ -0,0 +1,135 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def detail_url(recipe_id):
+    """Return the detail url of a recipe"""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+class ConditionalGetTests(TestCase):
+    """Test the ETag and Last-Modified validators of the API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "etag@gmail.com",
+            "testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=10, price=2
+        )
+
+    def assertNotModified(self, url, etag):
+        """Check that the url answers a 304 without any query"""
+        with self.assertNumQueries(0):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+
+    def assertModified(self, url, etag):
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_list_not_modified(self):
+        """Test that an unchanged list answers a 304"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("Last-Modified", res)
+        self.assertNotModified(RECIPES_URL, res["ETag"])
+
+    def test_list_modified_by_new_recipe(self):
+        """Test that creating a recipe changes the list ETag"""
+        etag = self.client.get(RECIPES_URL)["ETag"]
+        Recipe.objects.create(
+            user=self.user, title="Stew", time_minutes=60, price=8
+        )
+
+        self.assertModified(RECIPES_URL, etag)
+
+    def test_list_modified_by_new_tag_link(self):
+        """Test that adding a tag to a recipe changes the ETags"""
+        url = detail_url(self.recipe.id)
+        list_etag = self.client.get(RECIPES_URL)["ETag"]
+        detail_etag = self.client.get(url)["ETag"]
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Hot"))
+
+        self.assertModified(RECIPES_URL, list_etag)
+        self.assertModified(url, detail_etag)
+
+    def test_detail_modified_by_tag_rename(self):
+        """Test that renaming a tag changes the detail but not the list"""
+        tag = Tag.objects.create(user=self.user, name="Hot")
+        self.recipe.tags.add(tag)
+        url = detail_url(self.recipe.id)
+        list_etag = self.client.get(RECIPES_URL)["ETag"]
+        detail_etag = self.client.get(url)["ETag"]
+
+        tag.name = "Spicy"
+        tag.save()
+
+        self.assertNotModified(RECIPES_URL, list_etag)
+        self.assertModified(url, detail_etag)
+
+    def test_search_modified_by_tag_rename(self):
+        """Test that renaming a tag changes the ETag of the searches,
+        they match the names of the tags"""
+        tag = Tag.objects.create(user=self.user, name="Hot")
+        self.recipe.tags.add(tag)
+        url = RECIPES_URL + "?search=spicy"
+        etag = self.client.get(url)["ETag"]
+
+        tag.name = "Spicy"
+        tag.save()
+
+        self.assertModified(url, etag)
+
+    def test_other_user_changes_ignored(self):
+        """Test that another user's writes don't change the ETag"""
+        etag = self.client.get(TAGS_URL)["ETag"]
+        user2 = get_user_model().objects.create_user(
+            "other@gmail.com",
+            "testpass"
+        )
+        Tag.objects.create(user=user2, name="Vegan")
+
+        self.assertNotModified(TAGS_URL, etag)
+
+    def test_tag_create_changes_etag(self):
+        """Test that creating a tag through the API changes the ETag"""
+        etag = self.client.get(TAGS_URL)["ETag"]
+        self.client.post(TAGS_URL, {"name": "Vegan"})
+
+        self.assertModified(TAGS_URL, etag)
+
+    def test_if_modified_since(self):
+        """Test the Last-Modified validator"""
+        last_modified = self.client.get(RECIPES_URL)["Last-Modified"]
+
+        res = self.client.get(
+            RECIPES_URL, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.recipe.title = "Cold soup"
+        self.recipe.save()
+
+        res = self.client.get(
+            RECIPES_URL, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["Last-Modified"], last_modified)
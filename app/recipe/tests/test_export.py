@@ -0,0 +1,136 @@
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+EXPORT_URL = reverse("recipe:recipe-export")
+
+
+class RecipeExportTests(TestCase):
+    """Test the streaming export of the recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "export@gmail.com",
+            "testpass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def add_recipe(self, title, tags=(), ingredients=(), **params):
+        defaults = {"time_minutes": 10, "price": 5.00}
+        defaults.update(params)
+        recipe = Recipe.objects.create(user=self.user, title=title, **defaults)
+        recipe.tags.set([
+            Tag.objects.get_or_create(user=self.user, name=name)[0]
+            for name in tags
+        ])
+        recipe.ingredients.set([
+            Ingredient.objects.get_or_create(user=self.user, name=name)[0]
+            for name in ingredients
+        ])
+        return recipe
+
+    def get_content(self, params=None):
+        res = self.client.get(EXPORT_URL, params or {})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(res, StreamingHttpResponse)
+        return b"".join(res.streaming_content).decode("utf-8")
+
+    def test_export_ndjson(self):
+        """Test that each recipe is exported on its own line"""
+        soup = self.add_recipe(
+            "Soup", tags=["Vegan", "Hot"], ingredients=["Leek"]
+        )
+        cake = self.add_recipe("Cake", price="7.50")
+
+        lines = self.get_content().splitlines()
+
+        self.assertEqual([json.loads(line) for line in lines], [
+            {
+                "id": cake.id, "title": "Cake", "time_minutes": 10,
+                "price": "7.50", "link": "",
+                "tags": [], "ingredients": [],
+            },
+            {
+                "id": soup.id, "title": "Soup", "time_minutes": 10,
+                "price": "5.00", "link": "",
+                "tags": ["Hot", "Vegan"], "ingredients": ["Leek"],
+            },
+        ])
+
+    def test_export_csv(self):
+        """Test the csv export with the names joined in one cell"""
+        soup = self.add_recipe(
+            "Soup", tags=["Vegan", "Hot"], ingredients=["Leek"]
+        )
+
+        rows = list(csv.reader(io.StringIO(self.get_content(
+            {"output": "csv"}
+        ))))
+
+        self.assertEqual(rows, [
+            ["id", "title", "time_minutes", "price", "link", "tags",
+             "ingredients"],
+            [str(soup.id), "Soup", "10", "5.00", "", "Hot;Vegan", "Leek"],
+        ])
+
+    def test_export_invalid_output(self):
+        """Test that an unknown output format is rejected"""
+        res = self.client.get(EXPORT_URL, {"output": "xml"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_limited_to_user(self):
+        """Test that only the recipes of the user are exported"""
+        user2 = get_user_model().objects.create_user(
+            "other@gmail.com",
+            "testpass"
+        )
+        Recipe.objects.create(
+            user=user2, title="Stew", time_minutes=60, price=8
+        )
+        self.add_recipe("Soup")
+
+        lines = self.get_content().splitlines()
+
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["title"], "Soup")
+
+    def test_export_filtered(self):
+        """Test that the list filters apply to the export"""
+        self.add_recipe("Soup", price=2)
+        self.add_recipe("Stew", price=20)
+
+        lines = self.get_content({"price_min": 10}).splitlines()
+
+        self.assertEqual(
+            [json.loads(line)["title"] for line in lines], ["Stew"]
+        )
+
+    @override_settings(API_EXPORT_CHUNK_SIZE=2)
+    def test_export_queries_per_chunk(self):
+        """Test that the relations are loaded once per chunk of rows"""
+        for i in range(5):
+            self.add_recipe(
+                "Recipe %d" % i, tags=["Tag %d" % i], ingredients=["Salt"]
+            )
+        res = self.client.get(EXPORT_URL)
+
+        # the recipes then the tags and ingredients of each of the
+        # three chunks
+        with self.assertNumQueries(1 + 2 * 3):
+            lines = b"".join(res.streaming_content).splitlines()
+
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])["tags"], ["Tag 4"])
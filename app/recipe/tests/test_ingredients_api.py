@@ -56,7 +56,7 @@ class PrivateIngredientApiTests(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
         
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """Test that only ingredients for authenticated user are returned"""
@@ -77,8 +77,8 @@ class PrivateIngredientApiTests(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data[0]["name"], ingredient.name)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data['results'][0]["name"], ingredient.name)
+        self.assertEqual(len(res.data['results']), 1)
 
     def test_create_ingredient_successful(self):
         """Test that an ingredient is created """
@@ -99,8 +99,14 @@ class PrivateIngredientApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_existing_ingredient_returns_it(self):
+        """Test that creating an ingredient twice doesn't duplicate it"""
+        ingredient = Ingredient.objects.create(user=self.user, name="Salt")
 
+        res = self.client.post(INGREDIENTS_URL, {"name": "salt"})
 
-
-
-    
\ No newline at end of file
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["id"], ingredient.id)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 1
+        )
@@ -0,0 +1,153 @@
+import json
+from base64 import b64encode
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.models import Recipe, Tag
+
+from recipe.pagination import KeysetPagination
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+class KeysetPaginationTests(TestCase):
+    """Test the cursor pagination of the list endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "pages@gmail.com",
+            "testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.factory = APIRequestFactory()
+
+    def walk(self, url, direction="next"):
+        """Follow the links of every page and return all the results"""
+        results = []
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            results.extend(res.data["results"])
+            url = res.data[direction]
+        return results
+
+    def test_page_size(self):
+        """Test that the page size can be chosen by the client"""
+        for i in range(5):
+            Recipe.objects.create(
+                user=self.user, title="R%d" % i, time_minutes=5, price=1
+            )
+
+        res = self.client.get(RECIPES_URL, {"page_size": 2})
+
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertIsNotNone(res.data["next"])
+        self.assertIsNone(res.data["previous"])
+
+    @override_settings(API_MAX_PAGE_SIZE=3)
+    def test_max_page_size(self):
+        """Test that the page size can't go over the maximum"""
+        for i in range(5):
+            Tag.objects.create(user=self.user, name="Tag %d" % i)
+
+        res = self.client.get(TAGS_URL, {"page_size": 100})
+
+        self.assertEqual(len(res.data["results"]), 3)
+
+    def test_walk_recipes(self):
+        """Test that every recipe is returned once, newest first"""
+        titles = [
+            Recipe.objects.create(
+                user=self.user, title="R%d" % i, time_minutes=5, price=1
+            ).title
+            for i in range(7)
+        ]
+
+        results = self.walk(RECIPES_URL + "?page_size=3")
+
+        self.assertEqual([r["title"] for r in results], titles[::-1])
+
+    def test_walk_equal_sort_keys(self):
+        """Test that rows sharing a sort key are neither skipped nor
+        returned twice"""
+        for i in range(8):
+            Recipe.objects.create(
+                user=self.user, title="R%d" % i, time_minutes=i % 2, price=1
+            )
+        queryset = Recipe.objects.order_by("time_minutes")
+        request = Request(self.factory.get(RECIPES_URL, {"page_size": 3}))
+
+        results = []
+        while request is not None:
+            paginator = KeysetPagination()
+            results.extend(paginator.paginate_queryset(queryset, request))
+            url = paginator.get_next_link()
+            request = url and Request(self.factory.get(url))
+
+        expected = queryset.order_by("time_minutes", "id")
+        self.assertEqual(results, list(expected))
+
+    def test_previous_page(self):
+        """Test that the previous link returns the page before"""
+        for i in range(6):
+            Tag.objects.create(user=self.user, name="Tag %d" % i)
+
+        first = self.client.get(TAGS_URL, {"page_size": 2})
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+
+        self.assertEqual(back.data["results"], first.data["results"])
+        self.assertIsNotNone(back.data["next"])
+
+    def test_invalid_cursor(self):
+        """Test that a broken cursor returns a 404"""
+        res = self.client.get(TAGS_URL, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deep_page_range_scan(self):
+        """Test that a page after a cursor starts an index range scan at
+        the position instead of reading the rows before it"""
+        pagination = KeysetPagination()
+        queryset = Tag.objects.filter(user=self.user).order_by("-name")
+        pagination.ordering = pagination.get_ordering(queryset)
+
+        if connection.vendor == "postgresql":
+            # a table this small would be read whole otherwise
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+        plan = queryset.filter(
+            pagination.get_keyset_filter(["Tag 5", 5], False)
+        ).order_by("-name", "-id").explain()
+
+        if connection.vendor == "sqlite":
+            self.assertIn(
+                "core_tag_user_name_idx (user_id=? AND name<?)", plan
+            )
+        elif connection.vendor == "postgresql":
+            self.assertRegex(plan, r"Index Cond: .*name")
+
+    def test_cursor_values_checked(self):
+        """Test that a cursor whose values don't fit the sort fields
+        returns a 404"""
+        for url, position in (
+            (TAGS_URL, ["x", "abc"]),
+            (TAGS_URL, ["x", [1]]),
+            (RECIPES_URL, ["abc"]),
+        ):
+            cursor = b64encode(json.dumps({"p": position, "r": 0}).encode())
+
+            res = self.client.get(url, {"cursor": cursor.decode()})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,127 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENTS_URL = reverse("recipe:ingredient-list")
+
+# maximum number of queries each endpoint may run for one request,
+# whatever the number of rows the user owns
+LIST_RECIPES_BUDGET = 3
+RETRIEVE_RECIPE_BUDGET = 3
+LIST_TAGS_BUDGET = 1
+LIST_INGREDIENTS_BUDGET = 1
+
+
+def detail_url(recipe_id):
+    """Return the detail url of a recipe"""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+class QueryBudgetMixin:
+    """Assertions checking how many queries a request runs"""
+
+    def count_queries(self, url):
+        """Perform a GET request and return the number of queries run"""
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def assertQueryBudget(self, url, budget):
+        """Check that a GET request stays within its query budget"""
+        queries = self.count_queries(url)
+        self.assertLessEqual(
+            queries, budget,
+            "%s ran %d queries, budget is %d" % (url, queries, budget)
+        )
+
+    def assertConstantQueries(self, url, add_rows, budget):
+        """Check that the number of queries doesn't grow with the rows
+
+        add_rows is called between two requests to add more rows to the
+        response, both requests must run the same number of queries"""
+        before = self.count_queries(url)
+        add_rows()
+        after = self.count_queries(url)
+        self.assertEqual(
+            before, after,
+            "%s query count grew from %d to %d" % (url, before, after)
+        )
+        self.assertQueryBudget(url, budget)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test that the recipe endpoints have a fixed query budget"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "budget@gmail.com",
+            "testpass"
+        )
+        self.client.force_authenticate(self.user)
+
+    def add_recipes(self, count=5):
+        """Create recipes with a few tags and ingredients each"""
+        for _ in range(count):
+            i = Recipe.objects.count()
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title="Recipe %d" % i,
+                time_minutes=10,
+                price=5.00
+            )
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name="Tag %d" % i),
+                Tag.objects.create(user=self.user, name="Other %d" % i),
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name="Salt %d" % i)
+            )
+        return recipe
+
+    def test_list_recipes_constant_queries(self):
+        """Test listing recipes doesn't run queries per recipe"""
+        self.add_recipes(2)
+        self.assertConstantQueries(
+            RECIPES_URL, self.add_recipes, LIST_RECIPES_BUDGET
+        )
+
+    def test_retrieve_recipe_constant_queries(self):
+        """Test the detail view doesn't run queries per related row"""
+        recipe = self.add_recipes(1)
+
+        def add_related():
+            for i in range(5):
+                recipe.tags.add(
+                    Tag.objects.create(user=self.user, name="More %d" % i)
+                )
+                recipe.ingredients.add(Ingredient.objects.create(
+                    user=self.user, name="Egg %d" % i
+                ))
+
+        self.assertConstantQueries(
+            detail_url(recipe.id), add_related, RETRIEVE_RECIPE_BUDGET
+        )
+
+    def test_list_tags_constant_queries(self):
+        """Test listing tags runs a single query"""
+        self.assertConstantQueries(
+            TAGS_URL, self.add_recipes, LIST_TAGS_BUDGET
+        )
+
+    def test_list_ingredients_constant_queries(self):
+        """Test listing ingredients runs a single query"""
+        self.assertConstantQueries(
+            INGREDIENTS_URL, self.add_recipes, LIST_INGREDIENTS_BUDGET
+        )
@@ -1,6 +1,8 @@
 from django.urls import reverse
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -11,6 +13,7 @@ from ..serializers import RecipeSerializer, RecipeDetailSerializer
 
 
 RECIPES_URL = reverse("recipe:recipe-list")
+BULK_RECIPES_URL = reverse("recipe:recipe-bulk-create")
 
 def sample_tag(user, name="Default Tag Name"):
     """Create a new tag """
@@ -80,7 +83,7 @@ class PrivateRecipeTests(TestCase):
         recipes = Recipe.objects.all().order_by("-id")
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipes_limited_to_user(self):
         """ test if the user see only his recipe """
@@ -98,8 +101,8 @@ class PrivateRecipeTests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
         
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_recipe_detail(self):
         """Test viewing recipe detail view """
@@ -218,6 +221,241 @@ class PrivateRecipeTests(TestCase):
         self.assertEqual(recipe.price, payload['price'])
         tags = recipe.tags.all()
         self.assertEqual(len(tags), 0)
-        # we chekck that tags are empty  cause we haven't provided this field in the payload 
-        
-        
+        # we chekck that tags are empty  cause we haven't provided this
+        # field in the payload
+
+    def test_filter_recipes_by_tags(self):
+        """Test returning recipes with any of the given tags"""
+        recipe1 = sample_recipe(user=self.user, title="Thai curry")
+        recipe2 = sample_recipe(user=self.user, title="Aubergine")
+        recipe3 = sample_recipe(user=self.user, title="Fish and chips")
+        tag1 = sample_tag(user=self.user, name="Vegan")
+        tag2 = sample_tag(user=self.user, name="Vegetarian")
+        recipe1.tags.add(tag1)
+        recipe2.tags.add(tag1, tag2)
+
+        res = self.client.get(
+            RECIPES_URL, {"tags": "%d,%d" % (tag1.id, tag2.id)}
+        )
+
+        titles = [recipe["title"] for recipe in res.data["results"]]
+        # recipe2 has both tags but must be returned once
+        self.assertEqual(titles, [recipe2.title, recipe1.title])
+        self.assertNotIn(recipe3.title, titles)
+
+    def test_filter_recipes_matching_all_tags(self):
+        """Test returning recipes having every one of the given tags"""
+        recipe1 = sample_recipe(user=self.user, title="Thai curry")
+        recipe2 = sample_recipe(user=self.user, title="Aubergine")
+        tag1 = sample_tag(user=self.user, name="Vegan")
+        tag2 = sample_tag(user=self.user, name="Vegetarian")
+        recipe1.tags.add(tag1)
+        recipe2.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {
+            "tags": "%d,%d" % (tag1.id, tag2.id),
+            "match": "all",
+        })
+
+        titles = [recipe["title"] for recipe in res.data["results"]]
+        self.assertEqual(titles, [recipe2.title])
+
+    def test_filter_recipes_by_ingredients(self):
+        """Test returning recipes with specific ingredients"""
+        recipe1 = sample_recipe(user=self.user, title="Posh beans")
+        recipe2 = sample_recipe(user=self.user, title="Chicken cacciatore")
+        sample_recipe(user=self.user, title="Steak and mushrooms")
+        ingredient1 = sample_ingredient(user=self.user, name="Feta cheese")
+        ingredient2 = sample_ingredient(user=self.user, name="Chicken")
+        recipe1.ingredients.add(ingredient1)
+        recipe2.ingredients.add(ingredient2)
+
+        res = self.client.get(RECIPES_URL, {"ingredients": ingredient1.id})
+
+        titles = [recipe["title"] for recipe in res.data["results"]]
+        self.assertEqual(titles, [recipe1.title])
+
+    def test_filter_recipes_by_price_and_time(self):
+        """Test returning recipes within a price and time range"""
+        sample_recipe(user=self.user, title="Cheap", price=2.00)
+        sample_recipe(user=self.user, title="Slow", time_minutes=90)
+        sample_recipe(user=self.user, title="Expensive", price=50.00)
+
+        res = self.client.get(RECIPES_URL, {
+            "price_max": "10.00",
+            "time_max": 60,
+        })
+
+        titles = [recipe["title"] for recipe in res.data["results"]]
+        self.assertEqual(titles, ["Cheap"])
+
+    def test_filter_recipes_invalid_params(self):
+        """Test that invalid filter values return a bad request"""
+        for params in ({"tags": "1,a"}, {"price_max": "cheap"},
+                       {"time_min": "1.5"}, {"match": "some"}):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_recipes_by_title(self):
+        """Test searching recipes by words of their title"""
+        sample_recipe(user=self.user, title="Thai green curry")
+        sample_recipe(user=self.user, title="Fish and chips")
+
+        res = self.client.get(RECIPES_URL, {"search": "curry"})
+
+        titles = [recipe["title"] for recipe in res.data["results"]]
+        self.assertEqual(titles, ["Thai green curry"])
+
+    def test_search_recipes_by_tag_and_ingredient(self):
+        """Test that the search also looks at tag and ingredient names"""
+        recipe1 = sample_recipe(user=self.user, title="Spicy soup")
+        recipe2 = sample_recipe(user=self.user, title="Salad")
+        recipe1.tags.add(sample_tag(user=self.user, name="Dinner"))
+        recipe2.ingredients.add(sample_ingredient(user=self.user,
+                                                  name="Tomato"))
+
+        res = self.client.get(RECIPES_URL, {"search": "dinner"})
+        titles = [recipe["title"] for recipe in res.data["results"]]
+        self.assertEqual(titles, ["Spicy soup"])
+
+        res = self.client.get(RECIPES_URL, {"search": "tomato"})
+        titles = [recipe["title"] for recipe in res.data["results"]]
+        self.assertEqual(titles, ["Salad"])
+
+    def test_search_recipes_limited_to_user(self):
+        """Test that the search doesn't return other users recipes"""
+        user2 = get_user_model().objects.create_user(
+            "searcher@gmail.com",
+            "Testpass"
+        )
+        sample_recipe(user=user2, title="Thai green curry")
+
+        res = self.client.get(RECIPES_URL, {"search": "curry"})
+
+        self.assertEqual(res.data["results"], [])
+
+    def test_bulk_create_recipes(self):
+        """Test creating several recipes with their tags at once"""
+        tag = sample_tag(user=self.user, name="Vegan")
+        ingredient = sample_ingredient(user=self.user, name="Tofu")
+        payload = [
+            {"title": "Tofu curry", "time_minutes": 30, "price": "8.00",
+             "tags": [tag.id], "ingredients": [ingredient.id]},
+            {"title": "Salad", "time_minutes": 5, "price": "3.50",
+             "tags": [tag.id], "ingredients": []},
+        ]
+
+        res = self.client.post(BULK_RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["errors"], [])
+        self.assertEqual(
+            [recipe["title"] for recipe in res.data["created"]],
+            ["Tofu curry", "Salad"]
+        )
+        recipe = Recipe.objects.get(id=res.data["created"][0]["id"])
+        self.assertEqual(recipe.user, self.user)
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+
+    def test_bulk_create_returns_item_errors(self):
+        """Test that the valid recipes are created despite invalid ones"""
+        payload = [
+            {"title": "Valid", "time_minutes": 5, "price": "1.00",
+             "tags": [], "ingredients": []},
+            {"title": "No price", "time_minutes": 5,
+             "tags": [], "ingredients": []},
+        ]
+
+        res = self.client.post(BULK_RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["created"]), 1)
+        self.assertEqual(res.data["errors"][0]["index"], 1)
+        self.assertIn("price", res.data["errors"][0]["errors"])
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_bulk_create_atomic(self):
+        """Test that an atomic bulk create creates nothing on errors"""
+        payload = {
+            "atomic": True,
+            "recipes": [
+                {"title": "Valid", "time_minutes": 5, "price": "1.00",
+                 "tags": [], "ingredients": []},
+                {"title": "", "time_minutes": 5, "price": "1.00",
+                 "tags": [], "ingredients": []},
+            ],
+        }
+
+        res = self.client.post(BULK_RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Recipe.objects.count(), 0)
+
+    def test_bulk_create_invalid_body(self):
+        """Test that the body must contain a list of recipes"""
+        res = self.client.post(BULK_RECIPES_URL, {"title": "Nope"},
+                               format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_recipe_with_other_user_tag(self):
+        """Test that the tags of another user can't be used"""
+        user2 = get_user_model().objects.create_user(
+            "other@gmail.com",
+            "Testpass"
+        )
+        tag = sample_tag(user=user2, name="Not mine")
+        payload = {
+            "title": "Stolen tag",
+            "time_minutes": 5,
+            "price": "1.00",
+            "tags": [tag.id],
+        }
+
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.filter(title="Stolen tag").exists())
+
+    def test_create_recipe_reports_missing_ids(self):
+        """Test that every missing id is reported in a single error"""
+        tag = sample_tag(user=self.user)
+        payload = {
+            "title": "Missing tags",
+            "time_minutes": 5,
+            "price": "1.00",
+            "tags": [tag.id, tag.id + 100, tag.id + 200],
+        }
+
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data["tags"]), 1)
+        self.assertIn(str(tag.id + 100), res.data["tags"][0])
+        self.assertIn(str(tag.id + 200), res.data["tags"][0])
+
+    def test_create_recipe_resolves_ingredients_at_once(self):
+        """Test that the ingredient ids are resolved with one query"""
+        ingredients = [
+            sample_ingredient(user=self.user, name="Ingredient %d" % i)
+            for i in range(40)
+        ]
+        payload = {
+            "title": "Big stew",
+            "time_minutes": 120,
+            "price": "20.00",
+            "ingredients": [ingredient.id for ingredient in ingredients],
+        }
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        lookups = [
+            query for query in context.captured_queries
+            if query["sql"].startswith('SELECT "core_ingredient"') and
+            '"core_ingredient"."id" IN' in query["sql"]
+        ]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(len(res.data["ingredients"]), 40)
@@ -0,0 +1,123 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+from recipe.cache import response_cache
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+CACHE_STATS_URL = reverse("recipe:cache-stats")
+
+
+def detail_url(recipe_id):
+    """Return the detail url of a recipe"""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+@override_settings(API_RESPONSE_CACHE={"ENABLED": True})
+class ResponseCacheTests(TestCase):
+    """Test the cache of the recipe API responses"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "cache@gmail.com",
+            "testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=10, price=2
+        )
+        response_cache.reset_stats()
+
+    def test_list_served_from_cache(self):
+        """Test that a second list call runs no query"""
+        first = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPES_URL)
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+
+    def test_detail_invalidated_by_tag_rename(self):
+        """Test that renaming a tag drops the cached recipe detail"""
+        tag = Tag.objects.create(user=self.user, name="Hot")
+        self.recipe.tags.add(tag)
+        url = detail_url(self.recipe.id)
+        self.client.get(url)
+
+        tag.name = "Spicy"
+        tag.save()
+        res = self.client.get(url)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["tags"][0]["name"], "Spicy")
+        self.assertGreaterEqual(response_cache.stats()["evictions"], 1)
+
+    def test_search_invalidated_by_tag_rename(self):
+        """Test that renaming a tag drops the cached searches, they
+        match the names of the tags"""
+        tag = Tag.objects.create(user=self.user, name="Hot")
+        self.recipe.tags.add(tag)
+        self.client.get(RECIPES_URL, {"search": "spicy"})
+
+        tag.name = "Spicy"
+        tag.save()
+        res = self.client.get(RECIPES_URL, {"search": "spicy"})
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(
+            [recipe["id"] for recipe in res.data["results"]],
+            [self.recipe.id]
+        )
+
+    def test_query_params_cached_apart(self):
+        """Test that filtered lists don't share their cache entry"""
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(RECIPES_URL, {"price_min": 5})
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"], [])
+
+    def test_users_cached_apart(self):
+        """Test that a user never gets another user's cached list"""
+        self.client.get(TAGS_URL)
+        user2 = get_user_model().objects.create_user(
+            "other@gmail.com",
+            "testpass"
+        )
+        Tag.objects.create(user=user2, name="Vegan")
+        self.client.force_authenticate(user2)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data["results"][0]["name"], "Vegan")
+
+    def test_cache_stats(self):
+        """Test that the hits and misses are counted"""
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL)
+
+        self.assertEqual(response_cache.stats()["hits"], 1)
+        self.assertEqual(response_cache.stats()["misses"], 1)
+
+    def test_cache_stats_admin_only(self):
+        """Test that only the staff can read the cache stats"""
+        res = self.client.get(CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        res = self.client.get(CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(res.data), {"hits", "misses", "evictions"}
+        )
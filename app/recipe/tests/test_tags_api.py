@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
@@ -5,12 +7,13 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import RecipeAttrQuerySet, Tag
 
 from recipe.serializers import TagSerializer
 
 
 TAGS_URL = reverse('recipe:tag-list')
+BULK_TAGS_URL = reverse('recipe:tag-bulk-create')
 
 
 class PublicTagsApiTests(TestCase):
@@ -48,7 +51,7 @@ class PrivateTagsApiTests(TestCase):
 
         tags = Tag.objects.all().order_by('-name')
         serializer = TagSerializer(tags, many=True)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
     def test_tags_limited_to_user(self):
@@ -66,8 +69,8 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL)
 
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         
     def test_create_tag_successful(self):
@@ -88,3 +91,106 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.post(TAGS_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_existing_tag_returns_it(self):
+        """Test that creating a tag twice returns the existing tag"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'VEGAN'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], tag.id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_create_existing_non_ascii_tag(self):
+        """Test that the names are matched with the lowercasing of the
+        database, which may differ from Python's"""
+        tag = Tag.objects.create(user=self.user, name='Éclair')
+
+        res = self.client.post(TAGS_URL, {'name': 'Éclair'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], tag.id)
+        res = self.client.post(
+            BULK_TAGS_URL, [{'name': 'éclair'}, {'name': 'Éclair'}],
+            format='json'
+        )
+        self.assertIn(
+            res.status_code, (status.HTTP_200_OK, status.HTTP_201_CREATED)
+        )
+        self.assertIn(tag.id, [item['id'] for item in res.data])
+
+    def test_create_tag_inserted_concurrently(self):
+        """Test that a tag another request inserts between the lookup and
+        the insert is returned as existing"""
+        match_names = RecipeAttrQuerySet.match_names
+        tags = []
+
+        def lookup_then_insert(queryset, user, names):
+            matches = match_names(queryset, user, names)
+            tags.append(Tag.objects.create(user=user, name='VEGAN'))
+            return matches
+
+        with patch.object(
+            RecipeAttrQuerySet, 'match_names', lookup_then_insert
+        ):
+            res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], tags[0].id)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_existing_tags_looked_up_once(self):
+        """Test that the names are lowered and looked up in one query"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Éclair')
+
+        with self.assertNumQueries(1):
+            objects, created = Tag.objects.get_or_create_many(
+                self.user, ['vegan', 'Éclair', 'VEGAN']
+            )
+
+        self.assertEqual(
+            [tag.name for tag in objects], ['Vegan', 'Éclair', 'Vegan']
+        )
+        self.assertEqual(created, [])
+
+    def test_same_tag_name_for_other_user(self):
+        """Test that two users can have a tag with the same name"""
+        user2 = get_user_model().objects.create_user(
+            'other@gmail.com',
+            'testpass'
+        )
+        Tag.objects.create(user=user2, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_bulk_create_tags(self):
+        """Test creating several tags, existing ones are returned"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        payload = [{'name': 'vegan'}, {'name': 'Dessert'}, {'name': 'DESSERT'}]
+
+        res = self.client.post(BULK_TAGS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(res.data[1]['name'], 'Dessert')
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_existing_tags(self):
+        """Test that a bulk create of existing tags returns a 200"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(BULK_TAGS_URL, [{'name': 'Vegan'}],
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bulk_create_invalid_tags(self):
+        """Test that an invalid tag fails the bulk create"""
+        res = self.client.post(BULK_TAGS_URL, [{'name': 'Ok'}, {'name': ''}],
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
@@ -0,0 +1,127 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe import serializers
+from recipe.cache import response_cache
+from recipe.values import ValuesSerializer
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENTS_URL = reverse("recipe:ingredient-list")
+
+
+class ValuesSerializerTests(TestCase):
+    """Test that the values() path renders like the serializers"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "values@gmail.com",
+            "testpass"
+        )
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ("Vegan", "Quick", "Dessert")
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ("Salt", "Sugar")
+        ]
+        soup = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=10,
+            price=Decimal("2.5"), link="https://soup.com"
+        )
+        # added out of order, the ids are rendered sorted
+        soup.tags.add(tags[2], tags[0])
+        soup.ingredients.add(*ingredients)
+        cake = Recipe.objects.create(
+            user=self.user, title="Cake   \U0001f370", time_minutes=45,
+            price=Decimal("12.00")
+        )
+        cake.tags.add(tags[1])
+        Recipe.objects.create(
+            user=self.user, title="Water", time_minutes=0, price=0
+        )
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def assertSameOutput(self, serializer_class, queryset):
+        """Check the values() rows render like the serializer"""
+        expected = serializer_class(queryset, many=True).data
+
+        values = ValuesSerializer(serializer_class())
+        data = values.to_representation(values.get_queryset(queryset))
+
+        self.assertEqual(self.render(data), self.render(expected))
+
+    def test_recipes_same_output(self):
+        """Test the recipe list with its tag and ingredient ids"""
+        queryset = Recipe.objects.order_by("-id").prefetch_related(
+            "tags", "ingredients"
+        )
+        self.assertSameOutput(serializers.RecipeSerializer, queryset)
+
+    def test_tags_same_output(self):
+        """Test the tag and ingredient lists"""
+        self.assertSameOutput(
+            serializers.TagSerializer, Tag.objects.order_by("-name")
+        )
+        self.assertSameOutput(
+            serializers.IngredientSerializer,
+            Ingredient.objects.order_by("-name")
+        )
+
+    def test_related_ids_queries(self):
+        """Test that the ids of each relation are read with one query"""
+        values = ValuesSerializer(serializers.RecipeSerializer())
+        queryset = values.get_queryset(Recipe.objects.order_by("-id"))
+
+        with self.assertNumQueries(3):
+            values.to_representation(queryset)
+
+    def test_nested_serializer_rejected(self):
+        """Test that the nested serializers aren't supported"""
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesSerializer(serializers.RecipeDetailSerializer())
+
+    def test_api_same_output(self):
+        """Test the list endpoints return the same bytes on both paths"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        urls = [
+            RECIPES_URL, RECIPES_URL + "?page_size=2",
+            RECIPES_URL + "?price_min=1", TAGS_URL, INGREDIENTS_URL,
+        ]
+
+        for url in urls:
+            with self.subTest(url=url), \
+                    self.settings(API_RESPONSE_CACHE={"ENABLED": False}):
+                expected = client.get(url).content
+                with override_settings(API_VALUES_LIST=True):
+                    res = client.get(url)
+                self.assertEqual(res.content, expected)
+
+    @override_settings(API_VALUES_LIST=True)
+    def test_api_next_page(self):
+        """Test that the keyset pagination reads the values() rows"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response_cache.get_cache().clear()
+
+        res = client.get(RECIPES_URL, {"page_size": 2})
+        res = client.get(res.data["next"])
+
+        self.assertEqual(
+            [recipe["title"] for recipe in res.data["results"]], ["Soup"]
+        )
+        self.assertEqual(len(res.data["results"][0]["tags"]), 2)
@@ -13,6 +13,9 @@ app_name = 'recipe'
 
 urlpatterns = [
     path('', include(router.urls)),
+    path(
+        'cache-stats/', views.CacheStatsView.as_view(), name='cache-stats'
+    ),
 ]
 #    path('', include(router.urls)) = we include all url patterns form viewset in urlpatterns
 # EX: list url patterns must be here , and ...
@@ -0,0 +1,199 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, models
+from django.db.models import OuterRef, Subquery
+
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from core.profiling import measure
+
+
+# fields whose to_representation returns the values() value unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.EmailField,
+    serializers.BooleanField,
+    serializers.ReadOnlyField,
+)
+
+
+def values_list_enabled():
+    """Return True when the list endpoints use the values() path"""
+    return getattr(settings, "API_VALUES_LIST", False)
+
+
+class ValuesSerializer:
+    """Render the list of a ModelSerializer from values() rows
+
+    The rows are fetched as dicts and the fields which would return
+    them unchanged are copied as they are, the others still go through
+    their to_representation. The ids of the many to many fields are
+    aggregated per row with array_agg on postgres, elsewhere they are
+    read with one query per relation and grouped in python. The output
+    is the same as the one of the serializer with the related rows
+    ordered by id.
+
+    Only the model fields, the primary key related fields and their
+    many=True lists are supported."""
+
+    array_prefix = "_values_"
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+        self.model = serializer.Meta.model
+        self.plan = []
+        self.relations = {}
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            source = field.source
+            if source == "*" or "." in source:
+                raise ImproperlyConfigured(
+                    "%s.%s can't be read from values()" % (
+                        type(serializer).__name__, name
+                    )
+                )
+
+            if isinstance(field, serializers.ManyRelatedField):
+                if not isinstance(field.child_relation,
+                                  serializers.PrimaryKeyRelatedField):
+                    raise ImproperlyConfigured(
+                        "%s.%s must list primary keys" % (
+                            type(serializer).__name__, name
+                        )
+                    )
+                self.relations[source] = self.model._meta.get_field(source)
+                self.plan.append((name, self.array_prefix + source, None))
+            elif isinstance(field, serializers.RelatedField):
+                if not isinstance(field,
+                                  serializers.PrimaryKeyRelatedField) or \
+                        field.pk_field is not None:
+                    raise ImproperlyConfigured(
+                        "%s.%s must be a primary key" % (
+                            type(serializer).__name__, name
+                        )
+                    )
+                # values() returns the primary key of a foreign key
+                self.plan.append((name, source, None))
+            elif isinstance(field, serializers.BaseSerializer):
+                raise ImproperlyConfigured(
+                    "%s.%s is a nested serializer" % (
+                        type(serializer).__name__, name
+                    )
+                )
+            elif type(field) in PASSTHROUGH_FIELDS:
+                self.plan.append((name, source, None))
+            else:
+                self.plan.append((name, source, field.to_representation))
+
+    def uses_array_agg(self, using):
+        return connections[using].vendor == "postgresql"
+
+    def get_queryset(self, queryset):
+        """Return the queryset selecting the values of the fields
+
+        The fields the queryset is ordered by are selected too so the
+        keyset pagination can read them from the rows."""
+        queryset = queryset.prefetch_related(None)
+        # the primary key is needed to match the related ids
+        columns = [self.model._meta.pk.name]
+        for _, source, _ in self.plan:
+            if not source.startswith(self.array_prefix) and \
+                    source not in columns:
+                columns.append(source)
+        for ordering in queryset.query.order_by:
+            if isinstance(ordering, str) and \
+                    ordering.lstrip("-") not in columns:
+                columns.append(ordering.lstrip("-"))
+
+        if self.uses_array_agg(queryset.db):
+            for source, field in self.relations.items():
+                queryset = queryset.annotate(**{
+                    self.array_prefix + source: self.get_array_subquery(field)
+                })
+                columns.append(self.array_prefix + source)
+
+        return queryset.values(*columns)
+
+    def get_array_subquery(self, field):
+        """Return the subquery aggregating the related ids of a row"""
+        # only imported on postgres, they need psycopg2
+        from django.contrib.postgres.aggregates import ArrayAgg
+        from django.contrib.postgres.fields import ArrayField
+
+        through = field.remote_field.through
+        column = field.m2m_reverse_name()
+        links = through.objects.filter(**{
+            field.m2m_column_name(): OuterRef("pk")
+        }).order_by().values(field.m2m_column_name()).annotate(
+            ids=ArrayAgg(column, ordering=column)
+        ).values("ids")
+        return Subquery(links, output_field=ArrayField(models.IntegerField()))
+
+    def load_related_ids(self, rows, using):
+        """Add the related ids to rows fetched without array_agg"""
+        pk_name = self.model._meta.pk.name
+        pks = [row[pk_name] for row in rows]
+        for source, field in self.relations.items():
+            through = field.remote_field.through
+            column = field.m2m_column_name()
+            related_column = field.m2m_reverse_name()
+            ids = {}
+            links = through.objects.using(using).filter(**{
+                "%s__in" % column: pks
+            }).order_by(related_column).values_list(column, related_column)
+            for pk, related_id in links:
+                ids.setdefault(pk, []).append(related_id)
+            for row in rows:
+                row[self.array_prefix + source] = ids.get(row[pk_name], [])
+
+    def to_representation(self, rows, using="default"):
+        """Return the representations of the rows"""
+        name = "%s(values)" % type(self.serializer).__name__
+        with measure("serializer", name):
+            return self._to_representation(rows, using)
+
+    def _to_representation(self, rows, using):
+        rows = list(rows)
+        if rows and self.relations:
+            if not self.uses_array_agg(using):
+                self.load_related_ids(rows, using)
+            else:
+                for row in rows:
+                    for source in self.relations:
+                        # the subquery is NULL for a row without links
+                        key = self.array_prefix + source
+                        row[key] = row[key] or []
+
+        return [
+            {
+                name: row[key] if convert is None or row[key] is None
+                else convert(row[key])
+                for name, key, convert in self.plan
+            }
+            for row in rows
+        ]
+
+
+class ValuesListMixin:
+    """Serve the list action from values() rows when API_VALUES_LIST
+    is enabled, see ValuesSerializer"""
+
+    def list(self, request, *args, **kwargs):
+        if not values_list_enabled():
+            return super().list(request, *args, **kwargs)
+
+        values = ValuesSerializer(self.get_serializer())
+        queryset = self.filter_queryset(self.get_queryset())
+        using = queryset.db
+        queryset = values.get_queryset(queryset)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                values.to_representation(page, using)
+            )
+        return Response(values.to_representation(queryset, using))
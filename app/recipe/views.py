@@ -1,30 +1,111 @@
-from rest_framework import viewsets, mixins
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from decimal import Decimal
+from functools import partial
 
-from core.models import Tag, Ingredient, Recipe
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef, Prefetch
+from django.http import StreamingHttpResponse
+
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.authentication import CachedTokenAuthentication
+from core.models import RELATED_COLUMNS, Tag, Ingredient, Recipe
+from core.routers import ReplicaReadMixin
+from core.shards import ShardFenceMixin
+from core.tokens import SignedTokenAuthentication
 
 from recipe import serializers
+from recipe.cache import (
+    CachedResponseMixin, invalidate_scopes, response_cache
+)
+from recipe.conditional import ConditionalGetMixin, user_scope
+from recipe.export import EXPORT_FORMATS, iter_recipes
+from recipe.search import refresh_search_vectors, search_recipes
+from recipe.values import ValuesListMixin
+
 
-class BaseRecipeAttr(viewsets.GenericViewSet, 
+class BaseRecipeAttr(ShardFenceMixin,
+                     ReplicaReadMixin,
+                     ConditionalGetMixin,
+                     CachedResponseMixin,
+                     ValuesListMixin,
+                     viewsets.GenericViewSet,
                      mixins.ListModelMixin,
                      mixins.CreateModelMixin):
     """This class is created for refactoring the Tag and ingredients viewsets
         It gathers all duplicate code from those two classes"""
     
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [
+        CachedTokenAuthentication, SignedTokenAuthentication
+    ]
     permission_classes = [IsAuthenticated]
+    # served from the pool of threads of core.asgi
+    async_actions = ("list", "retrieve")
 
     def get_queryset(self):
         """Get queryset from queryset"""
         # we add the get_queryset method cause queryset is used for having all queryset
         # Here we filter those queryset in order to get tags that user has 
-        return self.queryset.filter(user=self.request.user).order_by("-name")
+        return self.queryset.for_user(self.request.user).order_by("-name")
     
-    def perform_create(self, serializer):
-        """Create a new object it can be either tag or ingredient"""
-        # we don;t need to add Tag name cause the user provides it 
-        serializer.save(user=self.request.user)
+    def get_version_scopes(self):
+        """Return the collection of the user, "tag:<id>" for example"""
+        model_name = self.queryset.model._meta.model_name
+        return [user_scope(model_name, self.request.user.pk)]
+
+    def upsert(self, names):
+        """Return the objects with the given names, the objects the user
+        doesn't have yet are created. The second value is True when at
+        least one object was created"""
+        objects, created = self.queryset.model.objects.get_or_create_many(
+            self.request.user, names
+        )
+        # the spellings of a name share their object
+        objects = list(dict.fromkeys(objects))
+        if created:
+            # bulk_create doesn't send the post_save signals
+            invalidate_scopes(*self.get_version_scopes())
+        return objects, bool(created)
+
+    def create(self, request, *args, **kwargs):
+        """Create a new object it can be either tag or ingredient
+
+        Creating a name the user already has returns the existing object
+        with a 200 instead of a 201"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        objects, created = self.upsert([serializer.validated_data["name"]])
+
+        return Response(
+            self.get_serializer(objects[0]).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request):
+        """Create a list of objects, the existing ones are returned"""
+        if not isinstance(request.data, list) or not request.data:
+            raise ValidationError({"names": "Expected a list of objects"})
+        max_size = getattr(settings, "API_MAX_BULK_SIZE", 1000)
+        if len(request.data) > max_size:
+            raise ValidationError({
+                "names": "Expected at most %d objects" % max_size
+            })
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        objects, created = self.upsert(
+            [item["name"] for item in serializer.validated_data]
+        )
+
+        return Response(
+            self.get_serializer(objects, many=True).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
 class TagViewSet(BaseRecipeAttr):
     """Manage tags in the database"""
@@ -39,16 +120,144 @@ class IngredientViewSet(BaseRecipeAttr):
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
 
-class RecipeViewSet(viewsets.ModelViewSet):
 
-    authentication_classes = [TokenAuthentication]
+class RecipeViewSet(ShardFenceMixin,
+                    ReplicaReadMixin,
+                    ConditionalGetMixin,
+                    CachedResponseMixin,
+                    ValuesListMixin,
+                    viewsets.ModelViewSet):
+
+    authentication_classes = [
+        CachedTokenAuthentication, SignedTokenAuthentication
+    ]
     permission_classes = [IsAuthenticated]
+    # served from the pool of threads of core.asgi
+    async_actions = ("list", "retrieve")
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
 
+    def _params_to_ints(self, name):
+        """Convert a comma separated query param to a list of integers"""
+        value = self.request.query_params.get(name)
+        if not value:
+            return []
+        try:
+            return [int(str_id) for str_id in value.split(",")]
+        except ValueError:
+            raise ValidationError({name: "Expected comma separated ids"})
+
+    def _param_to_number(self, name, convert):
+        """Convert a query param to a number, None when it's missing"""
+        value = self.request.query_params.get(name)
+        if value in (None, ""):
+            return None
+        try:
+            number = convert(value)
+        except (ArithmeticError, ValueError):
+            number = None
+        if number is None or not Decimal(number).is_finite():
+            raise ValidationError({name: "Expected a number"})
+        return number
+
+    def _filter_related(self, queryset, field, ids, match_all):
+        """Filter the recipes linked to the given tags or ingredients
+
+        The filters are subqueries on the through table so the recipes
+        are never joined to their tags and no row is returned twice"""
+        through = getattr(Recipe, field).through
+        column = RELATED_COLUMNS[field]
+        links = through.objects.filter(**{"%s__in" % column: ids})
+
+        if match_all:
+            # the recipes linked to every one of the ids
+            matching = links.values("recipe_id").annotate(
+                matches=Count(column)
+            ).filter(matches=len(set(ids))).values("recipe_id")
+            return queryset.filter(pk__in=matching)
+
+        # the recipes linked to at least one of the ids
+        return queryset.filter(
+            Exists(links.filter(recipe_id=OuterRef("pk")))
+        )
+
+    def _filter_recipes(self, queryset):
+        """Apply the filters given in the query params"""
+        match = self.request.query_params.get("match", "any")
+        if match not in ("any", "all"):
+            raise ValidationError({"match": "Expected 'any' or 'all'"})
+
+        for field in ("tags", "ingredients"):
+            ids = self._params_to_ints(field)
+            if ids:
+                queryset = self._filter_related(
+                    queryset, field, ids, match == "all"
+                )
+
+        ranges = (
+            ("price_min", "price__gte", Decimal),
+            ("price_max", "price__lte", Decimal),
+            ("time_min", "time_minutes__gte", int),
+            ("time_max", "time_minutes__lte", int),
+        )
+        for param, lookup, convert in ranges:
+            value = self._param_to_number(param, convert)
+            if value is not None:
+                queryset = queryset.filter(**{lookup: value})
+
+        search = self.request.query_params.get("search", "").strip()
+        if search:
+            queryset = search_recipes(queryset, search)
+
+        return queryset
+
     def get_queryset(self):
         """Return filtered queryset based on user"""
-        return Recipe.objects.filter(user=self.request.user)
+        queryset = Recipe.objects.for_user(self.request.user).order_by("-id")
+
+        if self.action in ("list", "export"):
+            queryset = self._filter_recipes(queryset)
+
+        if self.action == "retrieve":
+            # the detail serializer nests full tags and ingredients
+            return queryset.prefetch_related("tags", "ingredients")
+
+        # the other serializers only render primary keys, so we fetch
+        # the ids of every related row in one query per relation
+        # instead of two extra queries per recipe. They are ordered like
+        # the ids aggregated by the values() list
+        return queryset.prefetch_related(
+            Prefetch("tags", queryset=Tag.objects.only("id").order_by("id")),
+            Prefetch(
+                "ingredients",
+                queryset=Ingredient.objects.only("id").order_by("id")
+            ),
+        )
+
+    def get_version_scopes(self):
+        """Return the scopes the list or the detail of a recipe use"""
+        user_id = self.request.user.pk
+        if self.action == "retrieve":
+            # the detail also shows the names of the tags and ingredients
+            return [
+                user_scope("recipe", user_id, self.kwargs["pk"]),
+                user_scope("tag", user_id),
+                user_scope("ingredient", user_id),
+            ]
+        scopes = [user_scope("recipe", user_id)]
+        if self.request.query_params.get("search", "").strip():
+            # the search also matches the names of the tags and the
+            # ingredients, a rename changes the recipes found
+            scopes += [
+                user_scope("tag", user_id),
+                user_scope("ingredient", user_id),
+            ]
+        return scopes
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(
+            partial(self.cached, super().retrieve), request, *args, **kwargs
+        )
 
     def get_serializer_class(self):
         """Return the serializer class , We can use several actions in order 
@@ -64,3 +273,113 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Create a Recipe"""
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request):
+        """Create a list of recipes in a single transaction
+
+        The body is either a list of recipes or an object with the list
+        under "recipes" and "atomic": true to create nothing when one of
+        the recipes is invalid. Otherwise the valid recipes are created
+        and the errors of the others are returned with their index."""
+        items, atomic = request.data, False
+        if isinstance(items, dict):
+            atomic = items.get("atomic") in (True, "true", "1")
+            items = items.get("recipes")
+
+        if not isinstance(items, list) or not items:
+            raise ValidationError({"recipes": "Expected a list of recipes"})
+        max_size = getattr(settings, "API_MAX_BULK_SIZE", 1000)
+        if len(items) > max_size:
+            raise ValidationError({
+                "recipes": "Expected at most %d recipes" % max_size
+            })
+
+        # the tags and ingredients of every recipe are resolved at once
+        context = self.get_serializer_context()
+        context["related_objects"] = {}
+        serializers.preload_related_objects(
+            self.get_serializer(context=context), items
+        )
+
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item, context=context)
+            if serializer.is_valid():
+                valid.append(serializer)
+            else:
+                errors.append({"index": index, "errors": serializer.errors})
+
+        if errors and (atomic or not valid):
+            return Response(
+                {"created": [], "errors": errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        recipes, tag_ids, ingredient_ids = [], [], []
+        for serializer in valid:
+            data = dict(serializer.validated_data)
+            tag_ids.append([tag.pk for tag in data.pop("tags", [])])
+            ingredient_ids.append(
+                [ingredient.pk for ingredient in data.pop("ingredients", [])]
+            )
+            recipes.append(Recipe(user=request.user, **data))
+
+        queryset = Recipe.objects.on_shard(request.user)
+        queryset.bulk_create_with_relations(recipes, tag_ids, ingredient_ids)
+        ids = [recipe.pk for recipe in recipes]
+        # bulk_create doesn't send the post_save signals
+        refresh_search_vectors(ids, using=queryset.db)
+        invalidate_scopes(user_scope("recipe", request.user.pk))
+
+        # reloaded with the prefetching of the list action
+        created = {
+            recipe.pk: recipe
+            for recipe in self.get_queryset().filter(pk__in=ids)
+        }
+        serializer = self.get_serializer(
+            [created[pk] for pk in ids], many=True
+        )
+        return Response(
+            {"created": serializer.data, "errors": errors},
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        """Stream every recipe of the user with the names of its tags
+        and ingredients, as NDJSON or with ?output=csv as CSV
+
+        The list filters apply to the export. The rows are rendered
+        while they are read so the export never sits in memory."""
+        output = request.query_params.get("output", "ndjson")
+        if output not in EXPORT_FORMATS:
+            raise ValidationError({
+                "output": "Expected one of %s" % ", ".join(EXPORT_FORMATS)
+            })
+        render, content_type, extension = EXPORT_FORMATS[output]
+        # the rows are read after the view returns, the database chosen
+        # for the request is kept
+        queryset = self.get_queryset()
+        queryset = queryset.using(queryset.db)
+
+        response = StreamingHttpResponse(
+            render(iter_recipes(queryset)),
+            content_type=content_type
+        )
+        response["Content-Disposition"] = (
+            'attachment; filename="recipes.%s"' % extension
+        )
+        return response
+
+
+class CacheStatsView(APIView):
+    """Return the hit, miss and eviction counts of the response cache
+    for the process serving the request"""
+
+    authentication_classes = [
+        CachedTokenAuthentication, SignedTokenAuthentication
+    ]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache.stats())
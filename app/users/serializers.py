@@ -2,8 +2,10 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import ugettext_lazy as _
 
+from core.profiling import ProfiledSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """Serializer for the users object"""
 
     class Meta:
@@ -48,9 +50,8 @@ class UserSerializer(serializers.ModelSerializer):
 
         return user
 
-    
 
-class AuthTokenSerializer(serializers.Serializer):
+class AuthTokenSerializer(ProfiledSerializerMixin, serializers.Serializer):
     """Serializer for the user authentication object"""
 
     email = serializers.CharField()
@@ -74,4 +75,10 @@ class AuthTokenSerializer(serializers.Serializer):
             raise serializers.ValidationError(msg, code='authorization')
 
         attrs['user'] = user # else add the user and validate those credentials
-        return attrs
\ No newline at end of file
+        return attrs
+
+
+class RefreshTokenSerializer(ProfiledSerializerMixin, serializers.Serializer):
+    """Serializer for the refresh token of the signed tokens"""
+
+    refresh = serializers.CharField()
@@ -1,10 +1,24 @@
 from django.urls import path
-from .views import CreateUserView, CreateTokenView, ManageUserView
+from .views import (
+    CreateUserView, CreateTokenView, ManageUserView, CreateSignedTokenView,
+    RefreshSignedTokenView, RevokeSignedTokensView
+)
 
 app_name = "users"
 
 urlpatterns =  [
     path("create/", CreateUserView.as_view(), name="create"),
     path("token/", CreateTokenView.as_view(), name="token"),
+    path(
+        "token/signed/", CreateSignedTokenView.as_view(), name="signed-token"
+    ),
+    path(
+        "token/refresh/", RefreshSignedTokenView.as_view(),
+        name="refresh-token"
+    ),
+    path(
+        "token/revoke/", RevokeSignedTokensView.as_view(),
+        name="revoke-tokens"
+    ),
     path("me/", ManageUserView.as_view(), name="me"),
 ]
\ No newline at end of file
@@ -1,9 +1,22 @@
-from rest_framework import generics
-from .serializers import UserSerializer, AuthTokenSerializer
+from django.core.exceptions import ObjectDoesNotExist
+
+from rest_framework import generics, status
+from .serializers import (
+    UserSerializer, AuthTokenSerializer, RefreshTokenSerializer
+)
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.authentication import CachedTokenAuthentication
+from core.routers import ReplicaReadMixin
+from core.tokens import (
+    InvalidToken, SignedTokenAuthentication, refresh_tokens, revoke_tokens,
+    signer
+)
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -19,17 +32,72 @@ class CreateTokenView(ObtainAuthToken):
     # use the default renderer classes for rendering our token views
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class CreateSignedTokenView(generics.GenericAPIView):
+    """Create a signed access token and its refresh token for the user,
+    the access token is verified without the database"""
+
+    serializer_class = AuthTokenSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(signer.issue(serializer.validated_data["user"]))
+
+
+class RefreshSignedTokenView(generics.GenericAPIView):
+    """Exchange a refresh token for new signed tokens"""
+
+    serializer_class = RefreshTokenSerializer
+    # the request may still carry the expired access token
+    authentication_classes = []
+
+    def get_authenticate_header(self, request):
+        # answers 401 rather than 403 to the refresh tokens refused
+        return SignedTokenAuthentication.keyword
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            tokens = refresh_tokens(serializer.validated_data["refresh"])
+        except InvalidToken as exc:
+            raise AuthenticationFailed(str(exc))
+        return Response(tokens)
+
+
+class RevokeSignedTokensView(APIView):
+    """Revoke every signed token of the user"""
+
+    authentication_classes = [
+        CachedTokenAuthentication, SignedTokenAuthentication
+    ]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        revoke_tokens(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ManageUserView(ReplicaReadMixin, generics.RetrieveUpdateAPIView):
 
     serializer_class = UserSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [
+        CachedTokenAuthentication, SignedTokenAuthentication
+    ]
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
         """ Return the user with tokenAuthentification """
         #we need to apply TokenAuthentication, it means that we must provide
         # token in order to be authenticated 
-        return self.request.user
+        user = self.request.user
+        if user.get_deferred_fields():
+            # the user of a signed token is loaded with its id only
+            try:
+                user.refresh_from_db(fields=user.get_deferred_fields())
+            except ObjectDoesNotExist:
+                raise AuthenticationFailed("User inactive or deleted.")
+        return user
 
 
 